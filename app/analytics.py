@@ -0,0 +1,206 @@
+import argparse
+import time
+
+import numpy as np
+
+from results_store import CRITERIA, SCORE_COLUMNS, SIDES, results_store
+
+
+TEXT_COLUMNS = {
+    "run_id",
+    "topic",
+    "proponent_model",
+    "opponent_model",
+    "proponent_style",
+    "opponent_style",
+}
+
+
+def load_score_table(store=results_store, run_id=None):
+    """
+    Load every evaluated debate as columns: a dictionary of SCORE_COLUMNS to
+    NumPy arrays. Scores are float arrays with NaN for missing sub-scores
+    (debates imported from before criteria were kept).
+    """
+    rows = store.score_rows(run_id)
+    columns = list(zip(*rows)) if rows else [()] * len(SCORE_COLUMNS)
+    table = {}
+    for name, values in zip(SCORE_COLUMNS, columns):
+        if name in TEXT_COLUMNS:
+            table[name] = np.array(
+                ["" if value is None else value for value in values], dtype=object
+            )
+        else:
+            table[name] = np.array(
+                [np.nan if value is None else value for value in values], dtype=float
+            )
+    return table
+
+
+def to_arrow(table):
+    """The score table as a pyarrow.Table, for Parquet export or DataFrame tools."""
+    import pyarrow as pa
+
+    return pa.table(
+        {
+            name: pa.array(column.tolist() if column.dtype == object else column)
+            for name, column in table.items()
+        }
+    )
+
+
+def by_side(table):
+    """
+    One row per debater instead of per debate.
+
+    :return: Dictionary with ``model``, ``style``, ``score``, ``won`` and one
+        array per criterion, proponents first then opponents
+    """
+    proponent = table["proponent_score"]
+    opponent = table["opponent_score"]
+    sides = {
+        "model": np.concatenate([table["proponent_model"], table["opponent_model"]]),
+        "style": np.concatenate([table["proponent_style"], table["opponent_style"]]),
+        "score": np.concatenate([proponent, opponent]),
+        # Ties count as half a win for each side
+        "won": np.concatenate(
+            [
+                (proponent > opponent) + 0.5 * (proponent == opponent),
+                (opponent > proponent) + 0.5 * (proponent == opponent),
+            ]
+        ),
+    }
+    for criterion in CRITERIA:
+        sides[criterion] = np.concatenate(
+            [table[f"{side}_{criterion}"] for side in SIDES]
+        )
+    return sides
+
+
+def group_stats(groups, values, won):
+    """
+    Vectorized count, mean, variance and win rate of ``values`` per group.
+
+    :return: List of row dictionaries sorted by mean, highest first
+    """
+    keep = groups != ""
+    names, index = np.unique(groups[keep], return_inverse=True)
+    values = values[keep]
+    count = np.bincount(index, minlength=len(names))
+    total = np.bincount(index, weights=values, minlength=len(names))
+    squares = np.bincount(index, weights=values**2, minlength=len(names))
+    wins = np.bincount(index, weights=won[keep], minlength=len(names))
+
+    mean = total / np.maximum(count, 1)
+    # Sample variance; zero for single observations
+    variance = (squares - count * mean**2) / np.maximum(count - 1, 1)
+    rows = [
+        {
+            "name": name,
+            "debates": int(count[i]),
+            "mean": float(mean[i]),
+            "variance": float(max(variance[i], 0.0)),
+            "win_rate": float(wins[i] / count[i]),
+        }
+        for i, name in enumerate(names)
+    ]
+    return sorted(rows, key=lambda row: row["mean"], reverse=True)
+
+
+def model_leaderboard(table, n_resamples=1000, confidence=0.95, seed=0):
+    """
+    Per-model mean total score, variance and win rate, with bootstrap
+    confidence intervals on the mean.
+    """
+    sides = by_side(table)
+    rows = group_stats(sides["model"], sides["score"], sides["won"])
+    intervals = bootstrap_ci(
+        sides["model"], sides["score"], n_resamples, confidence, seed
+    )
+    for row in rows:
+        row["ci_low"], row["ci_high"] = intervals[row["name"]]
+    return rows
+
+
+def style_win_rates(table):
+    """Per-style mean score and win rate (debates without styles are skipped)."""
+    sides = by_side(table)
+    return group_stats(sides["style"], sides["score"], sides["won"])
+
+
+def criterion_correlations(table):
+    """
+    Pearson correlations between the rubric criteria and the total score,
+    over debaters that have every sub-score.
+
+    :return: Tuple of (names, correlation matrix)
+    """
+    sides = by_side(table)
+    names = [*CRITERIA, "score"]
+    matrix = np.vstack([sides[name] for name in names])
+    matrix = matrix[:, ~np.isnan(matrix).any(axis=0)]
+    if matrix.shape[1] < 2:
+        return names, np.full((len(names), len(names)), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return names, np.corrcoef(matrix)
+
+
+def bootstrap_ci(groups, values, n_resamples=1000, confidence=0.95, seed=0):
+    """
+    Percentile bootstrap confidence interval of the mean of ``values`` per group.
+
+    All resamples of a group are drawn as one (n_resamples, n) index matrix.
+
+    :return: Dictionary of group to (low, high)
+    """
+    rng = np.random.default_rng(seed)
+    alpha = (1 - confidence) / 2
+    intervals = {}
+    for name in np.unique(groups[groups != ""]):
+        group_values = values[groups == name]
+        samples = rng.integers(0, len(group_values), (n_resamples, len(group_values)))
+        means = group_values[samples].mean(axis=1)
+        low, high = np.quantile(means, [alpha, 1 - alpha])
+        intervals[name] = (float(low), float(high))
+    return intervals
+
+
+def print_rows(title, rows):
+    print(f"\n{title}")
+    for row in rows:
+        interval = (
+            f"  [{row['ci_low']:.2f}, {row['ci_high']:.2f}]" if "ci_low" in row else ""
+        )
+        print(
+            f"  {row['name'][:60]:<60} {row['debates']:>6} debates  "
+            f"mean {row['mean']:6.2f}{interval}  var {row['variance']:6.2f}  "
+            f"win {row['win_rate']:.1%}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score analytics over stored evaluations")
+    parser.add_argument("--run", help="only include debates from this run ID")
+    parser.add_argument("--bootstrap", type=int, default=1000, help="bootstrap resamples")
+    parser.add_argument("--parquet", metavar="PATH", help="also export the score table")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    table = load_score_table(run_id=args.run)
+    loaded = time.perf_counter()
+    print_rows("Models", model_leaderboard(table, args.bootstrap))
+    print_rows("Styles", style_win_rates(table))
+    names, correlations = criterion_correlations(table)
+    print("\nCorrelation with total score")
+    for name, value in zip(names[:-1], correlations[-1]):
+        print(f"  {name:<40} {value:6.2f}")
+    print(
+        f"\n{len(table['debate_id'])} debates loaded in {loaded - start_time:.3f}s, "
+        f"analyzed in {time.perf_counter() - loaded:.3f}s"
+    )
+
+    if args.parquet:
+        import pyarrow.parquet as pq
+
+        pq.write_table(to_arrow(table), args.parquet)
+        print(f"Score table written to {args.parquet}")
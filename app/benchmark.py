@@ -0,0 +1,683 @@
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_openrouter import start_fake_server
+
+
+QUESTION = "Should artificial intelligence be given the same rights as humans? Why or why not?"
+BENCH_MODELS = [
+    "openai/gpt-4o-2024-08-06",
+    "meta-llama/llama-3.1-405b-instruct",
+    "google/gemini-pro-1.5",
+    "anthropic/claude-3.5-sonnet",
+]
+
+
+def use_fake_server(latency):
+    """Point every OpenRouter client at a local fake server; call before creating clients."""
+    server, base_url = start_fake_server(latency=latency)
+    os.environ["OPENROUTER_BASE_URL"] = base_url
+    os.environ.setdefault("OPENROUTER_API_KEY", "fake")
+    return server
+
+
+def use_fake_provider(latency, error_rate=0.0):
+    """In-process alternative to use_fake_server: no sockets or server threads."""
+    from providers import FakeProvider, set_provider
+
+    # Tracing the fake provider would only add noise (and need the network)
+    os.environ.setdefault("WEAVE_PROJECT", "")
+    provider = FakeProvider(latency=latency, error_rate=error_rate)
+    set_provider(provider)
+    return provider
+
+
+def make_debate_tasks(num_debates, num_iterations, distinct=False):
+    """
+    :param distinct: Give every debate its own styles, so deterministic fake
+        completions do not make debates between the same models identical
+    """
+    tasks = []
+    for i in range(num_debates):
+        subset = [
+            BENCH_MODELS[(2 * i) % len(BENCH_MODELS)],
+            BENCH_MODELS[(2 * i + 1) % len(BENCH_MODELS)],
+        ]
+        styles = [f"Benchmark style {i}{side}" for side in "ab"] if distinct else []
+        tasks.append((QUESTION, num_iterations, subset, styles))
+    return tasks
+
+
+def unthrottle(concurrency):
+    """
+    Lift the production rate limits so benchmarks measure the engine rather
+    than the limits, and start from fresh lanes so no earlier run's adaptive
+    concurrency carries over.
+    """
+    from scheduler import scheduler
+
+    scheduler.limits = {}
+    scheduler.default_limit = {
+        "rpm": 10**9,
+        "tpm": 10**12,
+        "max_concurrency": concurrency,
+    }
+    scheduler.lanes.clear()
+
+
+def timed(func):
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func()
+    return result, time.perf_counter() - start_time
+
+
+def bench_engine(args):
+    """Compare the old thread-pool path with the asyncio engine on the same debates."""
+    server = None
+    if args.backend == "server":
+        server = use_fake_server(args.latency)
+    else:
+        use_fake_provider(args.latency, args.error_rate)
+    import engine
+
+    tasks = make_debate_tasks(args.debates, args.iterations)
+    calls = args.debates * (1 + 2 * args.iterations)
+
+    def run_single_debate_sync(task):
+        # The old model: one blocking debate per worker thread, each on its own
+        # event loop, so nothing is shared between debates
+        async def single_debate():
+            limiter = engine.ConcurrencyLimiter()
+            return await engine.run_single_debate(*task, limiter=limiter)
+
+        return asyncio.run(single_debate())
+
+    def threaded():
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            return list(executor.map(run_single_debate_sync, tasks))
+
+    def asyncio_engine():
+        return asyncio.run(
+            engine.gather_debates(
+                tasks,
+                max_concurrency=args.concurrency,
+                per_model_concurrency=args.concurrency,
+            )
+        )
+
+    print(
+        f"{args.debates} debates x {args.iterations} iterations "
+        f"({calls} LLM calls, {args.latency:.2f}s simulated latency)"
+    )
+    for name, func in [("threadpool", threaded), ("asyncio", asyncio_engine)]:
+        if not args.throttled:
+            # Both arms get the same limits and fresh lanes
+            unthrottle(args.concurrency)
+        debates, elapsed = timed(func)
+        print(
+            f"{name:>10}: {elapsed:7.2f}s  {len(debates) / elapsed:7.2f} debates/s  "
+            f"{calls / elapsed:8.2f} calls/s"
+        )
+
+    if server is not None:
+        server.shutdown()
+
+
+def synthetic_evaluations(count, seed=0):
+    rng = random.Random(seed)
+    for i in range(count):
+        yield f"debate_{i}", {
+            "debate_text": "",
+            "evaluation": {
+                "proponent": {"score": rng.randint(7, 35), "reasoning": ""},
+                "opponent": {"score": rng.randint(7, 35), "reasoning": ""},
+            },
+        }
+
+
+def peak_rss_mb():
+    # ru_maxrss is kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_topk(args):
+    """Single-pass heap selection over a stream vs two full sorts of a loaded dict."""
+    from helper import select_debates
+
+    def full_sort():
+        debates = dict(synthetic_evaluations(args.debates))
+
+        def scores(item):
+            evaluation = item[1]["evaluation"]
+            return evaluation["proponent"]["score"], evaluation["opponent"]["score"]
+
+        top = sorted(debates.items(), key=lambda x: max(scores(x)), reverse=True)
+        bottom = sorted(debates.items(), key=lambda x: min(scores(x)))
+        return dict(top[: args.k]), dict(bottom[: args.k])
+
+    def heap_select():
+        return select_debates(synthetic_evaluations(args.debates), args.k)
+
+    print(f"top/bottom {args.k} of {args.debates} debates")
+    # Streaming first, so its peak RSS is not inflated by the loaded dict
+    results = {}
+    for name, func in [("heap", heap_select), ("sorted", full_sort)]:
+        results[name], elapsed = timed(func)
+        print(f"{name:>10}: {elapsed:7.2f}s  peak RSS {peak_rss_mb():8.1f} MB")
+    assert results["heap"] == results["sorted"], "selections differ"
+
+
+# Modules every pipeline entry point imports, for the startup measurement
+STARTUP_MODULES = "engine, evaluator, helper, extract_findings"
+
+
+def percentiles(values):
+    """:return: Nearest-rank p50, p95 and p99 of ``values``, or None when empty"""
+    if not values:
+        return None
+    values = sorted(values)
+    return {
+        f"p{q}": values[max(math.ceil(q / 100 * len(values)) - 1, 0)]
+        for q in (50, 95, 99)
+    }
+
+
+def repeated(func, repeat):
+    """:return: Tuple of (last result, list of per-call seconds)"""
+    durations = []
+    for _ in range(repeat):
+        result, elapsed = timed(func)
+        durations.append(elapsed)
+    return result, durations
+
+
+def stage_result(stage, seconds, items, latencies):
+    return {
+        "stage": stage,
+        "seconds": seconds,
+        "items": items,
+        "throughput": items / seconds if seconds else None,
+        "latency": percentiles(latencies),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_point(args):
+    """
+    One sweep point of the suite, run by bench_suite in a fresh process and
+    working directory so caches, the results store and peak RSS start empty.
+
+    LLM stages report per-request latency from telemetry; in-process stages
+    are repeated ``--repeat`` times and report per-call latency.
+    """
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        import engine
+        import evaluator
+        import extract_findings
+        import helper
+        from results_store import results_store
+        from telemetry import telemetry
+    import_seconds = time.perf_counter() - start_time
+
+    if args.unthrottled:
+        unthrottle(args.concurrency)
+
+    def request_latencies(first):
+        return [record["latency"] for record in telemetry.since(first)]
+
+    stages = []
+    tasks = make_debate_tasks(args.debates, args.iterations, distinct=True)
+    first = telemetry.count
+    debates, elapsed = timed(
+        lambda: asyncio.run(
+            engine.gather_debates(
+                tasks,
+                max_concurrency=args.concurrency,
+                per_model_concurrency=args.concurrency,
+            )
+        )
+    )
+    stages.append(
+        stage_result("run_debates", elapsed, len(debates), request_latencies(first))
+    )
+
+    first = telemetry.count
+    evaluations, elapsed = timed(
+        lambda: evaluator.evaluate_all_debates(debates, max_workers=args.concurrency)
+    )
+    stages.append(
+        stage_result(
+            "evaluate_all_debates", elapsed, len(evaluations), request_latencies(first)
+        )
+    )
+
+    _, durations = repeated(
+        lambda: (
+            helper.sort_debates(evaluations, args.k, "top"),
+            helper.sort_debates(evaluations, args.k, "bottom"),
+        ),
+        args.repeat,
+    )
+    stages.append(
+        stage_result(
+            "sort_debates", sum(durations), len(evaluations) * args.repeat, durations
+        )
+    )
+
+    # Label the best and worst debates, as a reviewer would in the app
+    results_store.record_run(
+        telemetry.run_id,
+        {
+            "benchmark": "suite",
+            "debates": args.debates,
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+        },
+    )
+    results_store.record_evaluations(
+        telemetry.run_id,
+        evaluations,
+        {f"debate_{index}": debate for index, debate in enumerate(debates, 1)},
+    )
+    top, bottom = helper.select_debates(
+        results_store.evaluations(telemetry.run_id), args.k
+    )
+    for label, selected in (("good", top), ("bad", bottom)):
+        for entry in selected.values():
+            scores = entry["evaluation"]
+            winner = (
+                "proponent"
+                if scores["proponent"]["score"] >= scores["opponent"]["score"]
+                else "opponent"
+            )
+            results_store.add_label(entry["debate_id"], label, winner)
+    extracted, durations = repeated(extract_findings.extract_both_debates, args.repeat)
+    stages.append(
+        stage_result(
+            "extract_debates",
+            sum(durations),
+            sum(len(examples) for examples in extracted) * args.repeat,
+            durations,
+        )
+    )
+
+    result = {
+        "debates": args.debates,
+        "iterations": args.iterations,
+        "concurrency": args.concurrency,
+        "import_seconds": import_seconds,
+        "llm_calls": telemetry.count,
+        "llm_errors": sum("error" in record for record in telemetry.snapshot()),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stages,
+    }
+    with open(args.output, "w") as f:
+        json.dump(result, f)
+
+
+def sandbox(root, name):
+    """A working directory with the app's relative paths (styles, caches)."""
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    os.symlink(os.path.dirname(os.path.abspath(__file__)), os.path.join(path, "app"))
+    return path
+
+
+def measure_startup(env, cwd, repeat):
+    """
+    :return: Median wall-clock seconds of a bare interpreter and of one that
+        imports STARTUP_MODULES
+    """
+
+    def wall_time(code):
+        durations = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            subprocess.run(
+                [sys.executable, "-c", code],
+                env=env,
+                cwd=cwd,
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+            durations.append(time.perf_counter() - start_time)
+        return statistics.median(durations)
+
+    interpreter = wall_time("pass")
+    total = wall_time(f"import {STARTUP_MODULES}")
+    return {"interpreter": interpreter, "total": total, "imports": total - interpreter}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_point(point):
+    print(
+        f"\n{point['debates']} debates x {point['iterations']} iterations, "
+        f"concurrency {point['concurrency']}: {point['llm_calls']} LLM calls, "
+        f"{point['llm_errors']} failed, peak RSS {point['peak_rss_mb']:.1f} MB"
+    )
+    for stage in point["stages"]:
+        latency = stage["latency"] or {"p50": 0, "p95": 0, "p99": 0}
+        print(
+            f"  {stage['stage']:>20}: {stage['seconds']:8.3f}s  "
+            f"{stage['throughput'] or 0:10.1f} items/s  "
+            f"p50 {latency['p50'] * 1000:8.1f}ms  p95 {latency['p95'] * 1000:8.1f}ms  "
+            f"p99 {latency['p99'] * 1000:8.1f}ms"
+        )
+
+
+def compare(report, baseline):
+    """Print throughput and p95 changes against an earlier report."""
+    print(f"\nAgainst {baseline.get('commit') or 'baseline'}:")
+    earlier = {
+        (p["debates"], p["iterations"], p["concurrency"], s["stage"]): s
+        for p in baseline["points"]
+        for s in p["stages"]
+    }
+    for point in report["points"]:
+        for stage in point["stages"]:
+            key = (
+                point["debates"],
+                point["iterations"],
+                point["concurrency"],
+                stage["stage"],
+            )
+            old = earlier.get(key)
+            if not old or not old["throughput"] or not stage["throughput"]:
+                continue
+            change = stage["throughput"] / old["throughput"] - 1
+            p95 = ""
+            if old["latency"] and stage["latency"] and old["latency"]["p95"]:
+                p95_change = stage["latency"]["p95"] / old["latency"]["p95"] - 1
+                p95 = f"  p95 {p95_change:+7.1%}"
+            print(
+                f"  {key[0]:>6} x {key[1]} @ {key[2]:<4} {key[3]:>20}: "
+                f"throughput {change:+7.1%}{p95}"
+            )
+
+
+def bench_suite(args):
+    """
+    Sweep debates x iterations x concurrency through debate, evaluation,
+    selection and extraction against the in-process fake provider, and write
+    the results as JSON.
+    """
+    env = dict(
+        os.environ,
+        LLM_PROVIDER="fake",
+        WEAVE_PROJECT="",
+        FAKE_LLM_LATENCY=str(args.latency),
+        FAKE_LLM_LATENCY_SIGMA=str(args.latency_sigma),
+        FAKE_LLM_TOKEN_LATENCY=str(args.token_latency),
+        FAKE_LLM_ERROR_RATE=str(args.error_rate),
+        # Relative to each sandbox, even if set to shared paths outside it
+        RESULTS_DB=os.path.join("results", "debates.sqlite3"),
+        TELEMETRY_LOG=os.path.join("telemetry", "llm_calls.jsonl"),
+        PYTHONPATH=os.path.dirname(os.path.abspath(__file__)),
+    )
+    report = {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {
+            "latency": args.latency,
+            "latency_sigma": args.latency_sigma,
+            "token_latency": args.token_latency,
+            "error_rate": args.error_rate,
+            "k": args.k,
+            "repeat": args.repeat,
+            "unthrottled": not args.throttled,
+        },
+        "points": [],
+    }
+
+    with tempfile.TemporaryDirectory() as root:
+        report["startup"] = measure_startup(
+            env, sandbox(root, "startup"), args.startup_repeat
+        )
+        print(
+            f"Startup: {report['startup']['total']:.3f}s "
+            f"({report['startup']['imports']:.3f}s importing {STARTUP_MODULES})"
+        )
+        sweep = [
+            (debates, iterations, concurrency)
+            for debates in args.debates
+            for iterations in args.iterations
+            for concurrency in args.concurrency
+        ]
+        for index, (debates, iterations, concurrency) in enumerate(sweep):
+            cwd = sandbox(root, f"point{index}")
+            output = os.path.join(cwd, "point.json")
+            command = [
+                sys.executable,
+                os.path.abspath(__file__),
+                "point",
+                f"--debates={debates}",
+                f"--iterations={iterations}",
+                f"--concurrency={concurrency}",
+                f"-k={args.k}",
+                f"--repeat={args.repeat}",
+                f"--output={output}",
+            ]
+            if not args.throttled:
+                command.append("--unthrottled")
+            subprocess.run(command, env=env, cwd=cwd, check=True)
+            with open(output) as f:
+                point = json.load(f)
+            report["points"].append(point)
+            print_point(point)
+
+    path = args.output or os.path.join(
+        "benchmarks",
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{report['commit'] or 'unknown'}.json",
+    )
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+
+# Modules whose import cost the pipeline's entry points pay
+IMPORT_MODULES = ["start", "evaluator", "style_generator", "engine", "pipeline"]
+
+
+def import_profile(module, env, cwd):
+    """
+    Import ``module`` in a fresh interpreter under ``python -X importtime``.
+
+    :return: Tuple of (cumulative seconds, {top-level package: self seconds})
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0.0
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        name = name.strip()
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(self_us) / 1e6
+        if name == module:
+            total = int(cumulative_us) / 1e6
+    return total, packages
+
+
+def created_files(path):
+    """Files under a sandbox other than its ``app`` link: import side effects."""
+    return sorted(
+        os.path.relpath(os.path.join(directory, name), path)
+        for directory, subdirectories, names in os.walk(path)
+        for name in names
+    )
+
+
+def bench_imports(args):
+    """
+    Cold import time of each entry-point module with ``python -X importtime``,
+    the slowest packages it pulls in, and any files importing it creates.
+    """
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    report = {"commit": git_commit(), "python": sys.version.split()[0], "modules": {}}
+    with tempfile.TemporaryDirectory() as root:
+        for module in args.modules:
+            cwd = sandbox(root, module)
+            totals = []
+            for _ in range(args.repeat):
+                total, packages = import_profile(module, env, cwd)
+                totals.append(total)
+            slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+            side_effects = created_files(cwd)
+            report["modules"][module] = {
+                "seconds": statistics.median(totals),
+                "slowest_packages": dict(slowest[: args.top]),
+                "created_files": side_effects,
+            }
+            print(f"{module:>16}: {statistics.median(totals):7.3f}s")
+            for package, seconds in slowest[: args.top]:
+                print(f"{'':>18}{package:<24} {seconds:7.3f}s")
+            if side_effects:
+                print(f"{'':>18}created on import: {', '.join(side_effects)}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Debate arena benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    engine_parser = subparsers.add_parser(
+        "engine", help="thread pool vs asyncio debate engine against a fake server"
+    )
+    engine_parser.add_argument("--debates", type=int, default=200)
+    engine_parser.add_argument("--iterations", type=int, default=3)
+    engine_parser.add_argument("--latency", type=float, default=0.2)
+    engine_parser.add_argument("--concurrency", type=int, default=256)
+    engine_parser.add_argument(
+        "--backend",
+        choices=("server", "in-process"),
+        default="server",
+        help="fake HTTP server, or the in-process fake provider",
+    )
+    engine_parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="share of failed requests (in-process backend only)",
+    )
+    engine_parser.add_argument(
+        "--throttled",
+        action="store_true",
+        help="keep the scheduler's production rate limits",
+    )
+    engine_parser.set_defaults(func=bench_engine)
+
+    topk_parser = subparsers.add_parser(
+        "topk", help="heap top-k/bottom-k selection vs full sorts"
+    )
+    topk_parser.add_argument("--debates", type=int, default=1_000_000)
+    topk_parser.add_argument("-k", type=int, default=10)
+    topk_parser.set_defaults(func=bench_topk)
+
+    suite_parser = subparsers.add_parser(
+        "suite",
+        help="end-to-end sweep of debate, evaluation, selection and extraction",
+    )
+    suite_parser.add_argument("--debates", type=int, nargs="+", default=[10, 50])
+    suite_parser.add_argument("--iterations", type=int, nargs="+", default=[1, 3])
+    suite_parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 64])
+    suite_parser.add_argument(
+        "--latency", type=float, default=0.2, help="median seconds per request"
+    )
+    suite_parser.add_argument(
+        "--latency-sigma",
+        type=float,
+        default=0.6,
+        help="log-normal spread of request latency",
+    )
+    suite_parser.add_argument("--token-latency", type=float, default=0.002)
+    suite_parser.add_argument("--error-rate", type=float, default=0.0)
+    suite_parser.add_argument("-k", type=int, default=10)
+    suite_parser.add_argument(
+        "--repeat", type=int, default=5, help="runs of each in-process stage"
+    )
+    suite_parser.add_argument("--startup-repeat", type=int, default=5)
+    suite_parser.add_argument(
+        "--throttled",
+        action="store_true",
+        help="keep the scheduler's production rate limits",
+    )
+    suite_parser.add_argument("--output", help="JSON report path")
+    suite_parser.add_argument(
+        "--baseline", metavar="JSON", help="earlier report to compare against"
+    )
+    suite_parser.set_defaults(func=bench_suite)
+
+    imports_parser = subparsers.add_parser(
+        "imports", help="cold import time of the entry-point modules"
+    )
+    imports_parser.add_argument("modules", nargs="*", default=IMPORT_MODULES)
+    imports_parser.add_argument("--repeat", type=int, default=5)
+    imports_parser.add_argument(
+        "--top", type=int, default=5, help="slowest packages listed per module"
+    )
+    imports_parser.add_argument("--output", help="JSON report path")
+    imports_parser.set_defaults(func=bench_imports)
+
+    point_parser = subparsers.add_parser("point", help="one suite sweep point")
+    point_parser.add_argument("--debates", type=int, required=True)
+    point_parser.add_argument("--iterations", type=int, required=True)
+    point_parser.add_argument("--concurrency", type=int, required=True)
+    point_parser.add_argument("-k", type=int, default=10)
+    point_parser.add_argument("--repeat", type=int, default=5)
+    point_parser.add_argument("--unthrottled", action="store_true")
+    point_parser.add_argument("--output", required=True)
+    point_parser.set_defaults(func=bench_point)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+from functools import lru_cache
+
+
+DEFAULT_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name=DEFAULT_ENCODING):
+    import tiktoken
+
+    return tiktoken.get_encoding(name)
+
+
+def count_tokens(text, encoding=DEFAULT_ENCODING):
+    return len(get_encoding(encoding).encode(text))
+
+
+class DebateHistory:
+    """
+    Debate transcript maintained incrementally as turns are appended.
+
+    Appending only records the turn. The full text is extended with the turns
+    appended since it was last read, and per-turn token counts are computed
+    lazily, so context policies never re-join or re-tokenize earlier turns.
+    """
+
+    def __init__(self):
+        self.turns = []
+        # Argument text of each turn, without the speaker prefix
+        self.arguments = []
+        self.summary = None
+        # Turns before this index are covered by the summary
+        self.summarized_upto = 0
+        self._token_counts = []
+        # Joined text and the number of turns it covers
+        self._text = ""
+        self._text_turns = 0
+
+    def append(self, line, argument=None):
+        """
+        :param argument: The turn's argument alone; defaults to the whole line
+        """
+        self.turns.append(line)
+        self.arguments.append(line if argument is None else argument)
+
+    @property
+    def text(self):
+        if self._text_turns != len(self.turns):
+            new = "\n".join(self.turns[self._text_turns :])
+            self._text = f"{self._text}\n{new}" if self._text_turns else new
+            self._text_turns = len(self.turns)
+        return self._text
+
+    def tokens(self, index):
+        while len(self._token_counts) <= index:
+            self._token_counts.append(count_tokens(self.turns[len(self._token_counts)]))
+        return self._token_counts[index]
+
+    def render(self, start):
+        """Summary (if any) followed by the turns from ``start`` onwards."""
+        start = max(start, self.summarized_upto)
+        if start == 0:
+            return self.text
+        recent = "\n".join(self.turns[start:])
+        if self.summary is None:
+            return recent
+        return f"Summary of earlier arguments: {self.summary}\n{recent}"
+
+    def __len__(self):
+        return len(self.turns)
+
+
+class ContextPolicy:
+    """
+    Decides which part of a DebateHistory is sent with each turn.
+
+    Policies are stateless (all state lives in the history), so one instance
+    can be shared by every debate in a run.
+    """
+
+    async def prepare(self, history, summarize):
+        """Hook for policies that update the history before a turn."""
+
+    def start(self, history):
+        """Index of the oldest turn to include verbatim."""
+        return 0
+
+    def render(self, history):
+        return history.render(self.start(history))
+
+
+class FullHistory(ContextPolicy):
+    """Send the whole transcript every turn (the original behavior)."""
+
+
+class SlidingWindow(ContextPolicy):
+    """Send only the last ``k`` turns."""
+
+    def __init__(self, k=4):
+        self.k = k
+
+    def start(self, history):
+        return max(len(history) - self.k, 0)
+
+
+class RollingSummary(ContextPolicy):
+    """
+    Fold older turns into a running summary every ``every_n`` turns, keeping
+    the last ``keep_last`` turns verbatim.
+    """
+
+    def __init__(self, every_n=4, keep_last=2):
+        self.every_n = every_n
+        self.keep_last = keep_last
+
+    async def prepare(self, history, summarize):
+        fold_upto = len(history) - self.keep_last
+        if fold_upto - history.summarized_upto < self.every_n:
+            return
+        text = "\n".join(history.turns[history.summarized_upto : fold_upto])
+        if history.summary is not None:
+            text = f"Summary of earlier arguments: {history.summary}\n{text}"
+        history.summary = await summarize(text)
+        history.summarized_upto = fold_upto
+
+    def start(self, history):
+        return history.summarized_upto
+
+
+class TokenBudget(ContextPolicy):
+    """
+    Cap the verbatim turns of another policy at ``max_tokens``, dropping the
+    oldest turns first.
+    """
+
+    def __init__(self, max_tokens=2000, inner=None):
+        self.max_tokens = max_tokens
+        self.inner = inner or FullHistory()
+
+    async def prepare(self, history, summarize):
+        await self.inner.prepare(history, summarize)
+
+    def start(self, history):
+        start = max(self.inner.start(history), history.summarized_upto)
+        used = 0
+        index = len(history)
+        while index > start:
+            used += history.tokens(index - 1)
+            if used > self.max_tokens:
+                break
+            index -= 1
+        return index
+
+
+CONTEXT_POLICIES = {
+    "Full history": FullHistory(),
+    "Last 4 turns": SlidingWindow(4),
+    "Rolling summary": RollingSummary(every_n=4, keep_last=2),
+    "2000-token budget": TokenBudget(2000, RollingSummary(every_n=4, keep_last=2)),
+}
@@ -0,0 +1,212 @@
+import json
+from typing import NamedTuple, Optional
+
+
+ROLES = ("proponent", "opponent")
+# Separator of the debate_text format written before DebateRecord.render
+LEGACY_SEPARATOR = ";;"
+
+
+class Turn(NamedTuple):
+    agent: str
+    role: str
+    # 0 for opening statements, None for closing statements and unknown
+    iteration: Optional[int]
+    text: str
+    # Completion tokens and seconds spent generating the turn, when measured
+    tokens: Optional[int] = None
+    latency: Optional[float] = None
+
+
+class DebateRecord:
+    """
+    One debate as a flat list of turns, in speaking order.
+
+    This is the single structured form of a debate: the evaluator renders its
+    prompt from it, the results store keeps its turns as rows, and the UI and
+    the exemplar extractor read turns by role instead of re-parsing text.
+    Records serialize to compact JSON (turns as arrays) for JSONL files, or to
+    msgpack when the ``msgpack`` package is installed.
+    """
+
+    __slots__ = ("topic", "turns", "models", "styles", "stopped_after")
+
+    def __init__(self, topic, turns=(), models=None, styles=None, stopped_after=None):
+        self.topic = topic
+        self.turns = list(turns)
+        self.models = models
+        self.styles = styles
+        self.stopped_after = stopped_after
+
+    @classmethod
+    def from_debate(cls, debate):
+        """
+        :param debate: Debate dictionary from engine.simulate_debate; turns
+            without a ``role`` (debates saved before roles were recorded) get
+            one by speaking order, the first agent being the proponent
+        """
+        roles = {}
+
+        def turn(entry, text, iteration):
+            agent = entry["agent"]
+            role = entry.get("role") or roles.get(agent) or ROLES[min(len(roles), 1)]
+            roles.setdefault(agent, role)
+            return Turn(
+                agent, role, iteration, text, entry.get("tokens"), entry.get("latency")
+            )
+
+        turns = [
+            turn(statement, statement["statement"], 0)
+            for statement in debate.get("opening_statements", [])
+        ]
+        for iteration in debate["iterations"]:
+            turns += [
+                turn(argument, argument["argument"], iteration["iteration"])
+                for argument in iteration["arguments"]
+            ]
+        turns += [
+            turn(statement, statement["statement"], None)
+            for statement in debate.get("closing_statements", [])
+        ]
+        return cls(
+            debate["topic"],
+            turns,
+            debate.get("models"),
+            debate.get("styles"),
+            debate.get("stopped_after"),
+        )
+
+    @classmethod
+    def parse(cls, debate_text):
+        """
+        Recover a record from stored debate text, for rows and files saved
+        without their debate dictionary. Reads both the rendered format and the
+        older ``;;``-separated one. Roles follow speaking order.
+        """
+        if LEGACY_SEPARATOR in debate_text:
+            topic, *parts = debate_text.split(LEGACY_SEPARATOR)
+            speeches = []
+            for part in parts:
+                agent, _, text = part.strip("'").partition(":\n")
+                if text:
+                    speeches.append((agent, text))
+        else:
+            topic, *parts = debate_text.split("\n\n")
+            speeches = []
+            for part in parts:
+                agent, separator, text = part.partition(":\n")
+                agents = {agent for agent, _ in speeches}
+                # A paragraph break inside a turn stays part of that turn
+                starts_turn = (
+                    separator
+                    and "\n" not in agent
+                    and (len(agents) < len(ROLES) or agent in agents)
+                )
+                if starts_turn or not speeches:
+                    speeches.append((agent, text) if separator else ("", part))
+                else:
+                    speeches[-1] = (speeches[-1][0], f"{speeches[-1][1]}\n\n{part}")
+
+        roles = {}
+        turns = []
+        for agent, text in speeches:
+            role = roles.setdefault(agent, ROLES[min(len(roles), 1)])
+            turns.append(Turn(agent, role, None, text))
+        return cls(topic.removeprefix("Topic: "), turns)
+
+    def render(self):
+        """:return: The debate text sent to judges and stored with evaluations"""
+        return "\n\n".join(
+            [
+                f"Topic: {self.topic}",
+                *(f"{turn.agent}:\n{turn.text}" for turn in self.turns),
+            ]
+        )
+
+    def side(self, role):
+        """:return: Turns of ``proponent`` or ``opponent``, in order"""
+        return [turn for turn in self.turns if turn.role == role]
+
+    def to_dict(self):
+        return {
+            "topic": self.topic,
+            "models": self.models,
+            "styles": self.styles,
+            "stopped_after": self.stopped_after,
+            "turns": [list(turn) for turn in self.turns],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["topic"],
+            [Turn(*turn) for turn in data["turns"]],
+            data.get("models"),
+            data.get("styles"),
+            data.get("stopped_after"),
+        )
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, line):
+        return cls.from_dict(json.loads(line))
+
+    def to_msgpack(self):
+        import msgpack
+
+        return msgpack.packb(self.to_dict())
+
+    @classmethod
+    def from_msgpack(cls, data):
+        import msgpack
+
+        return cls.from_dict(msgpack.unpackb(data))
+
+    def __eq__(self, other):
+        return isinstance(other, DebateRecord) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"DebateRecord(topic={self.topic!r}, turns={len(self.turns)})"
+
+
+def write_records(records, path):
+    """
+    Write records to ``path``: msgpack when it ends in ``.msgpack``, otherwise
+    one JSON record per line.
+
+    :return: Number of records written
+    """
+    count = 0
+    if path.endswith(".msgpack"):
+        import msgpack
+
+        packer = msgpack.Packer()
+        with open(path, "wb") as f:
+            for record in records:
+                f.write(packer.pack(record.to_dict()))
+                count += 1
+        return count
+
+    with open(path, "w") as f:
+        for record in records:
+            f.write(record.to_json() + "\n")
+            count += 1
+    return count
+
+
+def iter_records(path):
+    """Stream records from a file written by write_records, one at a time."""
+    if path.endswith(".msgpack"):
+        import msgpack
+
+        with open(path, "rb") as f:
+            for data in msgpack.Unpacker(f, raw=False):
+                yield DebateRecord.from_dict(data)
+        return
+
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield DebateRecord.from_json(line)
@@ -0,0 +1,156 @@
+import math
+import re
+from collections import Counter
+
+
+def ngrams(text, n=3):
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i : i + n]) for i in range(len(words) - n + 1)}
+
+
+def overlap(a, b):
+    """Jaccard similarity of two n-gram sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class EarlyStopPolicy:
+    """
+    Decides after each debate iteration whether the remaining rounds are worth
+    running. Like context policies, policies are stateless so one instance can
+    be shared by every debate in a run.
+    """
+
+    async def should_stop(self, history, iteration, judge):
+        """
+        :param history: context.DebateHistory; turns alternate between agents
+        :param iteration: Number of completed iterations
+        :param judge: Async function from debate text to an engine.QuickVerdict
+        """
+        return False
+
+
+class NeverStop(EarlyStopPolicy):
+    """Always run every iteration (the original behavior)."""
+
+
+class RepetitionStop(EarlyStopPolicy):
+    """
+    Stop when both agents are repeating themselves: each agent's latest
+    argument shares at least ``threshold`` of its word n-grams (Jaccard) with
+    one of their earlier arguments.
+    """
+
+    def __init__(self, threshold=0.5, n=3, min_iterations=2):
+        self.threshold = threshold
+        self.n = n
+        self.min_iterations = min_iterations
+
+    async def should_stop(self, history, iteration, judge):
+        if iteration < self.min_iterations:
+            return False
+        # Turns alternate between the two agents. Only the arguments are
+        # compared, so the speaker prefix shared by every turn of an agent
+        # does not count as repetition.
+        for agent in range(2):
+            turns = history.arguments[agent::2]
+            latest = ngrams(turns[-1], self.n)
+            repetition = max(
+                (overlap(latest, ngrams(turn, self.n)) for turn in turns[:-1]),
+                default=0.0,
+            )
+            if repetition < self.threshold:
+                return False
+        return True
+
+
+class JudgeStop(EarlyStopPolicy):
+    """
+    Ask a cheap judge model after each iteration and stop once it names a
+    winner with at least ``confidence``.
+    """
+
+    def __init__(self, confidence=0.85, min_iterations=2):
+        self.confidence = confidence
+        self.min_iterations = min_iterations
+
+    async def should_stop(self, history, iteration, judge):
+        if iteration < self.min_iterations:
+            return False
+        verdict = await judge(history.text)
+        return verdict.winner != "undecided" and verdict.confidence >= self.confidence
+
+
+class AnyOf(EarlyStopPolicy):
+    """Stop when any policy would; cheaper policies should come first."""
+
+    def __init__(self, *policies):
+        self.policies = policies
+
+    async def should_stop(self, history, iteration, judge):
+        for policy in self.policies:
+            if await policy.should_stop(history, iteration, judge):
+                return True
+        return False
+
+
+EARLY_STOP_POLICIES = {
+    "Never": NeverStop(),
+    "Repetition": RepetitionStop(),
+    "Repetition or decisive judge": AnyOf(RepetitionStop(), JudgeStop()),
+}
+
+
+class LeaderTest:
+    """
+    Sequential test for the best model of a run.
+
+    Each evaluated debate counts a win (ties: half) for one model against
+    another. The run is decided once the leader's win-rate lower bound is
+    above every other model's upper bound. The bounds are Hoeffding intervals
+    with a union bound over models and debate counts, so checking after every
+    debate keeps the overall error rate below ``alpha``.
+    """
+
+    def __init__(self, alpha=0.05, min_debates=4):
+        self.alpha = alpha
+        self.min_debates = min_debates
+        self.wins = Counter()
+        self.games = Counter()
+        self.debates = 0
+
+    def record(self, proponent_model, opponent_model, evaluation):
+        scores = evaluation["evaluation"]
+        proponent = scores["proponent"]["score"]
+        opponent = scores["opponent"]["score"]
+        self.debates += 1
+        if proponent_model == opponent_model:
+            return
+        self.games[proponent_model] += 1
+        self.games[opponent_model] += 1
+        tie = 0.5 * (proponent == opponent)
+        self.wins[proponent_model] += (proponent > opponent) + tie
+        self.wins[opponent_model] += (opponent > proponent) + tie
+
+    def bounds(self, model):
+        games = self.games[model]
+        rate = self.wins[model] / games
+        # Split alpha across models, then across debate counts
+        alpha = self.alpha / len(self.games)
+        radius = math.sqrt(math.log(4 * games**2 / alpha) / (2 * games))
+        return rate - radius, rate + radius
+
+    def leader(self):
+        """:return: The statistically determined best model, or None"""
+        if self.debates < self.min_debates or len(self.games) < 2:
+            return None
+        bounds = {model: self.bounds(model) for model in self.games}
+        best = max(bounds, key=lambda model: bounds[model][0])
+        if all(
+            bounds[best][0] > high
+            for model, (_, high) in bounds.items()
+            if model != best
+        ):
+            return best
+        return None
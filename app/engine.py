@@ -0,0 +1,633 @@
+import asyncio
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+from context import DebateHistory, FullHistory
+from prompt_cache import message_content
+from start import (
+    MODEL,
+    SYSTEM_CONTENT,
+    Scenario,
+    generate_user_content,
+    load_cached_scenario,
+    store_cached_scenario,
+)
+from providers import async_instructor_client, async_openai_client
+from style_generator import generate_style_prompt
+from scheduler import scheduler
+from telemetry import telemetry
+
+
+# Upper bound on LLM requests in flight across every debate in a run.
+DEFAULT_MAX_CONCURRENCY = 64
+# Upper bound on LLM requests in flight for any single model.
+DEFAULT_PER_MODEL_CONCURRENCY = 16
+# Cheap model used by context policies that summarize earlier turns.
+SUMMARY_MODEL = "openai/gpt-4o-mini"
+
+
+class ConcurrencyLimiter:
+    """
+    Global and per-model request limits shared by every debate in a run.
+
+    The model semaphore is acquired before the global one so a saturated model
+    never holds global slots that other models could use.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        per_model_concurrency=DEFAULT_PER_MODEL_CONCURRENCY,
+    ):
+        self.global_semaphore = asyncio.Semaphore(max_concurrency)
+        self.per_model_concurrency = per_model_concurrency
+        self.model_semaphores = {}
+
+    def for_model(self, model):
+        if model not in self.model_semaphores:
+            self.model_semaphores[model] = asyncio.Semaphore(
+                self.per_model_concurrency
+            )
+        return self.model_semaphores[model]
+
+    @asynccontextmanager
+    async def slot(self, model):
+        async with self.for_model(model):
+            async with self.global_semaphore:
+                yield
+
+
+class StreamStats:
+    """Time-to-first-token and decode speed of streamed turns, per model."""
+
+    def __init__(self):
+        self.by_model = defaultdict(list)
+
+    def record(self, model, time_to_first_token, tokens_per_second):
+        self.by_model[model].append((time_to_first_token, tokens_per_second))
+
+    def summary(self):
+        return {
+            model: {
+                "turns": len(samples),
+                "mean_time_to_first_token": sum(s[0] for s in samples) / len(samples),
+                "mean_tokens_per_second": sum(s[1] for s in samples) / len(samples),
+            }
+            for model, samples in self.by_model.items()
+        }
+
+
+stream_stats = StreamStats()
+
+
+async def stream_argument(model, messages, on_delta):
+    """
+    Stream one turn, calling on_delta with each content fragment.
+
+    :return: Tuple of (full argument text, stats dictionary, usage or None)
+    """
+    start_time = time.perf_counter()
+    first_token_time = None
+    parts = []
+    completion_tokens = None
+    usage = None
+
+    stream = await async_openai_client().chat.completions.create(
+        model=model,
+        messages=messages,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    async for chunk in stream:
+        if chunk.usage is not None:
+            usage = chunk.usage
+            completion_tokens = usage.completion_tokens
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if first_token_time is None:
+                first_token_time = time.perf_counter()
+            parts.append(delta)
+            on_delta(delta)
+
+    end_time = time.perf_counter()
+    first_token_time = first_token_time or end_time
+    # Providers that omit usage on streams fall back to one token per fragment
+    completion_tokens = completion_tokens or len(parts)
+    decode_time = end_time - first_token_time
+    stats = {
+        "time_to_first_token": first_token_time - start_time,
+        "tokens_per_second": completion_tokens / decode_time if decode_time else 0.0,
+        "completion_tokens": completion_tokens,
+    }
+    stream_stats.record(model, stats["time_to_first_token"], stats["tokens_per_second"])
+    return "".join(parts), stats, usage
+
+
+async def summarize_history(text, limiter):
+    messages = [
+        {"role": "system", "content": SYSTEM_CONTENT},
+        {
+            "role": "user",
+            "content": f"Summarize the debate so far in under 120 words, keeping each side's key arguments and rebuttals:\n{text}",
+        },
+    ]
+    with telemetry.track("summary", SUMMARY_MODEL) as call:
+        response = await scheduler.acall(
+            SUMMARY_MODEL,
+            lambda: async_instructor_client().chat.completions.create(
+                model=SUMMARY_MODEL, response_model=None, messages=messages
+            ),
+            messages=messages,
+            call=call,
+            slot=lambda: limiter.slot(SUMMARY_MODEL),
+        )
+        call["usage"] = response.usage
+    return response.choices[0].message.content
+
+
+# Instructor re-asks up to this many times when a verdict fails validation
+QUICK_JUDGE_RETRIES = 2
+
+
+class QuickVerdict(BaseModel):
+    winner: Literal["Agent 1", "Agent 2", "undecided"]
+    confidence: float = Field(ge=0, le=1)
+
+
+async def quick_judge(text, limiter):
+    """
+    Cheap mid-debate verdict for early-stop policies.
+
+    :return: QuickVerdict naming "Agent 1", "Agent 2" or "undecided", with a
+        confidence between 0 and 1
+    """
+    messages = [
+        {"role": "system", "content": SYSTEM_CONTENT},
+        {
+            "role": "user",
+            "content": f"Judge the debate so far. Answer with the winner as \"Agent 1\", \"Agent 2\" or \"undecided\", and your confidence from 0 to 1 that further rounds would not change the result:\n{text}",
+        },
+    ]
+    with telemetry.track("early_stop", SUMMARY_MODEL) as call:
+        verdict, completion = await scheduler.acall(
+            SUMMARY_MODEL,
+            lambda: async_instructor_client().chat.completions.create_with_completion(
+                model=SUMMARY_MODEL,
+                response_model=QuickVerdict,
+                messages=messages,
+                max_retries=QUICK_JUDGE_RETRIES,
+            ),
+            messages=messages,
+            call=call,
+            usage_of=lambda result: result[1].usage,
+            slot=lambda: limiter.slot(SUMMARY_MODEL),
+        )
+        call["usage"] = completion.usage
+    return verdict
+
+
+async def generate_scenario(question, limiter, reuse_cached=False):
+    if reuse_cached:
+        scenario = load_cached_scenario(question)
+        if scenario is not None:
+            return scenario
+
+    messages = [
+        {"role": "system", "content": SYSTEM_CONTENT},
+        {"role": "user", "content": generate_user_content(question)},
+    ]
+    with telemetry.track("scenario", MODEL) as call:
+        scenario, completion = await scheduler.acall(
+            MODEL,
+            lambda: async_instructor_client().chat.completions.create_with_completion(
+                model=MODEL,
+                response_model=Scenario,
+                messages=messages,
+                temperature=0.7,
+            ),
+            messages=messages,
+            call=call,
+            usage_of=lambda result: result[1].usage,
+            slot=lambda: limiter.slot(MODEL),
+        )
+        call["usage"] = completion.usage
+
+    if reuse_cached:
+        store_cached_scenario(question, scenario)
+    return scenario
+
+
+async def generate_argument(agent, iteration, model, context, limiter, stream, emit):
+    # Static persona first, then the append-only history, then the
+    # per-turn instruction, so consecutive turns share a cached prefix.
+    messages = [
+        {
+            "role": "system",
+            "content": message_content(
+                model, (f"You are {agent.persona}. {agent.instructions}", True)
+            ),
+        },
+        {
+            "role": "user",
+            "content": message_content(
+                model,
+                (f"Given the debate history:\n{context}", True),
+                (
+                    f"\n\nProvide your argument for iteration {iteration} of the debate. Keep it concise and look at the above arguments to make your point stronger. Speak like a debater and like a person. IT MUST BE LESS THAN 50 WORDS",
+                    False,
+                ),
+            ),
+        },
+    ]
+
+    with telemetry.track("turn", model) as call:
+        if stream:
+            attempts = 0
+
+            def attempt():
+                nonlocal attempts
+                attempts += 1
+                if attempts > 1:
+                    # The scheduler retries the whole stream, so listeners drop
+                    # the text of the failed attempt before it starts again
+                    emit("turn_reset")
+                return stream_argument(
+                    model, messages, lambda text: emit("token", text=text)
+                )
+
+            argument, stats, call["usage"] = await scheduler.acall(
+                model,
+                attempt,
+                messages=messages,
+                call=call,
+                usage_of=lambda result: result[2],
+                slot=lambda: limiter.slot(model),
+            )
+            call["time_to_first_token"] = stats["time_to_first_token"]
+        else:
+            response = await scheduler.acall(
+                model,
+                lambda: async_instructor_client().chat.completions.create(
+                    model=model, response_model=None, messages=messages
+                ),
+                messages=messages,
+                call=call,
+                slot=lambda: limiter.slot(model),
+            )
+            call["usage"] = response.usage
+            argument = response.choices[0].message.content
+            stats = {
+                "completion_tokens": getattr(response.usage, "completion_tokens", None)
+            }
+    return argument, stats
+
+
+async def simulate_debate(
+    question,
+    num_iterations,
+    agent_model_map,
+    debate_styles,
+    limiter=None,
+    scenario=None,
+    stream=False,
+    on_turn_event=None,
+    debate_id=None,
+    context_policy=None,
+    checkpoint=None,
+    early_stop=None,
+):
+    """
+    :param context_policy: context.ContextPolicy choosing which part of the
+        history each turn sees; defaults to the full transcript
+    :param early_stop: early_stop.EarlyStopPolicy checked after every
+        iteration; when it fires the remaining iterations are skipped and
+        ``stopped_after`` is set on the debate
+    :param stream: Stream each turn token by token instead of waiting for the
+        full completion
+    :param on_turn_event: Optional callback receiving turn event dictionaries:
+        ``turn_start``, ``token`` and ``turn_reset`` (streaming only; a reset
+        discards the tokens so far before a retry) and ``turn_end``, each tagged
+        with ``debate_id``, ``iteration``, ``agent`` and ``role``
+    :param checkpoint: run_store.DebateCheckpoint; turns already journaled are
+        replayed without a model call and new turns are journaled as they finish
+    """
+    limiter = limiter or ConcurrencyLimiter()
+    if scenario is None:
+        scenario = await generate_scenario(question, limiter)
+
+    debate_data = {
+        "topic": question,
+        "opening_statements": [],
+        "iterations": [],
+        "closing_statements": [],
+    }
+
+    debate_history = DebateHistory()
+    context_policy = context_policy or FullHistory()
+
+    # Ensure we have exactly two agents and two models
+    if len(scenario.agents) != 2 or len(agent_model_map) != 2:
+        raise ValueError(
+            "Scenario must have exactly 2 agents and 2 models for this setup."
+        )
+
+    # Assign models to agents based on their order, not their persona names
+    agent_model_list = list(agent_model_map.values())
+    for agent, model in zip(scenario.agents, agent_model_list):
+        agent_model_map[agent.persona] = model
+    debate_data["models"] = agent_model_list
+    debate_data["styles"] = list(debate_styles)
+
+    # Turns within a debate are sequential; concurrency comes from running
+    # many debates at once.
+    for iteration in range(1, num_iterations + 1):
+        iteration_data = {"iteration": iteration, "arguments": []}
+        for i, agent in enumerate(scenario.agents, 1):
+            model = agent_model_map[agent.persona]
+            event = {
+                "debate_id": debate_id,
+                "iteration": iteration,
+                "agent": agent.persona,
+                "role": "proponent" if i == 1 else "opponent",
+                "model": model,
+            }
+
+            def emit(event_type, **fields):
+                if on_turn_event is not None:
+                    on_turn_event({**event, "type": event_type, **fields})
+
+            argument = checkpoint.completed_turn(iteration, i) if checkpoint else None
+            # Replayed turns keep no measurements
+            tokens = latency = None
+            if argument is None:
+                await context_policy.prepare(
+                    debate_history, lambda text: summarize_history(text, limiter)
+                )
+                context = context_policy.render(debate_history)
+
+                emit("turn_start")
+                start_time = time.perf_counter()
+                argument, stats = await generate_argument(
+                    agent, iteration, model, context, limiter, stream, emit
+                )
+                latency = time.perf_counter() - start_time
+                tokens = stats.get("completion_tokens")
+                emit("turn_end", argument=argument, stats=stats)
+                if checkpoint is not None:
+                    checkpoint.record_turn(iteration, i, agent.persona, argument)
+
+            iteration_data["arguments"].append(
+                {
+                    "agent": agent.persona,
+                    "role": event["role"],
+                    "argument": argument,
+                    "tokens": tokens,
+                    "latency": latency,
+                }
+            )
+            debate_history.append(
+                f"Agent {i} ({agent.persona}): {argument}", argument
+            )
+
+        debate_data["iterations"].append(iteration_data)
+
+        if early_stop is not None and iteration < num_iterations:
+            try:
+                stop = await early_stop.should_stop(
+                    debate_history, iteration, lambda text: quick_judge(text, limiter)
+                )
+            except Exception as exc:
+                # Stopping early is an optimization; a failing policy or judge
+                # must not lose the debate, so it runs on to the next check
+                telemetry.record(
+                    "early_stop_error",
+                    type(early_stop).__name__,
+                    None,
+                    0.0,
+                    error=repr(exc),
+                    debate_id=debate_id,
+                    iteration=iteration,
+                )
+                print(f"Early-stop check failed after iteration {iteration}: {exc!r}")
+                stop = False
+            if stop:
+                debate_data["stopped_after"] = iteration
+                break
+
+    return debate_data
+
+
+async def run_single_debate(
+    question,
+    num_iterations,
+    subset,
+    styles,
+    limiter,
+    scenario=None,
+    reuse_cached_scenario=False,
+    checkpoint=None,
+    **turn_options,
+):
+    """
+    :param checkpoint: run_store.DebateCheckpoint journaling this debate
+    :param turn_options: ``stream``, ``on_turn_event``, ``debate_id`` and
+        ``context_policy``, forwarded to simulate_debate
+    """
+    print(f"\nRunning debate with models: {subset}")
+    if scenario is None and checkpoint is not None and checkpoint.scenario:
+        scenario = Scenario.model_validate(checkpoint.scenario)
+    if scenario is None:
+        scenario = await generate_scenario(
+            question, limiter, reuse_cached=reuse_cached_scenario
+        )
+        if checkpoint is not None:
+            checkpoint.record_scenario(scenario)
+
+    if len(scenario.agents) != 2:
+        print("Error: Scenario must have exactly 2 agents for this setup.")
+        return None
+
+    agent_model_map = {
+        "agent1": subset[0],
+        "agent2": subset[1],
+    }
+
+    debate_data = await simulate_debate(
+        question=question,
+        num_iterations=num_iterations,
+        agent_model_map=agent_model_map,
+        debate_styles=styles,
+        limiter=limiter,
+        scenario=scenario,
+        checkpoint=checkpoint,
+        **turn_options,
+    )
+    if checkpoint is not None:
+        checkpoint.record_end(debate_data)
+    return debate_data
+
+
+async def iter_debates(
+    debate_tasks,
+    limiter,
+    scenario=None,
+    journal=None,
+    debate_ids=None,
+    **turn_options,
+):
+    """
+    Run every debate task concurrently and yield each debate as it finishes.
+
+    :param debate_tasks: List of (question, num_iterations, subset, styles) tuples
+    :param limiter: ConcurrencyLimiter shared by all debates
+    :param scenario: Scenario shared by every debate instead of one per debate
+    :param journal: run_store.RunJournal checkpointing every debate
+    :param debate_ids: Task indices to run; defaults to all of them
+    :param turn_options: ``stream``, ``on_turn_event`` and ``context_policy``
+        (see simulate_debate); turn events carry the task index as
+        ``debate_id``, and ``on_turn_event`` also receives a ``debate_end`` or
+        ``debate_failed`` event as each debate finishes
+    :return: Async iterator of (task index, debate dictionary) in completion
+        order; failed debates are reported and skipped
+    """
+
+    async def run(index, task):
+        try:
+            return index, await run_single_debate(
+                *task,
+                limiter=limiter,
+                scenario=scenario,
+                checkpoint=journal.debate(index) if journal is not None else None,
+                debate_id=index,
+                **turn_options,
+            )
+        except Exception as error:
+            return index, error
+
+    def emit(event_type, index, **fields):
+        on_turn_event = turn_options.get("on_turn_event")
+        if on_turn_event is not None:
+            on_turn_event({"type": event_type, "debate_id": index, **fields})
+
+    if debate_ids is None:
+        debate_ids = range(len(debate_tasks))
+    pending = [
+        asyncio.create_task(run(index, debate_tasks[index])) for index in debate_ids
+    ]
+    try:
+        for next_finished in asyncio.as_completed(pending):
+            index, result = await next_finished
+            if isinstance(result, Exception):
+                print(
+                    f"Error: debate with models {debate_tasks[index][2]} failed: {result!r}"
+                )
+                emit("debate_failed", index, error=repr(result))
+                continue
+            if result is None:
+                emit("debate_failed", index, error="invalid scenario")
+                continue
+            emit("debate_end", index)
+            yield index, result
+    finally:
+        # A consumer that stops early (such as a decided sequential test)
+        # cancels the debates still running, and waits for them to unwind so
+        # their limiter slots are released
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def gather_debates(
+    debate_tasks,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    per_model_concurrency=DEFAULT_PER_MODEL_CONCURRENCY,
+    limiter=None,
+    scenario=None,
+    **turn_options,
+):
+    """
+    Run every debate task concurrently under a shared concurrency limiter.
+
+    :param debate_tasks: List of (question, num_iterations, subset, styles) tuples
+    :param max_concurrency: Maximum LLM requests in flight across all debates
+    :param per_model_concurrency: Maximum LLM requests in flight per model
+    :param limiter: Existing limiter to share; overrides the two limits above
+    :param scenario: Scenario shared by every debate instead of one per debate
+    :param turn_options: Forwarded to simulate_debate
+    :return: List of debate dictionaries in task order; failed debates are dropped
+    """
+    limiter = limiter or ConcurrencyLimiter(max_concurrency, per_model_concurrency)
+    finished = [
+        item
+        async for item in iter_debates(debate_tasks, limiter, scenario, **turn_options)
+    ]
+    return [debate for _, debate in sorted(finished, key=lambda item: item[0])]
+
+
+async def prepare_debates(
+    num_debates,
+    question,
+    models,
+    num_iterations,
+    limiter,
+    reuse_cached_scenario=False,
+):
+    """
+    Pair models, generate styles and (optionally) the shared scenario.
+
+    :return: Tuple of (debate_tasks, shared scenario or None)
+    """
+    if len(models) < num_debates * 2:
+        raise ValueError("Not enough models for the requested number of debates.")
+
+    model_subsets = [models[i : i + 2] for i in range(0, num_debates * 2, 2)]
+    styles = await asyncio.to_thread(generate_style_prompt, num_debates * 2)
+
+    scenario = None
+    if reuse_cached_scenario:
+        scenario = await generate_scenario(question, limiter, reuse_cached=True)
+
+    debate_tasks = []
+    for i, subset in enumerate(model_subsets):
+        debate_styles = styles.style_description[i * 2 : i * 2 + 2]
+        debate_tasks.append((question, num_iterations, subset, debate_styles))
+
+    return debate_tasks, scenario
+
+
+async def run_debates(
+    num_debates,
+    question,
+    models,
+    num_iterations,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    per_model_concurrency=DEFAULT_PER_MODEL_CONCURRENCY,
+    reuse_cached_scenario=False,
+    **turn_options,
+):
+    """
+    :param reuse_cached_scenario: Generate (or load from the scenario cache) one
+        scenario and share it across every debate, instead of one per debate
+    :param turn_options: ``stream``, ``on_turn_event`` and ``context_policy``,
+        forwarded to simulate_debate
+    """
+    limiter = ConcurrencyLimiter(max_concurrency, per_model_concurrency)
+    debate_tasks, scenario = await prepare_debates(
+        num_debates, question, models, num_iterations, limiter, reuse_cached_scenario
+    )
+    return await gather_debates(
+        debate_tasks, limiter=limiter, scenario=scenario, **turn_options
+    )
+
+
+def run_debates_sync(num_debates, question, models, num_iterations, **kwargs):
+    """Blocking entry point for callers without an event loop (Streamlit, CLI)."""
+    return asyncio.run(
+        run_debates(num_debates, question, models, num_iterations, **kwargs)
+    )
@@ -0,0 +1,295 @@
+import concurrent.futures
+import contextvars
+import itertools
+import statistics
+
+from evaluator import (
+    DEFAULT_EVAL_RETRIES,
+    JUDGE_MODEL,
+    build_evaluation_entry,
+    evaluate_debate_text,
+    format_debate_text,
+    rubric_scores,
+)
+from results_store import CRITERIA, SIDES
+
+
+# Cheap judges fanned out by default; JUDGE_MODEL is the cascade's tie-breaker.
+DEFAULT_JUDGES = [
+    "openai/gpt-4o-mini",
+    "google/gemini-flash-1.5",
+    "meta-llama/llama-3.1-70b-instruct",
+]
+AGGREGATIONS = ("mean", "median", "trimmed")
+
+
+def trimmed_mean(values, proportion=0.2):
+    """Mean after dropping ``proportion`` of the values from each end."""
+    values = sorted(values)
+    cut = int(len(values) * proportion)
+    return statistics.mean(values[cut : len(values) - cut] or values)
+
+
+def aggregate_values(values, method="mean"):
+    if method == "median":
+        return statistics.median(values)
+    if method == "trimmed":
+        return trimmed_mean(values)
+    return statistics.mean(values)
+
+
+def krippendorff_alpha(units):
+    """
+    Krippendorff's alpha for interval data.
+
+    :param units: List of value lists, one list per rated item (one value per
+        judge that rated it); items with fewer than two values are ignored
+    :return: Alpha, or None when there is no variation to compare against
+    """
+    units = [values for values in units if len(values) >= 2]
+    pooled = [value for values in units for value in values]
+    n = len(pooled)
+    if n < 2:
+        return None
+    observed = sum(
+        sum((a - b) ** 2 for a, b in itertools.permutations(values, 2))
+        / (len(values) - 1)
+        for values in units
+    ) / n
+    mean = statistics.mean(pooled)
+    # Sum of squared differences over all ordered pairs, computed in O(n)
+    expected = 2 * n * sum((value - mean) ** 2 for value in pooled) / (n * (n - 1))
+    if expected == 0:
+        return None
+    return 1 - observed / expected
+
+
+def kendall_tau(x, y):
+    """Kendall's tau-b rank correlation of two equal-length score lists."""
+    concordant = discordant = ties_x = ties_y = 0
+    for (x1, y1), (x2, y2) in itertools.combinations(zip(x, y), 2):
+        dx, dy = x1 - x2, y1 - y2
+        if dx == 0 and dy == 0:
+            continue
+        if dx == 0:
+            ties_x += 1
+        elif dy == 0:
+            ties_y += 1
+        elif (dx > 0) == (dy > 0):
+            concordant += 1
+        else:
+            discordant += 1
+    denominator = (
+        (concordant + discordant + ties_x) * (concordant + discordant + ties_y)
+    ) ** 0.5
+    return (concordant - discordant) / denominator if denominator else None
+
+
+def agreement(debates):
+    """
+    Inter-judge agreement over ensemble-graded debates.
+
+    :param debates: Values of results_store.judge_scores
+    :return: {"krippendorff_alpha": alpha over the (debate, side) totals,
+        "kendall_tau": {"judge_a | judge_b": tau of their score margins},
+        "escalation_rate": share of debates sent to the tie-breaker judge}
+    """
+    debates = list(debates)
+    totals = [debate["judges"] for debate in debates]
+    escalations = sum(debate["tie_breaker"] is not None for debate in debates)
+
+    units = [
+        [scores[side_index] for scores in judges.values()]
+        for judges in totals
+        for side_index in range(len(SIDES))
+    ]
+    taus = {}
+    judges = sorted({judge for debate in totals for judge in debate})
+    for judge_a, judge_b in itertools.combinations(judges, 2):
+        shared = [
+            debate for debate in totals if judge_a in debate and judge_b in debate
+        ]
+        margins_a = [debate[judge_a][0] - debate[judge_a][1] for debate in shared]
+        margins_b = [debate[judge_b][0] - debate[judge_b][1] for debate in shared]
+        taus[f"{judge_a} | {judge_b}"] = kendall_tau(margins_a, margins_b)
+
+    return {
+        "krippendorff_alpha": krippendorff_alpha(units),
+        "kendall_tau": taus,
+        "escalation_rate": escalations / len(debates) if debates else 0.0,
+    }
+
+
+class JudgeEnsemble:
+    """
+    Grade each debate with several judge models in parallel and aggregate their
+    scores per criterion.
+
+    With ``cascade_threshold`` set, ``expensive_judge`` is only called when the
+    cheap judges disagree: their winners differ or a side's total score spreads
+    by more than the threshold. Its verdict then replaces the aggregate.
+
+    Each judge's totals are returned with the evaluation and kept by the
+    results store, which agreement reports are computed from.
+    """
+
+    def __init__(
+        self,
+        judges=DEFAULT_JUDGES,
+        method="mean",
+        cascade_threshold=None,
+        expensive_judge=JUDGE_MODEL,
+    ):
+        if method not in AGGREGATIONS:
+            raise ValueError(
+                f"Unknown aggregation {method!r}; expected one of {AGGREGATIONS}"
+            )
+        self.judges = list(judges)
+        self.method = method
+        self.cascade_threshold = cascade_threshold
+        self.expensive_judge = expensive_judge
+
+    def judge_all(self, debate_text, max_retries=DEFAULT_EVAL_RETRIES):
+        """
+        :return: Dictionary of judge model to parsed DebateResult; judges that
+            failed are left out
+        """
+        with concurrent.futures.ThreadPoolExecutor(len(self.judges)) as executor:
+            # Each judge runs in a copy of this context, keeping the telemetry run ID
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run,
+                    evaluate_debate_text,
+                    debate_text,
+                    max_retries,
+                    judge,
+                )
+                for judge in self.judges
+            ]
+            results = [future.result() for future in futures]
+            return {
+                judge: parsed
+                for judge, (parsed, error) in zip(self.judges, results)
+                if error is None
+            }
+
+    def disagrees(self, verdicts):
+        totals = [
+            (verdict.proponent.total_points, verdict.opponent.total_points)
+            for verdict in verdicts.values()
+        ]
+        winners = {
+            (proponent > opponent) - (proponent < opponent)
+            for proponent, opponent in totals
+        }
+        spread = max(max(side) - min(side) for side in zip(*totals))
+        return len(winners) > 1 or spread > self.cascade_threshold
+
+    def aggregate(self, debate_text, verdicts):
+        """:return: Evaluation entry with aggregated scores"""
+        evaluation = {}
+        for side in SIDES:
+            results = [getattr(verdict, side) for verdict in verdicts.values()]
+            evaluation[side] = {
+                "score": aggregate_values(
+                    [r.total_points for r in results], self.method
+                ),
+                "reasoning": "\n\n".join(
+                    f"[{judge}] {getattr(verdict, side).comments}"
+                    for judge, verdict in verdicts.items()
+                ),
+                "criteria": {
+                    criterion: aggregate_values(
+                        [rubric_scores(r)[criterion] for r in results], self.method
+                    )
+                    for criterion in CRITERIA
+                },
+            }
+        return {"debate_text": debate_text, "evaluation": evaluation}
+
+    def evaluate(self, debate_text, max_retries=DEFAULT_EVAL_RETRIES):
+        verdicts = self.judge_all(debate_text, max_retries)
+        if not verdicts:
+            raise ValueError("every judge in the ensemble failed")
+
+        entry = self.aggregate(debate_text, verdicts)
+        escalated = (
+            self.cascade_threshold is not None
+            and len(verdicts) > 1
+            and self.disagrees(verdicts)
+        )
+        tie_breaker = None
+        if escalated:
+            parsed, error = evaluate_debate_text(
+                debate_text, max_retries, self.expensive_judge
+            )
+            if error is None:
+                verdicts[self.expensive_judge] = parsed
+                entry = build_evaluation_entry(debate_text, parsed)
+                tie_breaker = self.expensive_judge
+
+        # Kept by the results store for agreement reports
+        entry["judges"] = {
+            judge: {side: getattr(verdict, side).total_points for side in SIDES}
+            for judge, verdict in verdicts.items()
+        }
+        entry["tie_breaker"] = tie_breaker
+        return entry
+
+    def evaluate_debate_data(self, debate, max_retries=DEFAULT_EVAL_RETRIES):
+        """
+        Ensemble counterpart of evaluator.evaluate_debate_data, without raising.
+
+        :return: Tuple of (debate_text, evaluation entry or None, error or None)
+        """
+        debate_text = format_debate_text(debate)
+        try:
+            return debate_text, self.evaluate(debate_text, max_retries), None
+        except Exception as error:
+            return debate_text, None, error
+
+
+if __name__ == "__main__":
+    import argparse
+    import pickle
+
+    from results_store import results_store
+    from telemetry import print_summary, telemetry
+
+    parser = argparse.ArgumentParser(
+        description="Grade saved debates with a judge ensemble"
+    )
+    parser.add_argument("--debates", default="my_variable.pkl")
+    parser.add_argument("--judges", nargs="+", default=DEFAULT_JUDGES)
+    parser.add_argument("--aggregate", choices=AGGREGATIONS, default="mean")
+    parser.add_argument(
+        "--cascade",
+        type=float,
+        metavar="POINTS",
+        help="call the expensive judge when cheap judges' totals spread by more than this",
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    sample_data = pickle.load(open(args.debates, "rb"))
+    ensemble = JudgeEnsemble(args.judges, args.aggregate, args.cascade)
+    with concurrent.futures.ThreadPoolExecutor(args.workers) as executor:
+        results = list(executor.map(ensemble.evaluate_debate_data, sample_data))
+
+    evaluations = {}
+    for index, (debate_text, entry, error) in enumerate(results, 1):
+        if error is not None:
+            print(f"Error: evaluation of debate_{index} failed: {error!r}")
+        else:
+            evaluations[f"debate_{index}"] = entry
+    results_store.record_run(
+        telemetry.run_id, {"debates": args.debates, "judges": args.judges}
+    )
+    results_store.record_evaluations(
+        telemetry.run_id,
+        evaluations,
+        {f"debate_{index}": debate for index, debate in enumerate(sample_data, 1)},
+    )
+    print(f"Evaluations stored in {results_store.path} as run {telemetry.run_id}")
+    print(agreement(results_store.judge_scores(telemetry.run_id).values()))
+    print_summary(telemetry.summary())
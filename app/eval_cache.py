@@ -0,0 +1,25 @@
+import os
+
+from sqlite_cache import SQLiteLRUCache, content_key
+
+
+DEFAULT_EVAL_CACHE_PATH = os.path.join("cache", "evaluations.sqlite3")
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def evaluation_key(debate_text, system_content, model, response_schema):
+    """
+    Content address of a judge call.
+
+    Any change to the debate, rubric, judge model or response schema yields a
+    new key, so stale grades are never served.
+    """
+    return content_key(debate_text, system_content, model, response_schema)
+
+
+evaluation_cache = SQLiteLRUCache(
+    DEFAULT_EVAL_CACHE_PATH,
+    max_entries=DEFAULT_MAX_ENTRIES,
+    max_bytes=DEFAULT_MAX_BYTES,
+)
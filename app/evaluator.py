@@ -1,16 +1,20 @@
 import os
-import weave
 
 from pydantic import BaseModel
-from openai import OpenAI
 from datetime import datetime
+import argparse
+import concurrent.futures
+import contextvars
 import json
 import pickle
 
-from dotenv import load_dotenv
-load_dotenv()
-
-weave.init("together-weave")
+from debate_record import DebateRecord
+from eval_cache import evaluation_cache, evaluation_key
+from prompt_cache import message_content
+from results_store import CRITERIA, results_store
+from scheduler import scheduler
+from providers import openai_client
+from telemetry import print_summary, telemetry
 
 
 class DebateEvaluation(BaseModel):
@@ -30,14 +34,12 @@ class DebateResult(BaseModel):
     opponent: DebateEvaluation
 
 
-client = OpenAI(
-    api_key=os.environ.get("OPENROUTER_API_KEY"),
-    base_url="https://openrouter.ai/api/v1",
-)
+JUDGE_MODEL = "openai/gpt-4o-2024-08-06"
+DEFAULT_EVAL_WORKERS = 8
+DEFAULT_EVAL_RETRIES = 3
 
 
-def evaluate_debate(debate_text: str) -> DebateResult:
-    system_content = """
+RUBRIC_SYSTEM_CONTENT = """
     You are a debate evaluator. Evaluate the given debate based on the rubric:
     
 1. Respect for Other Team (5 points)
@@ -226,6 +228,10 @@ Does not address counter-arguments or does so ineffectively.
 Start evaluation now with the rubric in mind.
     """
 
+
+def build_evaluation_messages(debate_text, model=JUDGE_MODEL):
+    # The rubric is a byte-stable prefix shared by every evaluation, so the
+    # provider can serve it from its prompt cache; the debate comes after it.
     user_content = f"""
     Evaluate the following debate:
 
@@ -234,35 +240,64 @@ Start evaluation now with the rubric in mind.
     Provide scores and comments for both participants based on the rubric.
     """
 
-    response = client.beta.chat.completions.parse(
-        model="openai/gpt-4o-2024-08-06",
-        messages=[
-            {"role": "system", "content": system_content},
-            {"role": "user", "content": user_content},
-        ],
-        response_format=DebateResult,
+    return [
+        {
+            "role": "system",
+            "content": message_content(model, (RUBRIC_SYSTEM_CONTENT, True)),
+        },
+        {"role": "user", "content": user_content},
+    ]
+
+
+def debate_evaluation_key(debate_text, model=JUDGE_MODEL):
+    return evaluation_key(
+        debate_text,
+        RUBRIC_SYSTEM_CONTENT,
+        model,
+        DebateResult.model_json_schema(),
     )
 
+
+def evaluate_debate(
+    debate_text: str,
+    max_retries=DEFAULT_EVAL_RETRIES,
+    use_cache=True,
+    model=JUDGE_MODEL,
+) -> DebateResult:
+    """
+    :param model: Judge model; ensemble.JudgeEnsemble passes each of its judges
+    """
+    key = debate_evaluation_key(debate_text, model)
+    if use_cache:
+        cached = evaluation_cache.get(key)
+        if cached is not None:
+            from openai.types.chat import ParsedChatCompletion
+
+            return ParsedChatCompletion[DebateResult].model_validate_json(cached)
+
+    messages = build_evaluation_messages(debate_text, model)
+    with telemetry.track("evaluation", model) as call:
+        response = scheduler.call(
+            model,
+            lambda: openai_client().beta.chat.completions.parse(
+                model=model,
+                messages=messages,
+                response_format=DebateResult,
+            ),
+            messages=messages,
+            max_retries=max_retries,
+            call=call,
+        )
+        call["usage"] = response.usage
+
+    if use_cache and response.choices[0].message.parsed is not None:
+        evaluation_cache.put(key, response.model_dump_json())
     return response
 
 
 def format_debate_text(debate_data):
-    debate_text = f"Topic: {debate_data['topic']};;"
-
-    # Opening statements
-    for statement in debate_data["opening_statements"]:
-        debate_text += f"{statement['agent']}:\n{statement['statement']}';;'"
-
-    # Iterations
-    for iteration in debate_data["iterations"]:
-        for argument in iteration["arguments"]:
-            debate_text += f"{argument['agent']}:\n{argument['argument']};;"
-
-    # Closing statements
-    for statement in debate_data["closing_statements"]:
-        debate_text += f"{statement['agent']}:\n{statement['statement']}';;'"
-
-    return debate_text
+    """:return: The judge prompt text of an engine debate dictionary"""
+    return DebateRecord.from_debate(debate_data).render()
 
 
 # Load the sample data
@@ -310,32 +345,206 @@ def format_debate_text(debate_data):
 # print(f"Participant 2 Comments: {result.participant2.comments}")
 
 
-def evaluate_all_debates(sample_data):
+def build_evaluation_entry(debate_text, parsed):
+    return {
+        "debate_text": debate_text,
+        "evaluation": {
+            "proponent": {
+                "score": parsed.proponent.total_points,
+                "reasoning": parsed.proponent.comments,
+                "criteria": rubric_scores(parsed.proponent),
+            },
+            "opponent": {
+                "score": parsed.opponent.total_points,
+                "reasoning": parsed.opponent.comments,
+                "criteria": rubric_scores(parsed.opponent),
+            },
+        },
+    }
+
+
+def rubric_scores(evaluation):
+    """Sub-scores for every rubric criterion, keyed as in results_store.CRITERIA."""
+    return {criterion: getattr(evaluation, criterion) for criterion in CRITERIA}
+
+
+def evaluate_debate_data(debate, max_retries=DEFAULT_EVAL_RETRIES):
+    """
+    Evaluate one debate dictionary without raising.
+
+    :return: Tuple of (debate_text, parsed DebateResult or None, error or None)
+    """
+    debate_text = format_debate_text(debate)
+    parsed, error = evaluate_debate_text(debate_text, max_retries)
+    return debate_text, parsed, error
+
+
+def evaluate_debate_text(
+    debate_text, max_retries=DEFAULT_EVAL_RETRIES, model=JUDGE_MODEL
+):
+    """
+    :return: Tuple of (parsed DebateResult or None, error or None)
+    """
+    try:
+        evaluation = evaluate_debate(debate_text, max_retries=max_retries, model=model)
+    except Exception as error:
+        return None, error
+
+    parsed = evaluation.choices[0].message.parsed
+    if parsed is None:
+        refusal = evaluation.choices[0].message.refusal
+        return None, ValueError(f"judge returned no result: {refusal}")
+    return parsed, None
+
+
+def evaluate_debates(
+    sample_data, max_workers=DEFAULT_EVAL_WORKERS, max_retries=DEFAULT_EVAL_RETRIES
+):
+    """
+    Evaluate debates concurrently, keeping going when individual debates fail.
+
+    :param sample_data: List of debate dictionaries from run_debates
+    :param max_workers: Maximum evaluations in flight; 1 evaluates sequentially
+    :param max_retries: Retries per debate on rate limits and server errors
+    :return: Tuple of (evaluations keyed "debate_<n>" in input order,
+        failures mapping "debate_<n>" to the error message)
+    """
+    # Workers run in a copy of the caller's context, so per-run settings such
+    # as prompt cache hints apply to them
+    context = contextvars.copy_context()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(
+            executor.map(
+                lambda debate: context.copy().run(
+                    evaluate_debate_data, debate, max_retries
+                ),
+                sample_data,
+            )
+        )
+
     all_evaluations = {}
+    failures = {}
+    for index, (debate_text, parsed, error) in enumerate(results, 1):
+        if error is not None:
+            failures[f"debate_{index}"] = repr(error)
+            continue
+        all_evaluations[f"debate_{index}"] = build_evaluation_entry(debate_text, parsed)
+
+    return all_evaluations, failures
+
+
+def evaluate_all_debates(
+    sample_data, max_workers=DEFAULT_EVAL_WORKERS, max_retries=DEFAULT_EVAL_RETRIES
+):
+    all_evaluations, failures = evaluate_debates(sample_data, max_workers, max_retries)
+
+    for key, error in failures.items():
+        print(f"Error: evaluation of {key} failed: {error}")
+    if failures:
+        print(f"{len(failures)} of {len(sample_data)} debate evaluations failed")
+
+    stats = evaluation_cache.stats()
+    print(f"Evaluation cache: {stats['hits']} hits, {stats['misses']} misses")
+    provider_stats = telemetry.summary()["by_phase"].get("evaluation")
+    if provider_stats:
+        print(
+            f"Provider prompt cache: {provider_stats['cached_tokens']} of "
+            f"{provider_stats['prompt_tokens']} prompt tokens cached"
+        )
+
+    return all_evaluations
 
+
+def batch_model(model):
+    """
+    :return: The OpenAI Batch API name of an OpenRouter judge model; the Batch
+        API is called directly, without the ``openai/`` provider prefix
+    """
+    return model.removeprefix("openai/")
+
+
+def export_batch_requests(sample_data, filepath, model=JUDGE_MODEL):
+    """
+    Write evaluation requests in OpenAI Batch API JSONL format.
+
+    Upload the file with purpose "batch" and create a batch against
+    /v1/chat/completions, then pass the output file to ingest_batch_results.
+
+    :param model: The judge model the batch stands in for, as used by
+        evaluate_debate; requests are sent to its batch_model
+    :return: Number of requests written
+    """
+    from openai.lib._parsing import type_to_response_format_param
+
+    response_format = type_to_response_format_param(DebateResult)
+
+    with open(filepath, "w") as f:
+        for index, debate in enumerate(sample_data, 1):
+            request = {
+                "custom_id": f"debate_{index}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": batch_model(model),
+                    "messages": build_evaluation_messages(
+                        format_debate_text(debate), batch_model(model)
+                    ),
+                    "response_format": response_format,
+                },
+            }
+            f.write(json.dumps(request) + "\n")
+
+    return len(sample_data)
+
+
+def ingest_batch_results(sample_data, filepath, model=JUDGE_MODEL):
+    """
+    Read an OpenAI Batch API output file produced from export_batch_requests.
+
+    :param sample_data: The same debates that were exported
+    :param model: The judge model passed to export_batch_requests; cached
+        verdicts are keyed by it, so evaluate_debate with that judge reuses
+        them and other judges never do
+    :return: Tuple of (evaluations, failures) in the evaluate_debates format
+    """
+    results = {}
+    with open(filepath, "r") as f:
+        for line in f:
+            if line.strip():
+                result = json.loads(line)
+                results[result["custom_id"]] = result
+
+    all_evaluations = {}
+    failures = {}
     for index, debate in enumerate(sample_data, 1):
+        key = f"debate_{index}"
+        result = results.get(key)
+        if result is None:
+            failures[key] = "missing from batch output"
+            continue
+
+        response = result.get("response") or {}
+        if result.get("error") or response.get("status_code") != 200:
+            failures[key] = json.dumps(result.get("error") or response.get("body"))
+            continue
+
+        try:
+            content = response["body"]["choices"][0]["message"]["content"]
+            parsed = DebateResult.model_validate_json(content)
+        except Exception as error:
+            failures[key] = repr(error)
+            continue
+
         debate_text = format_debate_text(debate)
-        evaluation = evaluate_debate(debate_text)
-
-        all_evaluations[f"debate_{index}"] = {
-            "debate_text": debate_text,
-            "evaluation": {
-                "proponent": {
-                    "score": evaluation.choices[
-                        0
-                    ].message.parsed.proponent.total_points,
-                    "reasoning": evaluation.choices[
-                        0
-                    ].message.parsed.proponent.comments,
-                },
-                "opponent": {
-                    "score": evaluation.choices[0].message.parsed.opponent.total_points,
-                    "reasoning": evaluation.choices[0].message.parsed.opponent.comments,
-                },
-            },
-        }
+        all_evaluations[key] = build_evaluation_entry(debate_text, parsed)
 
-    return all_evaluations
+        # Seed the evaluation cache so grading with the same judge is free
+        response["body"]["choices"][0]["message"]["parsed"] = parsed.model_dump()
+        evaluation_cache.put(
+            debate_evaluation_key(debate_text, model), json.dumps(response["body"])
+        )
+
+    return all_evaluations, failures
 
 
 def write_evaluations_to_file(evaluations):
@@ -358,9 +567,45 @@ def write_evaluations_to_file(evaluations):
 
 
 if __name__ == "__main__":
-    sample_data = pickle.load(open("my_variable.pkl", "rb"))
-    # Evaluate all debates
-    all_debate_evaluations = evaluate_all_debates(sample_data)
-
-    # Write evaluations to JSON file
-    write_evaluations_to_file(all_debate_evaluations)
+    parser = argparse.ArgumentParser(description="Evaluate saved debates")
+    parser.add_argument("--debates", default="my_variable.pkl")
+    parser.add_argument("--workers", type=int, default=DEFAULT_EVAL_WORKERS)
+    parser.add_argument(
+        "--export-batch", metavar="JSONL", help="write Batch API requests and exit"
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="also export the evaluations to json/"
+    )
+    parser.add_argument(
+        "--ingest-batch", metavar="JSONL", help="read Batch API results instead of calling the judge"
+    )
+    args = parser.parse_args()
+
+    sample_data = pickle.load(open(args.debates, "rb"))
+
+    if args.export_batch:
+        count = export_batch_requests(sample_data, args.export_batch)
+        print(f"{count} batch requests written to {args.export_batch}")
+    else:
+        if args.ingest_batch:
+            all_debate_evaluations, failures = ingest_batch_results(
+                sample_data, args.ingest_batch
+            )
+            for key, error in failures.items():
+                print(f"Error: evaluation of {key} failed: {error}")
+        else:
+            # Evaluate all debates
+            all_debate_evaluations = evaluate_all_debates(
+                sample_data, max_workers=args.workers
+            )
+
+        results_store.record_run(telemetry.run_id, {"debates": args.debates})
+        results_store.record_evaluations(
+            telemetry.run_id,
+            all_debate_evaluations,
+            {f"debate_{index}": debate for index, debate in enumerate(sample_data, 1)},
+        )
+        print(f"Evaluations stored in {results_store.path} as run {telemetry.run_id}")
+        if args.json:
+            write_evaluations_to_file(all_debate_evaluations)
+        print_summary(telemetry.summary())
@@ -1,53 +1,161 @@
-import json
-
-
-def extract_debates(type_deb: str) -> list:
-    # Open the file containing the good debates
-    with open(f"app/{type_deb}_debates.txt", "r") as file:
-        content = file.read()
-    if content == "":
-        return []
-    debates = content.strip().split("\n")
-
-    results = []
-    for debate in debates:
-        print(debate)
-        debate = json.loads(debate)
-        # Extract relevant information
-        winner = debate["winner"]
-        winner_eval = debate["evaluation"][winner.lower()]
-        debate_text = debate["debate_text"]
-
-        # Split the debate text into sections
-        sections = debate_text.split("\n\n")
-        # Identify the winner's sections
-        winner_text = []
-        for section in sections:
-            if winner.capitalize() in section:
-                winner_text.append(section)
-
-        # Join the winner's sections into a single string
-        winner_text = "\n\n".join(winner_text)
-        # Remove the section headers
-        winner_text = winner_text.replace("\n\nOpponent of Alternative Energy:", "")
-        winner_text = winner_text.replace("\n\nProponent of Alternative Energy:", "")
-
-        # Format the result
-        result = f"The topic question:{sections[0]},The winning response:{winner_text}, The reasoning for the response winning: {winner_eval['reasoning']}"
-
-        # Save the result into a list
-        results.append(result)
-
-    return results
-
-
-def extract_both_debates():
+import hashlib
+import heapq
+import random
+from collections import deque
+
+from debate_record import DebateRecord
+from results_store import SIDES, results_store
+
+
+# Exemplars passed to the style generator per label, and their token budget
+DEFAULT_EXEMPLARS = 5
+DEFAULT_EXEMPLAR_TOKENS = 2000
+SAMPLING = ("top", "reservoir", "recent")
+
+
+def iter_labeled_entries(type_deb, path=None):
+    """
+    Stream labeled debates with their ``record``, one at a time.
+
+    :param path: A ``<label>_debates.txt`` JSON-lines file, read line by line;
+        defaults to the labels in the results store
+    """
+    if path is None:
+        yield from results_store.iter_labeled(type_deb)
+        return
+
+    from helper import iter_jsonl_debates
+
+    for _, entry in iter_jsonl_debates(path):
+        entry["record"] = DebateRecord.parse(entry["debate_text"])
+        if not entry.get("winner"):
+            scores = entry["evaluation"]
+            entry["winner"] = max(SIDES, key=lambda side: scores[side]["score"])
+        yield entry
+
+
+def iter_exemplars(type_deb, path=None):
+    """
+    Stream the winning side of each labeled debate as exemplar text, skipping
+    exemplars whose text was already seen.
+
+    :return: Iterator of (score, text) in label order; the score is the
+        winner's total
+    """
+    seen = set()
+    for entry in iter_labeled_entries(type_deb, path):
+        winner = entry["winner"].lower()
+        winner_eval = entry["evaluation"][winner]
+        record = entry["record"]
+
+        # The winner's turns, by role rather than by matching speaker names
+        winner_text = "\n\n".join(turn.text for turn in record.side(winner))
+        text = f"The topic question:{record.topic},The winning response:{winner_text}, The reasoning for the response winning: {winner_eval['reasoning']}"
+
+        # 16-byte digests keep the seen set small for large label files
+        digest = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        yield winner_eval["score"], text
+
+
+def sample_exemplars(exemplars, k, sampling="top", reverse=False, seed=0):
+    """
+    Keep ``k`` exemplars from a stream in O(k) memory.
+
+    :param exemplars: Iterator of (score, text)
+    :param sampling: ``top`` for the highest scores (lowest with ``reverse``),
+        ``reservoir`` for a uniform random sample, ``recent`` for the last ``k``
+    :return: List of texts, best first for ``top``, otherwise in stream order
+    """
+    if sampling not in SAMPLING:
+        raise ValueError(f"Unknown sampling {sampling!r}; expected one of {SAMPLING}")
+    if sampling == "top":
+        select = heapq.nsmallest if reverse else heapq.nlargest
+        return [text for _, text in select(k, exemplars, key=lambda item: item[0])]
+    if sampling == "recent":
+        return [text for _, text in deque(exemplars, maxlen=k)]
+
+    rng = random.Random(seed)
+    reservoir = []
+    for seen, (_, text) in enumerate(exemplars):
+        if seen < k:
+            reservoir.append(text)
+        else:
+            index = rng.randrange(seen + 1)
+            if index < k:
+                reservoir[index] = text
+    return reservoir
+
+
+def fit_token_budget(texts, max_tokens):
+    """:return: The texts, in order, that fit in ``max_tokens`` together"""
+    from context import count_tokens
+
+    kept = []
+    for text in texts:
+        tokens = count_tokens(text)
+        if tokens <= max_tokens:
+            kept.append(text)
+            max_tokens -= tokens
+    return kept
+
+
+def extract_debates(
+    type_deb: str,
+    k=DEFAULT_EXEMPLARS,
+    sampling="top",
+    max_tokens=DEFAULT_EXEMPLAR_TOKENS,
+    path=None,
+    seed=0,
+) -> list:
+    """
+    Bounded exemplar set for one label, streamed so memory does not grow with
+    the number of saved debates.
+
+    ``top`` sampling keeps the highest-scoring winners of ``good`` debates and
+    the lowest-scoring winners of ``bad`` ones.
+    """
+    exemplars = iter_exemplars(type_deb, path)
+    texts = sample_exemplars(exemplars, k, sampling, type_deb == "bad", seed)
+    return fit_token_budget(texts, max_tokens)
+
+
+def extract_both_debates(**options):
+    """:param options: Passed to extract_debates for both labels"""
     # Extract the good debates
-    good_debates = extract_debates("good")
+    good_debates = extract_debates("good", **options)
     # Extract the bad debates
-    bad_debates = extract_debates("bad")
+    bad_debates = extract_debates("bad", **options)
     return good_debates, bad_debates
     # return bad_debates
 
 
-print(extract_both_debates())
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Print the good and bad exemplars given to the style generator"
+    )
+    parser.add_argument("-k", type=int, default=DEFAULT_EXEMPLARS)
+    parser.add_argument("--sampling", choices=SAMPLING, default="top")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_EXEMPLAR_TOKENS)
+    parser.add_argument(
+        "--from-files",
+        action="store_true",
+        help="read good/bad_debates.txt instead of the results store labels",
+    )
+    args = parser.parse_args()
+
+    for label in ("good", "bad"):
+        exemplars = extract_debates(
+            label,
+            args.k,
+            args.sampling,
+            args.max_tokens,
+            f"{label}_debates.txt" if args.from_files else None,
+        )
+        print(f"{label}: {len(exemplars)} exemplars")
+        for text in exemplars:
+            print(text)
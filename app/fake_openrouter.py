@@ -0,0 +1,229 @@
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+LOREM = (
+    "we must weigh the evidence carefully because the consequences of this "
+    "choice reach far beyond the people in front of us and history shows "
+    "that principled reasoning outlasts convenient answers every time"
+).split()
+
+
+def synthesize(schema, defs=None, name="", index=0, rng=None):
+    """
+    Build a deterministic instance of a JSON schema (as produced by pydantic).
+
+    :param schema: JSON schema dictionary
+    :param defs: Shared ``$defs`` used to resolve ``$ref`` entries
+    :param name: Property name the value is generated for
+    :param index: Position of the value when generated inside an array
+    :param rng: Random generator used for scores and text
+    :return: A value matching the schema
+    """
+    rng = rng or random.Random(0)
+    defs = defs if defs is not None else schema.get("$defs", {})
+
+    if "$ref" in schema:
+        return synthesize(defs[schema["$ref"].split("/")[-1]], defs, name, index, rng)
+    if "anyOf" in schema:
+        options = [s for s in schema["anyOf"] if s.get("type") != "null"]
+        return synthesize(options[0], defs, name, index, rng)
+
+    if "const" in schema:
+        return schema["const"]
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        return {
+            key: synthesize(value, defs, key, index, rng)
+            for key, value in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        length = max(schema.get("minItems", 0), 2)
+        return [
+            synthesize(schema.get("items", {}), defs, name, i, rng)
+            for i in range(length)
+        ]
+    if schema_type == "integer":
+        default = (14, 35) if name == "total_points" else (1, 5)
+        low, high = bounds(schema, *default, 1)
+        return rng.randint(math.ceil(low), math.floor(high))
+    if schema_type == "number":
+        low, high = bounds(schema, 1, 5, 0.01)
+        return min(max(round(rng.uniform(low, high), 2), low), high)
+    if schema_type == "boolean":
+        return True
+    if name == "persona":
+        return ("Proponent", "Opponent")[index % 2]
+    return fake_text(rng, 12)
+
+
+def bounds(schema, low, high, step):
+    """
+    :return: The schema's numeric range; missing bounds default to ``low`` and
+        ``high``, and exclusive bounds move inwards by ``step``
+    """
+    if "exclusiveMinimum" in schema:
+        low = schema["exclusiveMinimum"] + step
+    if "exclusiveMaximum" in schema:
+        high = schema["exclusiveMaximum"] - step
+    low = schema.get("minimum", low)
+    high = schema.get("maximum", high)
+    # A default on one side must not cross a bound given on the other
+    if high < low:
+        if "minimum" in schema or "exclusiveMinimum" in schema:
+            high = low
+        else:
+            low = high
+    return low, high
+
+
+def fake_text(rng, num_words):
+    return " ".join(rng.choice(LOREM) for _ in range(num_words)).capitalize() + "."
+
+
+def fake_completion(body, completion_words=40):
+    """
+    Build an OpenAI-compatible chat completion for a request body.
+
+    Structured requests (instructor tool calls or ``response_format`` JSON
+    schemas) get a synthesized instance of the schema; plain requests get text.
+    The output is seeded from the request so identical requests return
+    identical completions.
+    """
+    payload = json.dumps(body, sort_keys=True)
+    rng = random.Random(payload)
+    message = {"role": "assistant", "content": None}
+    finish_reason = "stop"
+
+    if body.get("tools"):
+        function = body["tools"][0]["function"]
+        arguments = synthesize(function.get("parameters", {}), rng=rng)
+        message["tool_calls"] = [
+            {
+                "id": "call_0",
+                "type": "function",
+                "function": {
+                    "name": function["name"],
+                    "arguments": json.dumps(arguments),
+                },
+            }
+        ]
+        finish_reason = "tool_calls"
+    elif body.get("response_format", {}).get("type") == "json_schema":
+        schema = body["response_format"]["json_schema"]["schema"]
+        message["content"] = json.dumps(synthesize(schema, rng=rng))
+    else:
+        message["content"] = fake_text(rng, completion_words)
+
+    prompt_tokens = len(payload) // 4
+    completion_tokens = len(json.dumps(message)) // 4
+    return {
+        "id": f"chatcmpl-fake-{rng.getrandbits(32):08x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def stream_events(completion, stream_options=None):
+    """
+    Split a text completion into server-sent event chunks, one word per chunk.
+
+    :return: Iterator of encoded ``data:`` lines, ending with ``[DONE]``
+    """
+    stream_options = stream_options or {}
+
+    def event(chunk):
+        return f"data: {json.dumps(chunk)}\n\n".encode()
+
+    base = {key: completion[key] for key in ("id", "created", "model")}
+    base["object"] = "chat.completion.chunk"
+    words = (completion["choices"][0]["message"]["content"] or "").split(" ")
+    for i, word in enumerate(words):
+        text = word if i == 0 else " " + word
+        delta = {"role": "assistant", "content": text} if i == 0 else {"content": text}
+        yield event(
+            {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+        )
+    yield event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+    if stream_options.get("include_usage"):
+        usage = dict(completion["usage"], completion_tokens=len(words))
+        usage["total_tokens"] = usage["prompt_tokens"] + len(words)
+        yield event({**base, "choices": [], "usage": usage})
+    yield b"data: [DONE]\n\n"
+
+
+class FakeOpenRouterHandler(BaseHTTPRequestHandler):
+    latency = 0.2
+    token_latency = 0.005
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        time.sleep(self.latency)
+
+        completion = fake_completion(body)
+        if body.get("stream"):
+            self.send_stream(completion, body.get("stream_options") or {})
+            return
+
+        data = json.dumps(completion).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_stream(self, completion, stream_options):
+        """Replay a text completion as server-sent events, one word per chunk."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for event in stream_events(completion, stream_options):
+            self.wfile.write(event)
+            self.wfile.flush()
+            time.sleep(self.token_latency)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeOpenRouterServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_fake_server(latency=0.2, host="127.0.0.1", port=0):
+    """
+    Start a local OpenAI-compatible server in a background thread.
+
+    :param latency: Seconds each request sleeps before responding
+    :return: Tuple of (server, base_url); call ``server.shutdown()`` when done
+    """
+    handler = type("Handler", (FakeOpenRouterHandler,), {"latency": latency})
+    server = FakeOpenRouterServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/api/v1"
+
+
+if __name__ == "__main__":
+    server, base_url = start_fake_server(port=8765)
+    print(f"Fake OpenRouter listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
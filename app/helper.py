@@ -1,5 +1,77 @@
 from pprint import pprint
+import heapq
 import json
+import operator
+
+
+def side_scores(debate, criterion="score"):
+    evaluation = debate["evaluation"]
+    if criterion == "score":
+        return evaluation["proponent"]["score"], evaluation["opponent"]["score"]
+    return (
+        evaluation["proponent"]["criteria"][criterion],
+        evaluation["opponent"]["criteria"][criterion],
+    )
+
+
+SCORE_KEYS = {
+    "max": lambda debate: max(side_scores(debate)),
+    "min": lambda debate: min(side_scores(debate)),
+    "sum": lambda debate: sum(side_scores(debate)),
+    "margin": lambda debate: abs(operator.sub(*side_scores(debate))),
+}
+
+
+def score_key(name):
+    """
+    :param name: ``max``, ``min``, ``sum`` or ``margin`` of the two total
+        scores, or ``criterion:<name>`` for the higher of the two sides' scores
+        on one rubric criterion (such as ``criterion:rebuttal``)
+    :return: Function mapping an evaluation entry to its score
+    """
+    if name.startswith("criterion:"):
+        criterion = name[len("criterion:") :]
+        return lambda debate: max(side_scores(debate, criterion))
+    return SCORE_KEYS[name]
+
+
+def select_debates(debates, k, top_key="max", bottom_key="min"):
+    """
+    Top k and bottom k debates in a single pass, keeping at most 2k debates
+    in memory.
+
+    Ties go to the debate seen first, which matches a stable full sort.
+
+    :param debates: Dictionary of evaluation entries, or any iterable of
+        (key, entry) pairs such as iter_jsonl_debates
+    :param top_key: score_key name ranking the top debates, highest first
+    :param bottom_key: score_key name ranking the bottom debates, lowest first
+    :return: Tuple of (top, bottom) dictionaries of k debates each, best first
+    """
+    if k <= 0:
+        return {}, {}
+    if isinstance(debates, dict):
+        debates = debates.items()
+    top_score = score_key(top_key)
+    bottom_score = score_key(bottom_key)
+
+    # Each heap's root is the debate that would be dropped next: the lowest
+    # (or highest) score, and among equal scores the one seen last.
+    top, bottom = [], []
+    for index, (key, debate) in enumerate(debates):
+        top_item = (top_score(debate), -index, key, debate)
+        bottom_item = (-bottom_score(debate), -index, key, debate)
+        if len(top) < k:
+            heapq.heappush(top, top_item)
+            heapq.heappush(bottom, bottom_item)
+        else:
+            heapq.heappushpop(top, top_item)
+            heapq.heappushpop(bottom, bottom_item)
+
+    return (
+        {key: debate for _, _, key, debate in sorted(top, reverse=True)},
+        {key: debate for _, _, key, debate in sorted(bottom, reverse=True)},
+    )
 
 
 def sort_debates(debates, k, sort_type="top"):
@@ -11,22 +83,34 @@ def sort_debates(debates, k, sort_type="top"):
     :param sort_type: 'top' for highest scores, 'bottom' for lowest scores
     :return: Dictionary of k sorted debates in the original format
     """
-    compare_func = max if sort_type == "top" else min
+    top, bottom = select_debates(debates, k)
+    return top if sort_type == "top" else bottom
 
-    def get_scores(debate):
-        prop_score = debate["evaluation"]["proponent"]["score"]
-        op_score = debate["evaluation"]["opponent"]["score"]
-        return prop_score, op_score
 
-    # Sort the debates based on both scores
-    sorted_debates = sorted(
-        debates.items(),
-        key=lambda x: compare_func(get_scores(x[1])),
-        reverse=(sort_type == "top"),
-    )
+def iter_jsonl_debates(path):
+    """
+    Stream (key, entry) pairs from a JSON-lines file of evaluation entries,
+    such as good_debates.txt. The key is the line number.
+    """
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            if line.strip():
+                yield f"debate_{line_number}", json.loads(line)
 
-    # Return top/bottom k debates in the original format
-    return dict(sorted_debates[:k])
+
+def iter_json_debates(path):
+    """
+    Stream (key, entry) pairs from an evaluation JSON file. Uses ijson when it
+    is installed so the file is never fully loaded; otherwise falls back to
+    json.load.
+    """
+    with open(path, "rb") as f:
+        try:
+            import ijson
+        except ImportError:
+            yield from json.load(f).items()
+            return
+        yield from ijson.kvitems(f, "", use_float=True)
 
 
 def main():
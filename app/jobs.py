@@ -0,0 +1,217 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+import time
+import uuid
+from collections import deque
+
+from telemetry import telemetry
+
+
+# Jobs running at once in one server process; later submissions queue.
+DEFAULT_JOB_WORKERS = 4
+# Finished turns kept per job for live display
+RECENT_TURNS = 20
+FINISHED_STATES = ("finished", "failed", "cancelled")
+
+
+class Job:
+    """
+    State of one background pipeline run, updated from the job's thread and
+    read by any number of pollers. All access goes through a lock.
+    """
+
+    def __init__(self, job_id, description="", total_debates=None):
+        self.job_id = job_id
+        self.description = description
+        self.total_debates = total_debates
+        self.status = "queued"
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.counters = {
+            "debates_done": 0,
+            "debates_failed": 0,
+            "turns_done": 0,
+            "evaluations_done": 0,
+            "evaluations_failed": 0,
+        }
+        # (debate, evaluation) pairs in completion order
+        self.results = []
+        # (debate_id, iteration, role) -> turn being written, with its text so far
+        self.live_turns = {}
+        self.recent_turns = deque(maxlen=RECENT_TURNS)
+        self.cancel_requested = False
+        self._future = None
+        self._loop = None
+        self._task = None
+        self._lock = threading.Lock()
+
+    def on_event(self, event):
+        """on_turn_event callback for the pipeline; see engine.simulate_debate."""
+        with self._lock:
+            if event["type"] == "debate_end":
+                self.counters["debates_done"] += 1
+            elif event["type"] == "debate_failed":
+                self.counters["debates_failed"] += 1
+            else:
+                key = (event["debate_id"], event["iteration"], event["role"])
+                if event["type"] == "turn_start":
+                    self.live_turns[key] = {**event, "text": ""}
+                elif event["type"] == "token" and key in self.live_turns:
+                    self.live_turns[key]["text"] += event["text"]
+                elif event["type"] == "turn_reset" and key in self.live_turns:
+                    self.live_turns[key]["text"] = ""
+                elif event["type"] == "turn_end":
+                    self.live_turns.pop(key, None)
+                    self.counters["turns_done"] += 1
+                    self.recent_turns.append(event)
+
+    def add_result(self, debate, evaluation):
+        with self._lock:
+            self.results.append((debate, evaluation))
+            if "error" in evaluation:
+                self.counters["evaluations_failed"] += 1
+            else:
+                self.counters["evaluations_done"] += 1
+
+    def set_status(self, status, error=None):
+        with self._lock:
+            if self.status in FINISHED_STATES:
+                return
+            self.status = status
+            self.error = error
+            if status == "running":
+                self.started_at = time.time()
+            elif status in FINISHED_STATES:
+                self.finished_at = time.time()
+                self.live_turns.clear()
+
+    def snapshot(self, since=0):
+        """
+        :param since: Number of results the caller already has
+        :return: Dictionary with the status, counters, live and recent turns,
+            and the results after the first ``since``
+        """
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "description": self.description,
+                "status": self.status,
+                "error": self.error,
+                "total_debates": self.total_debates,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                **self.counters,
+                "live_turns": [dict(turn) for turn in self.live_turns.values()],
+                "recent_turns": list(self.recent_turns),
+                "results": self.results[since:],
+                "result_count": len(self.results),
+            }
+
+
+class JobRunner:
+    """
+    Runs pipelines in background threads, each on its own event loop, so
+    callers (Streamlit sessions) only submit, poll and cancel.
+
+    One runner is meant to be shared by the whole process, so jobs outlive the
+    session that started them: a refreshed page polls the same job again, and
+    several users' runs share the worker pool and the request scheduler's rate
+    limits. Runs are journaled as usual, so a job lost with the process can
+    still be resumed from its run ID.
+    """
+
+    def __init__(self, max_workers=DEFAULT_JOB_WORKERS):
+        self.jobs = {}
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers, thread_name_prefix="debate-job"
+        )
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        pipeline,
+        *args,
+        job_id=None,
+        description="",
+        total_debates=None,
+        **kwargs,
+    ):
+        """
+        :param pipeline: Async generator function yielding (debate, evaluation)
+            pairs and accepting ``on_turn_event``, such as
+            pipeline.stream_debates_and_evaluations or pipeline.resume
+        :param job_id: Defaults to a new ID; pass the run ID so the two match
+        :return: The job ID
+        """
+        job = Job(job_id or uuid.uuid4().hex[:12], description, total_debates)
+        with self._lock:
+            previous = self.jobs.get(job.job_id)
+            if previous is not None and previous.status not in FINISHED_STATES:
+                raise ValueError(f"Job {job.job_id} is already running")
+            self.jobs[job.job_id] = job
+        # The job runs in a copy of the submitter's context, so per-run
+        # settings made before submitting (such as prompt cache hints) apply
+        job._future = self._executor.submit(
+            contextvars.copy_context().run, self._run, job, pipeline, args, kwargs
+        )
+        return job.job_id
+
+    def poll(self, job_id, since=0):
+        """:return: Job.snapshot, or None for an unknown job"""
+        job = self.jobs.get(job_id)
+        return job.snapshot(since) if job is not None else None
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued job, or stop a running one: its in-flight debates are
+        cancelled and the results so far are kept.
+
+        :return: False when the job is unknown or already finished
+        """
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return False
+        with job._lock:
+            job.cancel_requested = True
+            loop, task = job._loop, job._task
+        if job._future.cancel():
+            job.set_status("cancelled")
+        elif loop is not None:
+            loop.call_soon_threadsafe(task.cancel)
+        return True
+
+    def list_jobs(self):
+        """:return: Snapshots without results, newest first"""
+        with self._lock:
+            jobs = list(self.jobs.values())
+        snapshots = [{**job.snapshot(), "results": []} for job in jobs]
+        return sorted(snapshots, key=lambda job: job["created_at"], reverse=True)
+
+    def _run(self, job, pipeline, args, kwargs):
+        job.set_status("running")
+        try:
+            # Calls made for the job, from any of its tasks, carry its ID
+            with telemetry.run(job.job_id):
+                asyncio.run(self._consume(job, pipeline, args, kwargs))
+        except asyncio.CancelledError:
+            job.set_status("cancelled")
+        except Exception as error:
+            job.set_status("failed", repr(error))
+        else:
+            job.set_status("cancelled" if job.cancel_requested else "finished")
+
+    async def _consume(self, job, pipeline, args, kwargs):
+        with job._lock:
+            job._loop = asyncio.get_running_loop()
+            job._task = asyncio.current_task()
+            if job.cancel_requested:
+                return
+        async for debate, evaluation in pipeline(
+            *args, on_turn_event=job.on_event, **kwargs
+        ):
+            job.add_result(debate, evaluation)
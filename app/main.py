@@ -1,14 +1,107 @@
-import json
-import streamlit as st
-from helper import sort_debates
-from start import run_debates
-from evaluator import evaluate_all_debates, write_evaluations_to_file
-
+import math
+import uuid
 
-def save_to_file(data, file_type):
-    filename = f"{file_type}_debates.txt"
-    with open(filename, "a") as f:
-        f.write(json.dumps(data) + "\n")
+import streamlit as st
+from analytics import (
+    criterion_correlations,
+    load_score_table,
+    model_leaderboard,
+    style_win_rates,
+)
+from helper import select_debates
+from context import CONTEXT_POLICIES
+from early_stop import EARLY_STOP_POLICIES, LeaderTest
+from engine import stream_stats
+from ensemble import AGGREGATIONS, DEFAULT_JUDGES, JudgeEnsemble, agreement
+from jobs import FINISHED_STATES, JobRunner
+from pipeline import resume, stream_debates_and_evaluations
+from prompt_cache import set_cache_hints
+from ratings import RatingEngine
+from results_store import results_store
+from start import FAMOUS_MODELS
+from tournament import STRATEGIES, Tournament
+from run_store import RunJournal, list_runs
+from telemetry import telemetry
+
+
+# Debates per page in the Top K and Bottom K tabs
+DEBATES_PER_PAGE = 10
+
+
+@st.cache_resource
+def job_runner():
+    # One runner for every session, so runs outlive page refreshes
+    return JobRunner()
+
+
+@st.cache_resource
+def tournaments():
+    # Tournament job ID -> Tournament, shared like the jobs themselves
+    return {}
+
+
+@st.cache_resource
+def rating_engine():
+    # One engine per server process; each sync folds in only the new debates
+    return RatingEngine()
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def selected_debates(store_path, run_id, k, version):
+    """
+    Top and bottom ``k`` debates of a run, each with its stored ``record``.
+
+    Cached per results store path and evaluation ``version``, so reruns
+    (widget changes, Save clicks) skip the query and selection until new
+    evaluations arrive.
+
+    :return: Tuple of (top list, bottom list)
+    """
+    top, bottom = select_debates(results_store.evaluations(run_id), k)
+    debates = [*top.values(), *bottom.values()]
+    records = results_store.records(debate["debate_id"] for debate in debates)
+    for debate in debates:
+        debate["record"] = records[debate["debate_id"]]
+    return list(top.values()), list(bottom.values())
+
+
+@st.cache_data(max_entries=4, show_spinner="Computing leaderboards...")
+def leaderboards(store_path, version):
+    """Ratings and score analytics over every stored evaluation, per ``version``."""
+    engine = rating_engine()
+    engine.sync()
+    table = load_score_table()
+    names, correlations = criterion_correlations(table)
+    return {
+        "elo": engine.elo_ratings(),
+        "bradley_terry": engine.bradley_terry(),
+        "models": model_leaderboard(table),
+        "styles": style_win_rates(table),
+        "correlations": {
+            "criterion": names,
+            **{name: correlations[i] for i, name in enumerate(names)},
+        },
+    }
+
+
+def paginate(debates, key):
+    """
+    :return: Tuple of (index of the first debate shown, debates on the chosen page)
+    """
+    pages = max(math.ceil(len(debates) / DEBATES_PER_PAGE), 1)
+    page = 1
+    if pages > 1:
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, key=key)
+    start = (page - 1) * DEBATES_PER_PAGE
+    return start, debates[start : start + DEBATES_PER_PAGE]
+
+
+@st.fragment
+def save_button(debate_id, label, winner, key):
+    # A fragment reruns on its own, so saving does not rerun the whole page
+    if st.button("💾 Save", key=key):
+        results_store.add_label(debate_id, label, winner)
+        st.success(f"Saved to {label} responses!")
 
 
 st.header("Debate Arena")
@@ -47,6 +140,67 @@ models = st.selectbox(
 
 models = [models] * num_debates * 2
 
+reuse_cached_scenario = st.checkbox(
+    "Reuse cached scenario",
+    value=False,
+    help="Generate the debate scenario once (or load it from the on-disk cache) and share it across all debates",
+)
+
+stream_turns = st.checkbox(
+    "Stream debate turns",
+    value=False,
+    help="Show each argument token by token as the debaters write it",
+)
+
+context_policy = st.selectbox(
+    "Debate context",
+    options=list(CONTEXT_POLICIES),
+    help="How much of the debate history each turn sees; bounded policies keep long debates cheap",
+)
+
+early_stop = st.selectbox(
+    "Early stopping",
+    options=list(EARLY_STOP_POLICIES),
+    help="End a debate before its last iteration once the agents repeat themselves or a cheap judge sees a decisive winner",
+)
+
+stop_when_decided = st.checkbox(
+    "Stop when the leader is decided",
+    value=False,
+    help="Cancel the remaining debates once one model's win rate is statistically ahead of every other model",
+)
+
+use_ensemble = st.checkbox(
+    "Judge ensemble",
+    value=False,
+    help="Grade every debate with several judge models in parallel instead of one",
+)
+if use_ensemble:
+    ensemble_judges = st.multiselect(
+        "Judges", options=DEFAULT_JUDGES, default=DEFAULT_JUDGES
+    )
+    ensemble_method = st.selectbox("Score aggregation", options=AGGREGATIONS)
+    cascade_threshold = st.number_input(
+        "Cascade threshold (points, 0 = off)",
+        min_value=0,
+        value=0,
+        help="Ask the expensive judge only when the judges' totals for a side differ by more than this or they pick different winners",
+    )
+
+prompt_cache_hints = st.checkbox(
+    "Prompt cache hints",
+    value=False,
+    help="Mark the rubric and persona prompts as cacheable for providers that need explicit hints (Anthropic, Gemini)",
+)
+
+unfinished_runs = [run_id for run_id, finished in list_runs() if not finished]
+resume_run = st.selectbox(
+    "Resume run",
+    options=["Start a new run", *unfinished_runs],
+    help="Continue an interrupted run from its last checkpoint; turns and evaluations already paid for are not repeated",
+)
+resume_run = None if resume_run == "Start a new run" else resume_run
+
 k = st.number_input(
     "Top K debates to display",
     min_value=1,
@@ -58,53 +212,247 @@ k = st.number_input(
 if "debate_run" not in st.session_state:
     st.session_state.debate_run = False
 
-if "fpath" not in st.session_state:
-    st.session_state.fpath = ""
+if "run_id" not in st.session_state:
+    st.session_state.run_id = None
+
+if "job_id" not in st.session_state:
+    # The job ID is kept in the URL so a refreshed page follows the same job
+    st.session_state.job_id = st.query_params.get("job")
 
 if st.button("Run Debate"):
-    st.session_state.debate_run = True
+    # Debates are graded as they finish, so results appear incrementally
+    set_cache_hints(prompt_cache_hints)
+    run_id = resume_run or uuid.uuid4().hex[:12]
+
+    ensemble = None
+    if use_ensemble:
+        ensemble = JudgeEnsemble(
+            ensemble_judges, ensemble_method, cascade_threshold or None
+        )
+
+    turn_options = {
+        "stream": stream_turns,
+        "context_policy": CONTEXT_POLICIES[context_policy],
+        "early_stop": EARLY_STOP_POLICIES[early_stop],
+        "ensemble": ensemble,
+    }
+    try:
+        if resume_run:
+            job_id = job_runner().submit(
+                resume,
+                resume_run,
+                job_id=run_id,
+                description=f"Resume of {resume_run}",
+                total_debates=len(RunJournal(resume_run).debate_tasks),
+                **turn_options,
+            )
+        else:
+            job_id = job_runner().submit(
+                stream_debates_and_evaluations,
+                num_debates,
+                debate_topic,
+                models,
+                num_iterations,
+                job_id=run_id,
+                description=f"{num_debates} debates: {debate_topic[:60]}",
+                total_debates=num_debates,
+                reuse_cached_scenario=reuse_cached_scenario,
+                run_id=run_id,
+                leader_test=LeaderTest() if stop_when_decided else None,
+                **turn_options,
+            )
+    except ValueError as error:
+        st.error(str(error))
+    else:
+        st.session_state.job_id = job_id
+        st.query_params["job"] = job_id
+        st.session_state.debate_run = False
+
+
+@st.fragment(run_every=1.0)
+def job_progress(job_id, show_live_turns):
+    """Redraws every second from the job's counters until the job finishes."""
+    job = job_runner().poll(job_id)
+    if job["status"] in FINISHED_STATES:
+        # Leave the fragment and render the finished run with the whole page
+        st.rerun()
 
     st.subheader("Running debates...")
+    st.caption(f"Run ID: {job_id} ({job['status']})")
+    total = job["total_debates"] or 1
+    debates = job["debates_done"] + job["debates_failed"]
+    evaluations = job["evaluations_done"] + job["evaluations_failed"]
+    st.progress(min(debates / total, 1.0), text=f"{debates}/{total} debates finished")
+    st.progress(
+        min(evaluations / total, 1.0), text=f"{evaluations}/{total} debates evaluated"
+    )
+    columns = st.columns(4)
+    columns[0].metric("Debates done", job["debates_done"])
+    columns[1].metric("Turns done", job["turns_done"])
+    columns[2].metric("Evaluations done", job["evaluations_done"])
+    columns[3].metric("Failures", job["debates_failed"] + job["evaluations_failed"])
+    if st.button("Cancel run"):
+        job_runner().cancel(job_id)
+
+    if show_live_turns:
+        with st.expander("Live debates", expanded=True):
+            for turn in job["live_turns"]:
+                with st.chat_message(turn["role"]):
+                    st.caption(
+                        f"Debate {turn['debate_id'] + 1}, iteration {turn['iteration']}: "
+                        f"{turn['agent']} ({turn['model']})"
+                    )
+                    st.markdown(turn["text"])
+
+    # Latest partial results, newest first
+    for index, (debate, evaluation) in reversed(
+        list(enumerate(job["results"], 1))[-10:]
+    ):
+        if "error" in evaluation:
+            st.warning(f"Evaluation failed: {evaluation['error']}")
+        else:
+            st.write(
+                f"**debate_{index}:** proponent {evaluation['evaluation']['proponent']['score']}"
+                f" / opponent {evaluation['evaluation']['opponent']['score']}"
+            )
 
-    debates = []
-    with st.spinner("Running debates..."):
-        debates = run_debates(num_debates, debate_topic, models, num_iterations)
-
-    st.success("Debate completed!")
-
-    # Evaluate debates
-    with st.spinner("Evaluating debates..."):
-        all_debate_evaluations = evaluate_all_debates(debates)
-        st.session_state.fpath = write_evaluations_to_file(all_debate_evaluations)
-
-    # Write evaluations to JSON file.
-    write_evaluations_to_file(all_debate_evaluations)
 
-    st.success("Debates evaluated!")
+def job_summary(job):
+    failures = job["evaluations_failed"] + job["debates_failed"]
+    if failures:
+        st.warning(f"{failures} of {job['total_debates']} debates failed")
+    if job["status"] == "failed":
+        st.error(f"Run {job['job_id']} failed: {job['error']}")
+    # Jobs tag their calls with their ID, so concurrent jobs are kept apart
+    records = telemetry.run_records(job["job_id"])
+    usage = telemetry.summary(records)
+    st.caption(
+        f"Run {job['job_id']}: {usage['total']['calls']} LLM calls, "
+        f"${usage['total']['cost']:.4f} estimated. Tokens, cache hits and latency per phase:"
+    )
+    st.dataframe(usage["by_phase"])
+    st.download_button(
+        "Prometheus metrics",
+        telemetry.prometheus_text(records),
+        file_name=f"llm_metrics_{job['job_id']}.prom",
+    )
+    # Read from the store, so it survives page refreshes and restarts
+    judge_scores = results_store.judge_scores(job["job_id"])
+    if judge_scores:
+        st.caption("Judge agreement")
+        st.json(agreement(judge_scores.values()))
+    if stream_turns:
+        st.caption("Streaming latency per model")
+        st.dataframe(stream_stats.summary())
+    if job["status"] == "cancelled":
+        st.info(f"Run {job['job_id']} cancelled; it can be resumed later")
+    else:
+        st.success("Debates evaluated!")
+
+
+if st.session_state.job_id:
+    job = job_runner().poll(st.session_state.job_id)
+    if job is None:
+        # The server restarted; the journal still has the run
+        st.info(
+            f"Run {st.session_state.job_id} is no longer running; "
+            "pick it under Resume run to continue it"
+        )
+        st.session_state.job_id = None
+        st.query_params.pop("job", None)
+    elif job["status"] in FINISHED_STATES:
+        job_summary(job)
+        tournament = tournaments().get(job["job_id"])
+        if tournament is not None:
+            # Waves are stored as runs of their own; show the standings instead
+            st.caption(f"Tournament finished after {tournament.played} debates")
+            st.dataframe(tournament.leaderboard())
+        else:
+            # Graded debates are already in the results store
+            st.session_state.run_id = job["job_id"]
+            st.session_state.debate_run = True
+    else:
+        job_progress(job["job_id"], stream_turns)
+
+with st.expander("Background runs"):
+    jobs = job_runner().list_jobs()
+    if jobs:
+        st.dataframe(
+            [
+                {
+                    "run": job["job_id"],
+                    "description": job["description"],
+                    "status": job["status"],
+                    "debates": job["debates_done"],
+                    "turns": job["turns_done"],
+                    "evaluations": job["evaluations_done"],
+                }
+                for job in jobs
+            ]
+        )
+        followed = st.selectbox("Follow run", options=[job["job_id"] for job in jobs])
+        if st.button("Follow") and followed != st.session_state.job_id:
+            st.session_state.job_id = followed
+            st.query_params["job"] = followed
+            st.session_state.debate_run = False
+            st.rerun()
+    else:
+        st.caption("No runs started since the server started")
+
+with st.expander("Tournament"):
+    st.caption(
+        "Rank several models with a fixed debate budget; each wave pairs the "
+        "matchups that are most informative given the current ratings"
+    )
+    tournament_models = st.multiselect(
+        "Tournament models", options=FAMOUS_MODELS, default=FAMOUS_MODELS
+    )
+    tournament_budget = st.number_input("Debate budget", min_value=2, value=24)
+    tournament_strategy = st.selectbox("Pairing strategy", options=STRATEGIES)
+
+    if st.button("Run Tournament"):
+        tournament = Tournament(
+            tournament_models,
+            tournament_budget,
+            strategy=tournament_strategy,
+        )
+        set_cache_hints(prompt_cache_hints)
+        # Runs in the background like debate runs; progress is polled above
+        job_id = job_runner().submit(
+            tournament.run,
+            debate_topic,
+            num_iterations,
+            job_id=tournament.tournament_id,
+            description=f"Tournament of {len(tournament.models)} models",
+            total_debates=tournament_budget,
+            context_policy=CONTEXT_POLICIES[context_policy],
+            early_stop=EARLY_STOP_POLICIES[early_stop],
+        )
+        tournaments()[job_id] = tournament
+        st.session_state.job_id = job_id
+        st.query_params["job"] = job_id
+        st.session_state.debate_run = False
+        st.rerun()
 
 if st.session_state.debate_run:
-    if st.session_state.fpath:
-        with open(st.session_state.fpath, "r") as f:
-            debates = json.load(f)
-
-        top_k = sort_debates(debates, k, sort_type="top")
-        bottom_k = sort_debates(debates, k, sort_type="bottom")
+    if st.session_state.run_id:
+        top_k, bottom_k = selected_debates(
+            results_store.path,
+            st.session_state.run_id,
+            k,
+            results_store.version(st.session_state.run_id),
+        )
 
         # Results section
         st.header("Results")
 
-        tab1, tab2 = st.tabs(["Top K Debates", "Bottom K Debates"])
+        tab1, tab2, tab3 = st.tabs(["Top K Debates", "Bottom K Debates", "Leaderboard"])
 
         def display_debate(debate, index, is_top):
             st.subheader(f"Debate {index + 1}")
 
-            # Extract topic from debate_text
-            debate_text = debate["debate_text"]
-            topic = debate_text.split("\n")[0].replace("Topic: ", "")
-            st.write(f"**Topic:** {topic}")
-
-            # Split debate text into parts
-            parts = debate_text.split(";;")[1:]  # Skip the topic
+            record = debate["record"]
+            st.write(f"**Topic:** {record.topic}")
 
             winner = (
                 "proponent"
@@ -113,49 +461,45 @@ if st.session_state.debate_run:
                 else "opponent"
             )
             loser = "opponent" if winner == "proponent" else "proponent"
-
-            for part in parts:
-                if part.startswith("Proponent"):
-                    with st.chat_message("proponent"):
-                        st.markdown(
-                            f"**{part}**"
-                            if (is_top and winner == "proponent")
-                            or (not is_top and loser == "proponent")
-                            else f"_{part}_"
-                        )
-
-                        # sound_file = BytesIO()
-                        # tts = gTTS(part, lang="en")
-                        # st.audio(sound_file)
-                elif part.startswith("Opponent"):
-                    with st.chat_message("opponent"):
-                        st.markdown(
-                            f"**{part}**"
-                            if (is_top and winner == "opponent")
-                            or (not is_top and loser == "opponent")
-                            else f"_{part}_"
-                        )
-                        # sound_file = BytesIO()
-                        # tts = gTTS(part, lang="en")
-
-            debate["winner"] = winner
+            highlighted = winner if is_top else loser
+
+            for turn in record.turns:
+                part = f"{turn.agent}:\n{turn.text}"
+                with st.chat_message(turn.role):
+                    st.markdown(
+                        f"**{part}**" if turn.role == highlighted else f"_{part}_"
+                    )
+                    # sound_file = BytesIO()
+                    # tts = gTTS(part, lang="en")
+                    # st.audio(sound_file)
 
             if is_top:
-                if st.button("💾 Save", key=f"save_top_{index}"):
-                    save_to_file(debate, "good")
-                    st.success("Saved to good responses!")
-
+                save_button(debate["debate_id"], "good", winner, f"save_top_{index}")
             else:
-                if st.button("💾 Save", key=f"save_bottom_{index}"):
-                    save_to_file(debate, "bad")
-                    st.success("Saved to bad responses!")
+                save_button(debate["debate_id"], "bad", winner, f"save_bottom_{index}")
 
         with tab1:
             st.subheader("Top K Debates")
-            for i, debate in enumerate(top_k.values()):
+            start, page = paginate(top_k, "top_page")
+            for i, debate in enumerate(page, start):
                 display_debate(debate, i, True)
 
         with tab2:
             st.subheader("Bottom K Debates")
-            for i, debate in enumerate(bottom_k.values()):
+            start, page = paginate(bottom_k, "bottom_page")
+            for i, debate in enumerate(page, start):
                 display_debate(debate, i, False)
+
+        with tab3:
+            st.subheader("Leaderboard")
+            boards = leaderboards(results_store.path, results_store.version())
+            st.caption("Elo ratings with 95% intervals")
+            st.dataframe(boards["elo"])
+            st.caption("Bradley-Terry ratings with 95% intervals")
+            st.dataframe(boards["bradley_terry"])
+            st.caption("All stored evaluations; mean total score with 95% bootstrap intervals")
+            st.dataframe(boards["models"])
+            st.caption("Win rate by debate style")
+            st.dataframe(boards["styles"])
+            st.caption("Rubric criterion correlations")
+            st.dataframe(boards["correlations"])
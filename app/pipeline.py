@@ -0,0 +1,323 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import queue
+import threading
+
+from engine import (
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_PER_MODEL_CONCURRENCY,
+    ConcurrencyLimiter,
+    iter_debates,
+    prepare_debates,
+)
+from evaluator import (
+    DEFAULT_EVAL_RETRIES,
+    DEFAULT_EVAL_WORKERS,
+    build_evaluation_entry,
+    evaluate_debate_data,
+)
+from results_store import results_store
+from run_store import RunJournal
+from start import Scenario
+
+
+# Finished debates waiting for a free evaluator before debate output backs up.
+DEFAULT_QUEUE_SIZE = 32
+
+_DONE = object()
+_TURN = object()
+_RESULT = object()
+_ERROR = object()
+
+
+async def evaluate_as_finished(
+    journal,
+    debate_tasks,
+    limiter,
+    scenario,
+    debate_ids,
+    finished=(),
+    eval_workers=DEFAULT_EVAL_WORKERS,
+    eval_retries=DEFAULT_EVAL_RETRIES,
+    queue_size=DEFAULT_QUEUE_SIZE,
+    leader_test=None,
+    ensemble=None,
+    **turn_options,
+):
+    """
+    Run the ``debate_ids`` tasks and grade each debate as soon as it finishes.
+
+    Finished debates go through a bounded queue to a pool of evaluators, so
+    grading overlaps with the debates still running. Every turn, debate and
+    successful evaluation is checkpointed to ``journal``, and graded debates
+    are stored in the results store.
+
+    :param finished: (debate_id, debate) pairs that only still need grading
+    :param leader_test: early_stop.LeaderTest; once it determines the best
+        model, the debates still running are cancelled and the run ends
+    :param ensemble: ensemble.JudgeEnsemble grading each debate with several
+        judges instead of the single default judge
+    """
+    loop = asyncio.get_running_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=eval_workers)
+    to_evaluate = asyncio.Queue(maxsize=queue_size)
+    evaluated = asyncio.Queue()
+
+    async def produce():
+        cancelled = False
+        try:
+            for item in finished:
+                await to_evaluate.put(item)
+            async for item in iter_debates(
+                debate_tasks,
+                limiter,
+                scenario,
+                journal=journal,
+                debate_ids=debate_ids,
+                **turn_options,
+            ):
+                await to_evaluate.put(item)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            # On cancellation the evaluators are being cancelled as well, so
+            # nothing would drain a full queue to make room for the sentinels
+            if not cancelled:
+                for _ in range(eval_workers):
+                    await to_evaluate.put(_DONE)
+
+    def grade(debate):
+        if ensemble is not None:
+            return ensemble.evaluate_debate_data(debate, eval_retries)
+        debate_text, parsed, error = evaluate_debate_data(debate, eval_retries)
+        if error is not None:
+            return debate_text, None, error
+        return debate_text, build_evaluation_entry(debate_text, parsed), None
+
+    async def evaluate():
+        try:
+            while (item := await to_evaluate.get()) is not _DONE:
+                debate_id, debate = item
+                # Copies of the context keep per-run settings in the thread
+                debate_text, evaluation, error = await loop.run_in_executor(
+                    executor, contextvars.copy_context().run, grade, debate
+                )
+                if error is None:
+                    # Stored before journaling, so a debate is only marked
+                    # graded once both writes succeeded
+                    try:
+                        await loop.run_in_executor(
+                            executor,
+                            contextvars.copy_context().run,
+                            results_store.record_debate,
+                            journal.run_id,
+                            evaluation,
+                            debate,
+                        )
+                        journal.record_evaluation(debate_id, evaluation)
+                    except Exception as store_error:
+                        error = store_error
+                if error is not None:
+                    # Not journaled, so a resumed run grades this debate again
+                    evaluation = {"debate_text": debate_text, "error": repr(error)}
+                await evaluated.put((debate, evaluation))
+        finally:
+            # Always counted, or the consumer below would wait forever
+            evaluated.put_nowait(_DONE)
+
+    workers = [asyncio.create_task(produce())]
+    workers += [asyncio.create_task(evaluate()) for _ in range(eval_workers)]
+
+    try:
+        remaining = eval_workers
+        while remaining:
+            item = await evaluated.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            yield item
+
+            debate, evaluation = item
+            if leader_test is not None and "error" not in evaluation:
+                leader_test.record(*debate["models"], evaluation)
+                if (leader := leader_test.leader()) is not None:
+                    print(f"{leader} leads with confidence; stopping the run early")
+                    journal.finish()
+                    return
+        if not journal.unfinished_debates() and not journal.unevaluated_debates():
+            journal.finish()
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        executor.shutdown(wait=False)
+        journal.close()
+
+
+async def stream_debates_and_evaluations(
+    num_debates,
+    question,
+    models,
+    num_iterations,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    per_model_concurrency=DEFAULT_PER_MODEL_CONCURRENCY,
+    reuse_cached_scenario=False,
+    eval_workers=DEFAULT_EVAL_WORKERS,
+    eval_retries=DEFAULT_EVAL_RETRIES,
+    queue_size=DEFAULT_QUEUE_SIZE,
+    run_id=None,
+    leader_test=None,
+    ensemble=None,
+    **turn_options,
+):
+    """
+    Run debates and grade each one as soon as it finishes.
+
+    Wall time tends to max(debates, evaluations) instead of their sum. The run
+    is journaled under ``run_id`` (a new ID by default), so an interrupted run
+    can be picked up again with resume.
+
+    :param leader_test: early_stop.LeaderTest ending the run once the best
+        model is statistically determined
+    :param ensemble: ensemble.JudgeEnsemble grading with several judges
+
+    :param turn_options: ``stream``, ``on_turn_event``, ``context_policy``
+        and ``early_stop``, forwarded to engine.simulate_debate
+    :return: Async iterator of (debate, evaluation) pairs in completion order.
+        ``evaluation`` is an evaluate_all_debates entry, or
+        ``{"debate_text": ..., "error": ...}`` when grading failed.
+    """
+    limiter = ConcurrencyLimiter(max_concurrency, per_model_concurrency)
+    debate_tasks, scenario = await prepare_debates(
+        num_debates, question, models, num_iterations, limiter, reuse_cached_scenario
+    )
+
+    params = {
+        "num_debates": num_debates,
+        "question": question,
+        "models": models,
+        "num_iterations": num_iterations,
+        "max_concurrency": max_concurrency,
+        "per_model_concurrency": per_model_concurrency,
+    }
+    journal = RunJournal(run_id)
+    journal.start(params, debate_tasks, scenario)
+    results_store.record_run(journal.run_id, params)
+
+    async for item in evaluate_as_finished(
+        journal,
+        debate_tasks,
+        limiter,
+        scenario,
+        range(len(debate_tasks)),
+        eval_workers=eval_workers,
+        eval_retries=eval_retries,
+        queue_size=queue_size,
+        leader_test=leader_test,
+        ensemble=ensemble,
+        **turn_options,
+    ):
+        yield item
+
+
+async def resume(
+    run_id,
+    eval_workers=DEFAULT_EVAL_WORKERS,
+    eval_retries=DEFAULT_EVAL_RETRIES,
+    queue_size=DEFAULT_QUEUE_SIZE,
+    **turn_options,
+):
+    """
+    Continue an interrupted run from its journal.
+
+    Debates and evaluations already journaled are yielded first without any
+    model calls. Finished but ungraded debates go straight to the evaluators,
+    and unfinished debates continue from their last completed turn.
+
+    :return: Async iterator of (debate, evaluation) pairs, as for
+        stream_debates_and_evaluations
+    """
+    journal = RunJournal(run_id)
+    if journal.debate_tasks is None:
+        raise ValueError(f"No journal found for run {run_id}")
+
+    for _, debate, evaluation in journal.evaluated_debates():
+        yield debate, evaluation
+
+    params = journal.params
+    limiter = ConcurrencyLimiter(
+        params["max_concurrency"], params["per_model_concurrency"]
+    )
+    scenario = None
+    if journal.shared_scenario is not None:
+        scenario = Scenario.model_validate(journal.shared_scenario)
+
+    async for item in evaluate_as_finished(
+        journal,
+        [tuple(task) for task in journal.debate_tasks],
+        limiter,
+        scenario,
+        journal.unfinished_debates(),
+        journal.unevaluated_debates(),
+        eval_workers=eval_workers,
+        eval_retries=eval_retries,
+        queue_size=queue_size,
+        **turn_options,
+    ):
+        yield item
+
+
+def stream_debates_and_evaluations_sync(*args, on_turn_event=None, **kwargs):
+    """
+    Blocking iterator over stream_debates_and_evaluations for callers without
+    an event loop (Streamlit, CLI). The pipeline runs on a background thread;
+    ``on_turn_event`` is called on the caller's thread between results, so it
+    may safely update Streamlit elements.
+    """
+    return iterate_sync(
+        stream_debates_and_evaluations, *args, on_turn_event=on_turn_event, **kwargs
+    )
+
+
+def resume_sync(run_id, on_turn_event=None, **kwargs):
+    """Blocking iterator over resume; see stream_debates_and_evaluations_sync."""
+    return iterate_sync(resume, run_id, on_turn_event=on_turn_event, **kwargs)
+
+
+def iterate_sync(pipeline, *args, on_turn_event=None, **kwargs):
+    items = queue.Queue()
+
+    def run():
+        async def consume():
+            async for item in pipeline(
+                *args,
+                on_turn_event=lambda event: items.put((_TURN, event)),
+                **kwargs,
+            ):
+                items.put((_RESULT, item))
+
+        try:
+            asyncio.run(consume())
+        except BaseException as error:
+            items.put((_ERROR, error))
+        finally:
+            items.put((_DONE, None))
+
+    # Started with a copy of the caller's context to keep its per-run settings
+    threading.Thread(
+        target=contextvars.copy_context().run, args=(run,), daemon=True
+    ).start()
+
+    while True:
+        kind, item = items.get()
+        if kind is _DONE:
+            return
+        if kind is _ERROR:
+            raise item
+        if kind is _TURN:
+            if on_turn_event is not None:
+                on_turn_event(item)
+            continue
+        yield item
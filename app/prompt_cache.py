@@ -0,0 +1,69 @@
+import contextvars
+
+from providers import env
+
+
+# OpenRouter providers that need explicit cache_control breakpoints; OpenAI and
+# DeepSeek models cache long byte-identical prefixes automatically.
+CACHE_CONTROL_PREFIXES = ("anthropic/", "google/")
+
+# Set per run by set_cache_hints; None falls back to PROMPT_CACHE_HINTS
+_cache_hints = contextvars.ContextVar("prompt_cache_hints", default=None)
+
+
+def set_cache_hints(enabled):
+    """
+    Opt in to (or out of) cache_control hints for prompts built after this in
+    the current context. Tasks and background jobs started afterwards inherit
+    the setting, so concurrent runs each keep their own.
+    """
+    _cache_hints.set(enabled)
+
+
+def cache_hints_enabled():
+    enabled = _cache_hints.get()
+    if enabled is None:
+        return env("PROMPT_CACHE_HINTS", "") == "1"
+    return enabled
+
+
+def supports_cache_control(model):
+    return model.startswith(CACHE_CONTROL_PREFIXES)
+
+
+def message_content(model, *segments):
+    """
+    Build message content from ordered (text, breakpoint) segments.
+
+    Without hints this is the plain concatenated string. With hints enabled and
+    a supporting provider it becomes content parts, with a cache_control marker
+    on every breakpoint segment. Either way the text sent is byte-identical, so
+    the two forms share the provider's cached prefix.
+    """
+    if not (cache_hints_enabled() and supports_cache_control(model)):
+        return "".join(text for text, _ in segments)
+
+    parts = []
+    for text, breakpoint in segments:
+        part = {"type": "text", "text": text}
+        if breakpoint:
+            part["cache_control"] = {"type": "ephemeral"}
+        parts.append(part)
+    return parts
+
+
+def cached_tokens(usage):
+    """Cached prompt tokens from a usage object or dict, 0 when not reported."""
+    if usage is None:
+        return 0
+    details = (
+        usage.get("prompt_tokens_details")
+        if isinstance(usage, dict)
+        else getattr(usage, "prompt_tokens_details", None)
+    )
+    if details is None:
+        return 0
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", 0) or 0
+
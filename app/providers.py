@@ -0,0 +1,417 @@
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections import Counter
+
+from fake_openrouter import fake_completion, stream_events
+
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+# llama.cpp's server and vLLM both listen here by default
+LOCAL_BASE_URL = "http://localhost:8000/v1"
+DEFAULT_WEAVE_PROJECT = "together-weave"
+
+# Guards the one-time setup and the memoized clients below
+_init_lock = threading.RLock()
+
+
+def once(factory):
+    """
+    Memoize a zero-argument factory. The first call runs it under a lock, so
+    concurrent first callers share one result. ``factory.reset()`` forgets the
+    result and ``factory.override(value)`` replaces it.
+    """
+    result = []
+
+    @functools.wraps(factory)
+    def wrapper():
+        if not result:
+            with _init_lock:
+                if not result:
+                    result.append(factory())
+        return result[0]
+
+    def override(value):
+        with _init_lock:
+            result[:] = [value]
+
+    wrapper.reset = result.clear
+    wrapper.override = override
+    return wrapper
+
+
+def per_event_loop(factory):
+    """
+    Like ``once``, but memoized per running event loop: async HTTP clients
+    hold connections bound to the loop that opened them, and background jobs
+    and benchmarks run several loops in different threads. ``reset()``
+    forgets every loop's result.
+    """
+    results = weakref.WeakKeyDictionary()
+
+    @functools.wraps(factory)
+    def wrapper():
+        loop = asyncio.get_running_loop()
+        with _init_lock:
+            if loop not in results:
+                results[loop] = factory()
+            return results[loop]
+
+    wrapper.reset = results.clear
+    return wrapper
+
+
+@once
+def load_env():
+    """Load .env into the environment, once."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return True
+
+
+def env(name, default=None):
+    """
+    Read a setting from the environment after loading .env, so settings
+    resolved at first use rather than at import also see .env values.
+    """
+    load_env()
+    return os.environ.get(name, default)
+
+
+@once
+def setup():
+    """
+    Load .env and start Weave tracing, once, on first use of an LLM client
+    rather than at import. Set WEAVE_PROJECT to an empty string to run
+    without tracing (offline runs and benchmarks).
+    """
+    load_env()
+    project = os.environ.get("WEAVE_PROJECT", DEFAULT_WEAVE_PROJECT)
+    if project:
+        import weave
+
+        weave.init(project)
+    return True
+
+
+class Provider(ABC):
+    """
+    Where chat completion requests are sent.
+
+    Every module builds its OpenAI clients through ``client`` and
+    ``async_client``, so switching provider switches the whole pipeline.
+    Retries stay off in the clients because the request scheduler owns them.
+    """
+
+    name = "provider"
+
+    @abstractmethod
+    def client_options(self, asynchronous=False):
+        """:return: Keyword arguments for OpenAI / AsyncOpenAI"""
+
+    def client(self):
+        from openai import OpenAI
+
+        return OpenAI(max_retries=0, **self.client_options())
+
+    def async_client(self):
+        from openai import AsyncOpenAI
+
+        return AsyncOpenAI(max_retries=0, **self.client_options(asynchronous=True))
+
+
+class OpenRouterProvider(Provider):
+    """The hosted OpenRouter API (the original behavior)."""
+
+    name = "openrouter"
+
+    def __init__(self, base_url=None, api_key=None):
+        self.base_url = base_url or os.environ.get(
+            "OPENROUTER_BASE_URL", OPENROUTER_BASE_URL
+        )
+        self.api_key = api_key or os.environ.get("OPENROUTER_API_KEY")
+
+    def client_options(self, asynchronous=False):
+        return {"api_key": self.api_key, "base_url": self.base_url}
+
+
+def model_override_transport(model, asynchronous=False):
+    """httpx transport that rewrites every JSON request body to ask for ``model``."""
+    import httpx
+
+    def override(request):
+        body = json.loads(request.content or b"{}")
+        body["model"] = model
+        headers = request.headers.copy()
+        headers.pop("content-length", None)
+        return httpx.Request(
+            request.method, request.url, headers=headers, content=json.dumps(body)
+        )
+
+    if asynchronous:
+
+        class Transport(httpx.AsyncHTTPTransport):
+            async def handle_async_request(self, request):
+                return await super().handle_async_request(override(request))
+
+    else:
+
+        class Transport(httpx.HTTPTransport):
+            def handle_request(self, request):
+                return super().handle_request(override(request))
+
+    return Transport()
+
+
+class LocalProvider(Provider):
+    """
+    An OpenAI-compatible server on this machine or network, such as llama.cpp's
+    ``llama-server`` or ``vllm serve``.
+
+    Such servers usually host a single model under their own name. With
+    ``model`` set, every request is rewritten to ask for it, so the
+    OpenRouter model names used throughout the app still work; telemetry and
+    results keep the original names.
+    """
+
+    name = "local"
+
+    def __init__(self, base_url=None, api_key=None, model=None):
+        self.base_url = base_url or os.environ.get("LOCAL_LLM_BASE_URL", LOCAL_BASE_URL)
+        # Most local servers ignore the key, but the client requires one
+        self.api_key = api_key or os.environ.get("LOCAL_LLM_API_KEY", "local")
+        self.model = model or os.environ.get("LOCAL_LLM_MODEL")
+
+    def client_options(self, asynchronous=False):
+        options = {"api_key": self.api_key, "base_url": self.base_url}
+        if self.model:
+            import httpx
+
+            transport = model_override_transport(self.model, asynchronous)
+            http_client = httpx.AsyncClient if asynchronous else httpx.Client
+            options["http_client"] = http_client(transport=transport)
+        return options
+
+
+class FakeProvider(Provider):
+    """
+    Deterministic in-process stand-in for a provider, for offline load tests.
+
+    Requests never leave the process: an httpx mock transport answers them
+    with fake_openrouter.fake_completion, so there are no sockets or server
+    threads to saturate at high concurrency. Identical requests get identical
+    completions.
+
+    :param latency: Median seconds each request waits before responding
+    :param latency_sigma: Spread of the log-normal latency distribution; 0 for
+        a fixed latency. Real providers have long tails, around 0.5 to 1.
+    :param token_latency: Seconds between streamed chunks
+    :param completion_words: Length of plain-text completions
+    :param error_rate: Share of requests answered with a retryable 429 or 503.
+        Whether an attempt fails depends only on ``seed``, the request body and
+        how many times that body has been sent, not on scheduling order.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        latency=None,
+        latency_sigma=None,
+        token_latency=None,
+        completion_words=None,
+        error_rate=None,
+        seed=0,
+    ):
+        env = os.environ.get
+        if latency is None:
+            latency = env("FAKE_LLM_LATENCY", 0.2)
+        if latency_sigma is None:
+            latency_sigma = env("FAKE_LLM_LATENCY_SIGMA", 0.0)
+        if token_latency is None:
+            token_latency = env("FAKE_LLM_TOKEN_LATENCY", 0.005)
+        if completion_words is None:
+            completion_words = env("FAKE_LLM_WORDS", 40)
+        if error_rate is None:
+            error_rate = env("FAKE_LLM_ERROR_RATE", 0.0)
+        self.latency = float(latency)
+        self.latency_sigma = float(latency_sigma)
+        self.token_latency = float(token_latency)
+        self.completion_words = int(completion_words)
+        self.error_rate = float(error_rate)
+        self.seed = seed
+        self.requests = 0
+        self.errors = 0
+        self._attempts = Counter()
+        self._lock = threading.Lock()
+
+    def plan(self, content):
+        """:return: Tuple of (error status or None, seconds to wait)"""
+        digest = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            self.requests += 1
+            self._attempts[digest] += 1
+            attempt = self._attempts[digest]
+        rng = random.Random(f"{self.seed}:{digest}:{attempt}")
+        latency = self.latency
+        if self.latency_sigma:
+            latency *= rng.lognormvariate(0, self.latency_sigma)
+        if rng.random() >= self.error_rate:
+            return None, latency
+        with self._lock:
+            self.errors += 1
+        return rng.choice((429, 503)), latency
+
+    def error_response(self, status):
+        import httpx
+
+        return httpx.Response(
+            status,
+            headers={"retry-after": "0.05"},
+            json={"error": {"message": "fake provider error", "code": status}},
+        )
+
+    def respond(self, request):
+        import httpx
+
+        body = json.loads(request.content or b"{}")
+        completion = fake_completion(body, self.completion_words)
+        if body.get("stream"):
+            return None, completion, body.get("stream_options")
+        return httpx.Response(200, json=completion), None, None
+
+    def handle(self, request):
+        import httpx
+
+        status, latency = self.plan(request.content)
+        time.sleep(latency)
+        if status:
+            return self.error_response(status)
+        response, completion, stream_options = self.respond(request)
+        if response is not None:
+            return response
+
+        def chunks():
+            for event in stream_events(completion, stream_options):
+                yield event
+                time.sleep(self.token_latency)
+
+        return httpx.Response(
+            200, headers={"content-type": "text/event-stream"}, content=chunks()
+        )
+
+    async def handle_async(self, request):
+        import httpx
+
+        status, latency = self.plan(request.content)
+        await asyncio.sleep(latency)
+        if status:
+            return self.error_response(status)
+        response, completion, stream_options = self.respond(request)
+        if response is not None:
+            return response
+
+        async def chunks():
+            for event in stream_events(completion, stream_options):
+                yield event
+                await asyncio.sleep(self.token_latency)
+
+        return httpx.Response(
+            200, headers={"content-type": "text/event-stream"}, content=chunks()
+        )
+
+    def client_options(self, asynchronous=False):
+        import httpx
+
+        if asynchronous:
+            http_client = httpx.AsyncClient(
+                transport=httpx.MockTransport(self.handle_async)
+            )
+        else:
+            http_client = httpx.Client(transport=httpx.MockTransport(self.handle))
+        return {
+            "api_key": "fake",
+            "base_url": "http://fake.invalid/api/v1",
+            "http_client": http_client,
+        }
+
+
+PROVIDERS = {
+    "openrouter": OpenRouterProvider,
+    "local": LocalProvider,
+    "fake": FakeProvider,
+}
+
+
+@once
+def default_provider():
+    setup()
+    return get_provider(os.environ.get("LLM_PROVIDER", "openrouter"))
+
+
+def get_provider(name=None):
+    """
+    :param name: Key of PROVIDERS for a new provider; without one, the shared
+        default chosen by the LLM_PROVIDER environment variable (OpenRouter when
+        unset), created on first use after .env is loaded
+    """
+    if name is None:
+        return default_provider()
+    if name not in PROVIDERS:
+        raise ValueError(
+            f"Unknown provider {name!r}; expected one of {list(PROVIDERS)}"
+        )
+    return PROVIDERS[name]()
+
+
+@once
+def openai_client():
+    setup()
+    return get_provider().client()
+
+
+@per_event_loop
+def async_openai_client():
+    setup()
+    return get_provider().async_client()
+
+
+@once
+def instructor_client():
+    import instructor
+
+    return instructor.from_openai(openai_client())
+
+
+@per_event_loop
+def async_instructor_client():
+    import instructor
+
+    return instructor.from_openai(async_openai_client())
+
+
+CLIENTS = (
+    openai_client,
+    async_openai_client,
+    instructor_client,
+    async_instructor_client,
+)
+
+
+def set_provider(provider):
+    """
+    Replace the default provider, e.g. with a configured FakeProvider; clients
+    created from the previous one are dropped.
+    """
+    with _init_lock:
+        for client in CLIENTS:
+            client.reset()
+        default_provider.override(provider)
@@ -0,0 +1,248 @@
+import argparse
+import json
+import math
+import os
+import threading
+from statistics import NormalDist
+
+import numpy as np
+
+from providers import env
+from results_store import SCORE_COLUMNS, results_store
+
+
+INITIAL_RATING = 1500.0
+ELO_K = 32.0
+# Rating points per unit of natural-log strength
+ELO_SCALE = 400 / math.log(10)
+# Virtual ties added to every played pair so unbeaten players stay finite
+BT_PRIOR = 1.0
+PLAYER_KINDS = ("model", "style")
+
+
+def default_ratings_path():
+    return env("RATINGS_PATH", os.path.join("results", "ratings.json"))
+
+
+def outcome(proponent_score, opponent_score):
+    """:return: The proponent's result: 1 for a win, 0.5 for a tie, 0 for a loss"""
+    if proponent_score == opponent_score:
+        return 0.5
+    return 1.0 if proponent_score > opponent_score else 0.0
+
+
+def z_score(confidence):
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+class RatingEngine:
+    """
+    Elo and Bradley-Terry ratings for models and debate styles.
+
+    Each debate updates the Elo ratings and the pairwise win counts in O(1),
+    and both are persisted as JSON, so only debates stored since the last sync
+    are read. Bradley-Terry is fitted from the win counts on demand.
+
+    Players are named ``model:<name>`` or ``style:<description>``; a debate
+    between two identical players carries no information and is skipped.
+    """
+
+    def __init__(self, path=None, k=ELO_K):
+        """:param path: JSON state file; defaults to default_ratings_path"""
+        self.path = default_ratings_path() if path is None else path
+        self.k = k
+        # player -> {"rating", "games", "information"}
+        self.elo = {}
+        # "player_a\tplayer_b" (sorted) -> [wins of a, wins of b]
+        self.pairs = {}
+        self.last_debate_id = 0
+        self._lock = threading.Lock()
+
+        if self.path and os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                state = json.load(f)
+            self.elo = state["elo"]
+            self.pairs = state["pairs"]
+            self.last_debate_id = state["last_debate_id"]
+
+    def record_game(self, player_a, player_b, score_a):
+        """
+        :param score_a: ``player_a``'s result: 1 win, 0.5 tie, 0 loss
+        """
+        if player_a == player_b:
+            return
+        a = self.elo.setdefault(
+            player_a, {"rating": INITIAL_RATING, "games": 0, "information": 0.0}
+        )
+        b = self.elo.setdefault(
+            player_b, {"rating": INITIAL_RATING, "games": 0, "information": 0.0}
+        )
+        expected_a = 1 / (1 + 10 ** ((b["rating"] - a["rating"]) / 400))
+        a["rating"] += self.k * (score_a - expected_a)
+        b["rating"] -= self.k * (score_a - expected_a)
+        for player in (a, b):
+            player["games"] += 1
+            # Fisher information of the logistic model, for the standard error
+            player["information"] += expected_a * (1 - expected_a)
+
+        first, second = sorted((player_a, player_b))
+        wins = self.pairs.setdefault(f"{first}\t{second}", [0.0, 0.0])
+        wins[0 if first == player_a else 1] += score_a
+        wins[1 if first == player_a else 0] += 1 - score_a
+
+    def record_debate(self, row):
+        """Update every rating with one SCORE_COLUMNS row from the results store."""
+        debate = dict(zip(SCORE_COLUMNS, row))
+        score = outcome(debate["proponent_score"], debate["opponent_score"])
+        for kind in PLAYER_KINDS:
+            proponent = debate[f"proponent_{kind}"]
+            opponent = debate[f"opponent_{kind}"]
+            if proponent and opponent:
+                self.record_game(f"{kind}:{proponent}", f"{kind}:{opponent}", score)
+        self.last_debate_id = max(self.last_debate_id, debate["debate_id"])
+
+    def sync(self, store=results_store):
+        """
+        Fold in debates stored since the last sync and save the state.
+
+        :return: Number of new debates
+        """
+        with self._lock:
+            rows = store.score_rows(after_id=self.last_debate_id)
+            for row in rows:
+                self.record_debate(row)
+            if rows:
+                self.save()
+        return len(rows)
+
+    def save(self):
+        if not self.path:
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Write then rename, so a crash never leaves a half-written state file
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "elo": self.elo,
+                    "pairs": self.pairs,
+                    "last_debate_id": self.last_debate_id,
+                },
+                f,
+            )
+        os.replace(tmp_path, self.path)
+
+    def players(self, kind="model"):
+        return sorted(player for player in self.elo if player.startswith(f"{kind}:"))
+
+    def elo_ratings(self, kind="model", confidence=0.95):
+        """
+        :return: List of rows (name, rating, games, ci_low, ci_high), highest first
+        """
+        z = z_score(confidence)
+        rows = []
+        for player in self.players(kind):
+            state = self.elo[player]
+            error = (
+                ELO_SCALE / math.sqrt(state["information"])
+                if state["information"]
+                else math.inf
+            )
+            rows.append(
+                {
+                    "name": player.split(":", 1)[1],
+                    "rating": state["rating"],
+                    "games": state["games"],
+                    "ci_low": state["rating"] - z * error,
+                    "ci_high": state["rating"] + z * error,
+                }
+            )
+        return sorted(rows, key=lambda row: row["rating"], reverse=True)
+
+    def bradley_terry(
+        self, kind="model", confidence=0.95, prior=BT_PRIOR, max_iter=1000, tol=1e-8
+    ):
+        """
+        Maximum-likelihood Bradley-Terry ratings on the Elo scale (mean 1500),
+        fitted with vectorized minorization-maximization iterations. Intervals
+        come from the inverse Fisher information.
+
+        :return: List of rows (name, rating, games, ci_low, ci_high), highest first
+        """
+        players = self.players(kind)
+        if not players:
+            return []
+        index = {player: i for i, player in enumerate(players)}
+        wins = np.zeros((len(players), len(players)))
+        for key, (wins_a, wins_b) in self.pairs.items():
+            player_a, player_b = key.split("\t")
+            if player_a in index and player_b in index:
+                i, j = index[player_a], index[player_b]
+                wins[i, j] += wins_a + prior / 2
+                wins[j, i] += wins_b + prior / 2
+        games = wins + wins.T
+        total_wins = wins.sum(axis=1)
+
+        strength = np.ones(len(players))
+        for _ in range(max_iter):
+            denominator = (games / (strength[:, None] + strength[None, :])).sum(axis=1)
+            updated = total_wins / denominator
+            updated /= np.exp(np.log(updated).mean())
+            converged = np.abs(np.log(updated) - np.log(strength)).max() < tol
+            strength = updated
+            if converged:
+                break
+
+        pair_information = (
+            games
+            * strength[:, None]
+            * strength[None, :]
+            / (strength[:, None] + strength[None, :]) ** 2
+        )
+        information = np.diag(pair_information.sum(axis=1)) - pair_information
+        # Ratings are only defined up to a shift, so the information matrix is
+        # singular; the pseudo-inverse gives errors relative to the mean
+        errors = np.sqrt(np.clip(np.diag(np.linalg.pinv(information)), 0, None))
+
+        z = z_score(confidence)
+        ratings = INITIAL_RATING + ELO_SCALE * np.log(strength)
+        rows = [
+            {
+                "name": player.split(":", 1)[1],
+                "rating": float(ratings[i]),
+                "games": self.elo[player]["games"],
+                "ci_low": float(ratings[i] - z * ELO_SCALE * errors[i]),
+                "ci_high": float(ratings[i] + z * ELO_SCALE * errors[i]),
+            }
+            for i, player in enumerate(players)
+        ]
+        return sorted(rows, key=lambda row: row["rating"], reverse=True)
+
+
+def print_ratings(title, rows):
+    print(f"\n{title}")
+    for row in rows:
+        print(
+            f"  {row['name'][:60]:<60} {row['rating']:7.1f}  "
+            f"[{row['ci_low']:7.1f}, {row['ci_high']:7.1f}]  {row['games']:>6} games"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Elo and Bradley-Terry leaderboards")
+    parser.add_argument("--kind", choices=PLAYER_KINDS, default="model")
+    parser.add_argument("--state", default=default_ratings_path())
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="discard the saved state and replay every debate",
+    )
+    args = parser.parse_args()
+
+    if args.rebuild and os.path.exists(args.state):
+        os.remove(args.state)
+    engine = RatingEngine(args.state)
+    print(f"{engine.sync()} new debates rated")
+    print_ratings("Elo", engine.elo_ratings(args.kind))
+    print_ratings("Bradley-Terry", engine.bradley_terry(args.kind))
@@ -0,0 +1,601 @@
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from debate_record import ROLES, DebateRecord, Turn, write_records
+from providers import env
+from sqlite_cache import content_key
+
+
+def default_results_path():
+    return env("RESULTS_DB", os.path.join("results", "debates.sqlite3"))
+
+
+# DebateEvaluation rubric criteria, stored per side next to the total score
+CRITERIA = [
+    "respect_for_other_team",
+    "information",
+    "relevance_of_supporting_arguments",
+    "strength_of_arguments",
+    "rebuttal",
+    "organization",
+    "preparation",
+]
+SIDES = ("proponent", "opponent")
+CRITERION_COLUMNS = [f"{side}_{criterion}" for side in SIDES for criterion in CRITERIA]
+CRITERION_SCHEMA = ",\n    ".join(f"{column} REAL" for column in CRITERION_COLUMNS)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    params TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS debates (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT REFERENCES runs (run_id),
+    content_hash TEXT NOT NULL,
+    topic TEXT,
+    proponent_model TEXT,
+    opponent_model TEXT,
+    proponent_style TEXT,
+    opponent_style TEXT,
+    debate_text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (run_id, content_hash)
+);
+CREATE TABLE IF NOT EXISTS turns (
+    debate_id INTEGER NOT NULL REFERENCES debates (id),
+    position INTEGER NOT NULL,
+    iteration INTEGER,
+    speaker TEXT NOT NULL,
+    role TEXT,
+    argument TEXT NOT NULL,
+    tokens INTEGER,
+    latency REAL,
+    PRIMARY KEY (debate_id, position)
+);
+CREATE TABLE IF NOT EXISTS evaluations (
+    debate_id INTEGER PRIMARY KEY REFERENCES debates (id),
+    proponent_score REAL NOT NULL,
+    opponent_score REAL NOT NULL,
+    proponent_reasoning TEXT,
+    opponent_reasoning TEXT,
+    max_score REAL NOT NULL,
+    min_score REAL NOT NULL,
+    {CRITERION_SCHEMA},
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS labels (
+    debate_id INTEGER NOT NULL REFERENCES debates (id),
+    label TEXT NOT NULL,
+    winner TEXT,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (debate_id, label)
+);
+CREATE TABLE IF NOT EXISTS judge_scores (
+    debate_id INTEGER NOT NULL REFERENCES debates (id),
+    judge TEXT NOT NULL,
+    proponent_score REAL NOT NULL,
+    opponent_score REAL NOT NULL,
+    tie_breaker INTEGER NOT NULL,
+    PRIMARY KEY (debate_id, judge)
+);
+CREATE INDEX IF NOT EXISTS debates_run ON debates (run_id);
+CREATE INDEX IF NOT EXISTS debates_topic ON debates (topic);
+CREATE INDEX IF NOT EXISTS debates_proponent_model ON debates (proponent_model);
+CREATE INDEX IF NOT EXISTS debates_opponent_model ON debates (opponent_model);
+CREATE INDEX IF NOT EXISTS evaluations_max_score ON evaluations (max_score);
+CREATE INDEX IF NOT EXISTS evaluations_min_score ON evaluations (min_score);
+CREATE INDEX IF NOT EXISTS labels_label ON labels (label);
+"""
+
+EVALUATION_COLUMNS = """
+    d.id, d.debate_text, e.proponent_score, e.proponent_reasoning,
+    e.opponent_score, e.opponent_reasoning
+""" + "".join(f", e.{column}" for column in CRITERION_COLUMNS)
+
+# Columns loaded by analytics.load_score_table
+SCORE_COLUMNS = [
+    "debate_id",
+    "run_id",
+    "topic",
+    "proponent_model",
+    "opponent_model",
+    "proponent_style",
+    "opponent_style",
+    "proponent_score",
+    "opponent_score",
+    *CRITERION_COLUMNS,
+]
+
+
+def row_to_entry(row):
+    debate_id, debate_text, prop_score, prop_reasoning, opp_score, opp_reasoning = row[:6]
+    entry = {
+        "debate_id": debate_id,
+        "debate_text": debate_text,
+        "evaluation": {
+            "proponent": {"score": prop_score, "reasoning": prop_reasoning},
+            "opponent": {"score": opp_score, "reasoning": opp_reasoning},
+        },
+    }
+    # Debates imported from before criteria were kept have no sub-scores
+    criteria = row[6:]
+    if criteria[0] is not None:
+        for side_index, side in enumerate(SIDES):
+            entry["evaluation"][side]["criteria"] = dict(
+                zip(CRITERIA, criteria[side_index * len(CRITERIA) :])
+            )
+    return entry
+
+
+class ResultsStore:
+    """
+    Debates, turns, evaluations and good/bad labels in one SQLite database.
+
+    A single connection behind a lock is the only writer in the process, and
+    each debate is written together with its turns and evaluation in one
+    transaction. WAL mode lets other processes (such as a second Streamlit
+    session) read while a run is being written. Debates are keyed by their run
+    and a hash of their text, so recording or importing the same debate twice
+    in one run is a no-op, while a later run repeating it gets its own row.
+    """
+
+    def __init__(self, path=None):
+        """:param path: Defaults to default_results_path, resolved on first use"""
+        self._path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = default_results_path()
+        return self._path
+
+    def _connect(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def record_run(self, run_id, params=None):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO runs VALUES (?, ?, ?)",
+                    (run_id, json.dumps(params), time.time()),
+                )
+
+    def _insert_debate(self, conn, run_id, debate_text, debate=None):
+        content_hash = content_key(debate_text)
+        row = conn.execute(
+            "SELECT id FROM debates WHERE run_id IS ? AND content_hash = ?",
+            (run_id, content_hash),
+        ).fetchone()
+        if row is not None:
+            return row[0]
+
+        if debate is not None:
+            record = DebateRecord.from_debate(debate)
+        else:
+            record = DebateRecord.parse(debate_text)
+        models = record.models or [None, None]
+        styles = record.styles or [None, None]
+        debate_id = conn.execute(
+            """
+            INSERT INTO debates (run_id, content_hash, topic, proponent_model,
+                opponent_model, proponent_style, opponent_style, debate_text,
+                created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                run_id,
+                content_hash,
+                record.topic,
+                models[0],
+                models[1],
+                styles[0],
+                styles[1],
+                debate_text,
+                time.time(),
+            ),
+        ).lastrowid
+        conn.executemany(
+            """
+            INSERT INTO turns (debate_id, position, iteration, speaker, argument,
+                role, tokens, latency)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    debate_id,
+                    position,
+                    turn.iteration,
+                    turn.agent,
+                    turn.text,
+                    turn.role,
+                    turn.tokens,
+                    turn.latency,
+                )
+                for position, turn in enumerate(record.turns)
+            ],
+        )
+        return debate_id
+
+    def _insert_evaluation(self, conn, debate_id, evaluation):
+        proponent = evaluation["evaluation"]["proponent"]
+        opponent = evaluation["evaluation"]["opponent"]
+        criteria = [
+            side.get("criteria", {}).get(criterion)
+            for side in (proponent, opponent)
+            for criterion in CRITERIA
+        ]
+        columns = [
+            "debate_id",
+            "proponent_score",
+            "opponent_score",
+            "proponent_reasoning",
+            "opponent_reasoning",
+            "max_score",
+            "min_score",
+            "created_at",
+            *CRITERION_COLUMNS,
+        ]
+        conn.execute(
+            f"INSERT OR REPLACE INTO evaluations ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})",
+            (
+                debate_id,
+                proponent["score"],
+                opponent["score"],
+                proponent["reasoning"],
+                opponent["reasoning"],
+                max(proponent["score"], opponent["score"]),
+                min(proponent["score"], opponent["score"]),
+                time.time(),
+                *criteria,
+            ),
+        )
+        # Per-judge totals of judge ensemble evaluations
+        judges = evaluation.get("judges", {})
+        conn.executemany(
+            "INSERT OR REPLACE INTO judge_scores VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    debate_id,
+                    judge,
+                    scores["proponent"],
+                    scores["opponent"],
+                    judge == evaluation.get("tie_breaker"),
+                )
+                for judge, scores in judges.items()
+            ],
+        )
+
+    def record_debate(self, run_id, evaluation, debate=None):
+        """
+        Atomically store a debate, its turns and its evaluation.
+
+        :param evaluation: evaluate_all_debates entry (``debate_text`` and
+            ``evaluation``); failed evaluations are not stored
+        :param debate: Debate dictionary from the engine, used for the topic,
+            models and turns when available
+        :return: The debate's row ID
+        """
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                debate_id = self._insert_debate(
+                    conn, run_id, evaluation["debate_text"], debate
+                )
+                self._insert_evaluation(conn, debate_id, evaluation)
+        return debate_id
+
+    def record_evaluations(self, run_id, evaluations, debates=None):
+        """
+        Store a ``{key: entry}`` mapping of evaluations in one transaction.
+
+        :param debates: Optional ``{key: debate dictionary}`` with the same keys,
+            so turns are stored with their roles, token counts and latencies
+        """
+        debates = debates or {}
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                for key, evaluation in evaluations.items():
+                    debate_id = self._insert_debate(
+                        conn, run_id, evaluation["debate_text"], debates.get(key)
+                    )
+                    self._insert_evaluation(conn, debate_id, evaluation)
+
+    def add_label(self, debate_id, label, winner=None):
+        """Mark a debate as a ``good`` or ``bad`` example."""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO labels VALUES (?, ?, ?, ?)",
+                    (debate_id, label, winner, time.time()),
+                )
+
+    def evaluations(self, run_id=None):
+        """
+        :return: Dictionary of ``debate_<id>`` to evaluation entries, in the
+            format written by evaluator.write_evaluations_to_file, plus ``debate_id``
+        """
+        query = f"SELECT {EVALUATION_COLUMNS} FROM debates d JOIN evaluations e ON e.debate_id = d.id"
+        params = ()
+        if run_id is not None:
+            query += " WHERE d.run_id = ?"
+            params = (run_id,)
+        with self._lock:
+            rows = self._connect().execute(query + " ORDER BY d.id", params).fetchall()
+        return {f"debate_{row[0]}": row_to_entry(row) for row in rows}
+
+    def judge_scores(self, run_id=None):
+        """
+        :return: Dictionary of debate ID to ``{"judges": {judge: (proponent
+            total, opponent total)}, "tie_breaker": judge or None}`` for the
+            debates graded by a judge ensemble, oldest first
+        """
+        query = "SELECT j.* FROM judge_scores j"
+        params = ()
+        if run_id is not None:
+            query += " JOIN debates d ON d.id = j.debate_id WHERE d.run_id = ?"
+            params = (run_id,)
+        with self._lock:
+            rows = self._connect().execute(
+                query + " ORDER BY j.debate_id", params
+            ).fetchall()
+
+        debates = {}
+        for debate_id, judge, proponent, opponent, tie_breaker in rows:
+            debate = debates.setdefault(debate_id, {"judges": {}, "tie_breaker": None})
+            debate["judges"][judge] = (proponent, opponent)
+            if tie_breaker:
+                debate["tie_breaker"] = judge
+        return debates
+
+    def version(self, run_id=None):
+        """
+        Cheap change marker for caches of evaluation reads: (count, latest
+        debate ID) of evaluated debates, optionally only those from one run.
+        Adding labels does not change it.
+        """
+        query = "SELECT COUNT(*), MAX(e.debate_id) FROM evaluations e"
+        params = ()
+        if run_id is not None:
+            query += " JOIN debates d ON d.id = e.debate_id WHERE d.run_id = ?"
+            params = (run_id,)
+        with self._lock:
+            return tuple(self._connect().execute(query, params).fetchone())
+
+    def records(self, debate_ids):
+        """
+        :return: Dictionary of debate ID to its debate_record.DebateRecord, built
+            from the stored turns; IDs that are not stored are left out
+        """
+        debate_ids = list(debate_ids)
+        if not debate_ids:
+            return {}
+        placeholders = ", ".join("?" * len(debate_ids))
+        with self._lock:
+            conn = self._connect()
+            debates = conn.execute(
+                f"""
+                SELECT id, topic, proponent_model, opponent_model, proponent_style,
+                    opponent_style FROM debates WHERE id IN ({placeholders})
+                """,
+                debate_ids,
+            ).fetchall()
+            turns = conn.execute(
+                f"""
+                SELECT debate_id, speaker, role, iteration, argument, tokens, latency
+                FROM turns WHERE debate_id IN ({placeholders})
+                ORDER BY debate_id, position
+                """,
+                debate_ids,
+            ).fetchall()
+
+        records = {
+            row[0]: DebateRecord(row[1], [], list(row[2:4]), list(row[4:6]))
+            for row in debates
+        }
+        roles = {debate_id: {} for debate_id in records}
+        for debate_id, agent, role, *turn in turns:
+            # Turns stored before roles were: the first speaker is the proponent
+            known = roles[debate_id]
+            role = role or known.get(agent) or ROLES[min(len(known), 1)]
+            known.setdefault(agent, role)
+            records[debate_id].turns.append(Turn(agent, role, *turn))
+        return records
+
+    def iter_records(self, run_id=None, batch_size=500):
+        """Stream every stored debate's record, oldest first, ``batch_size`` at a time."""
+        query = "SELECT id FROM debates WHERE id > ?"
+        if run_id is not None:
+            query += " AND run_id = ?"
+        query += " ORDER BY id LIMIT ?"
+        after_id = 0
+        while True:
+            params = (after_id,) + ((run_id,) if run_id is not None else ())
+            with self._lock:
+                rows = self._connect().execute(query, params + (batch_size,)).fetchall()
+            if not rows:
+                return
+            records = self.records(row[0] for row in rows)
+            for (debate_id,) in rows:
+                yield records[debate_id]
+            after_id = rows[-1][0]
+
+    def labeled(self, label):
+        """
+        :return: List of labeled evaluation entries with their ``winner``, oldest first
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                f"""
+                SELECT {EVALUATION_COLUMNS}, l.winner FROM labels l
+                JOIN debates d ON d.id = l.debate_id
+                JOIN evaluations e ON e.debate_id = d.id
+                WHERE l.label = ? ORDER BY l.created_at
+                """,
+                (label,),
+            ).fetchall()
+        return [{**row_to_entry(row[:-1]), "winner": row[-1]} for row in rows]
+
+    def iter_labeled(self, label, batch_size=500):
+        """
+        Stream labeled evaluation entries, oldest label first, like ``labeled``
+        but ``batch_size`` rows at a time and with each debate's ``record``.
+        """
+        after = 0
+        while True:
+            with self._lock:
+                rows = self._connect().execute(
+                    f"""
+                    SELECT {EVALUATION_COLUMNS}, l.winner, l.rowid FROM labels l
+                    JOIN debates d ON d.id = l.debate_id
+                    JOIN evaluations e ON e.debate_id = d.id
+                    WHERE l.label = ? AND l.rowid > ? ORDER BY l.rowid LIMIT ?
+                    """,
+                    (label, after, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            records = self.records(row[0] for row in rows)
+            for row in rows:
+                yield {
+                    **row_to_entry(row[:-2]),
+                    "winner": row[-2],
+                    "record": records[row[0]],
+                }
+            after = rows[-1][-1]
+
+    def score_rows(self, run_id=None, after_id=0):
+        """
+        :param after_id: Only debates with a larger row ID, for incremental readers
+        :return: Rows of SCORE_COLUMNS for every evaluated debate, optionally
+            only those from one run
+        """
+        query = f"""
+            SELECT d.id, d.run_id, d.topic, d.proponent_model, d.opponent_model,
+                d.proponent_style, d.opponent_style, e.proponent_score,
+                e.opponent_score, {", ".join(f"e.{c}" for c in CRITERION_COLUMNS)}
+            FROM debates d JOIN evaluations e ON e.debate_id = d.id
+            WHERE d.id > ?
+        """
+        params = (after_id,)
+        if run_id is not None:
+            query += " AND d.run_id = ?"
+            params += (run_id,)
+        with self._lock:
+            return self._connect().execute(query + " ORDER BY d.id", params).fetchall()
+
+    def import_legacy(self, label_files=None, json_paths=None):
+        """
+        Migrate results from the ``<label>_debates.txt`` JSON-lines files and
+        the timestamped evaluation JSON files. Safe to run more than once.
+
+        :param label_files: {label: path}; defaults to good/bad_debates.txt
+        :param json_paths: Evaluation JSON files; defaults to json/*.json
+        :return: Number of (debates, labels) read
+        """
+        if label_files is None:
+            label_files = {label: f"{label}_debates.txt" for label in ("good", "bad")}
+        if json_paths is None:
+            json_paths = sorted(glob.glob(os.path.join("json", "*.json")))
+
+        num_debates = num_labels = 0
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                for path in json_paths:
+                    run_id = f"import:{os.path.basename(path)}"
+                    conn.execute(
+                        "INSERT OR IGNORE INTO runs VALUES (?, ?, ?)",
+                        (run_id, None, os.path.getmtime(path)),
+                    )
+                    with open(path, "r") as f:
+                        evaluations = json.load(f)
+                    for evaluation in evaluations.values():
+                        debate_id = self._insert_debate(
+                            conn, run_id, evaluation["debate_text"]
+                        )
+                        self._insert_evaluation(conn, debate_id, evaluation)
+                        num_debates += 1
+
+                for label, path in label_files.items():
+                    if not os.path.exists(path):
+                        continue
+                    with open(path, "r") as f:
+                        for line in f:
+                            if not line.strip():
+                                continue
+                            entry = json.loads(line)
+                            debate_id = self._insert_debate(
+                                conn, None, entry["debate_text"]
+                            )
+                            self._insert_evaluation(conn, debate_id, entry)
+                            conn.execute(
+                                "INSERT OR IGNORE INTO labels VALUES (?, ?, ?, ?)",
+                                (debate_id, label, entry.get("winner"), time.time()),
+                            )
+                            num_labels += 1
+        return num_debates, num_labels
+
+    def stats(self):
+        with self._lock:
+            conn = self._connect()
+            return {
+                table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in (
+                    "runs",
+                    "debates",
+                    "turns",
+                    "evaluations",
+                    "labels",
+                    "judge_scores",
+                )
+            }
+
+
+results_store = ResultsStore()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the debate results store")
+    parser.add_argument("--db", default=default_results_path())
+    parser.add_argument(
+        "--import-legacy",
+        action="store_true",
+        help="import good/bad_debates.txt and json/*.json from the current directory",
+    )
+    parser.add_argument(
+        "--export-records",
+        metavar="PATH",
+        help="write every stored debate as a JSONL record (msgpack for .msgpack paths)",
+    )
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db)
+    if args.import_legacy:
+        num_debates, num_labels = store.import_legacy()
+        print(f"Imported {num_debates} evaluated debates and {num_labels} labels")
+    if args.export_records:
+        count = write_records(store.iter_records(), args.export_records)
+        print(f"Exported {count} debates to {args.export_records}")
+    print(store.stats())
@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+
+DEFAULT_RUNS_DIR = "runs"
+
+
+class DebateCheckpoint:
+    """Journal view of one debate: its scenario and the turns already paid for."""
+
+    def __init__(self, journal, debate_id):
+        self.journal = journal
+        self.debate_id = debate_id
+        state = journal.debates.get(debate_id, {})
+        self.scenario = state.get("scenario")
+        self.turns = {
+            (turn["iteration"], turn["speaker"]): turn["argument"]
+            for turn in state.get("turns", [])
+        }
+
+    def completed_turn(self, iteration, speaker):
+        """:return: The journaled argument for this turn, or None if not yet run"""
+        return self.turns.get((iteration, speaker))
+
+    def record_scenario(self, scenario):
+        self.scenario = scenario.model_dump()
+        self.journal.append(
+            {"event": "scenario", "debate_id": self.debate_id, "scenario": self.scenario}
+        )
+
+    def record_turn(self, iteration, speaker, agent, argument):
+        self.turns[(iteration, speaker)] = argument
+        self.journal.append(
+            {
+                "event": "turn",
+                "debate_id": self.debate_id,
+                "iteration": iteration,
+                "speaker": speaker,
+                "agent": agent,
+                "argument": argument,
+            }
+        )
+
+    def record_end(self, debate_data):
+        self.journal.append(
+            {"event": "debate_end", "debate_id": self.debate_id, "debate": debate_data}
+        )
+
+
+class RunJournal:
+    """
+    Append-only JSONL journal of one run, stored at ``<root>/<run_id>.jsonl``.
+
+    The run's tasks, every scenario, every turn, every finished debate and
+    every evaluation is appended as it happens. Opening an existing run ID
+    replays the journal, so a resumed run skips everything already recorded.
+    """
+
+    def __init__(self, run_id=None, root=DEFAULT_RUNS_DIR, durable=False):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.path = os.path.join(root, f"{self.run_id}.jsonl")
+        # fsync every record instead of only flushing it
+        self.durable = durable
+        self.params = None
+        self.debate_tasks = None
+        self.shared_scenario = None
+        self.debates = {}
+        self.finished = False
+        self._file = None
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.path):
+            self._replay()
+
+    def _replay(self):
+        valid_bytes = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self._apply(event)
+                valid_bytes += len(line)
+        # A crash mid-write can leave a truncated last record; drop it so new
+        # records are not appended after a corrupt line
+        if valid_bytes < os.path.getsize(self.path):
+            os.truncate(self.path, valid_bytes)
+
+    def _apply(self, event):
+        kind = event["event"]
+        if kind == "run_start":
+            self.params = event["params"]
+            self.debate_tasks = event["debate_tasks"]
+            self.shared_scenario = event["scenario"]
+            return
+        if kind == "run_end":
+            self.finished = True
+            return
+
+        debate = self.debates.setdefault(event["debate_id"], {"turns": []})
+        if kind == "scenario":
+            debate["scenario"] = event["scenario"]
+        elif kind == "turn":
+            debate["turns"].append(event)
+        elif kind == "debate_end":
+            debate["debate"] = event["debate"]
+        elif kind == "evaluation":
+            debate["evaluation"] = event["evaluation"]
+
+    def append(self, event):
+        event = {**event, "timestamp": time.time()}
+        with self._lock:
+            self._apply(event)
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a")
+            self._file.write(json.dumps(event) + "\n")
+            self._file.flush()
+            if self.durable:
+                os.fsync(self._file.fileno())
+
+    def start(self, params, debate_tasks, scenario=None):
+        self.append(
+            {
+                "event": "run_start",
+                "params": params,
+                "debate_tasks": [list(task) for task in debate_tasks],
+                "scenario": scenario.model_dump() if scenario is not None else None,
+            }
+        )
+
+    def debate(self, debate_id):
+        return DebateCheckpoint(self, debate_id)
+
+    def record_evaluation(self, debate_id, evaluation):
+        self.append(
+            {"event": "evaluation", "debate_id": debate_id, "evaluation": evaluation}
+        )
+
+    def finish(self):
+        self.append({"event": "run_end"})
+
+    def unfinished_debates(self):
+        return [
+            debate_id
+            for debate_id in range(len(self.debate_tasks or []))
+            if "debate" not in self.debates.get(debate_id, {})
+        ]
+
+    def unevaluated_debates(self):
+        return [
+            (debate_id, state["debate"])
+            for debate_id, state in sorted(self.debates.items())
+            if "debate" in state and "evaluation" not in state
+        ]
+
+    def evaluated_debates(self):
+        return [
+            (debate_id, state["debate"], state["evaluation"])
+            for debate_id, state in sorted(self.debates.items())
+            if "evaluation" in state
+        ]
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def list_runs(root=DEFAULT_RUNS_DIR):
+    """
+    :return: List of (run_id, finished) for every journal under ``root``, newest first
+    """
+    if not os.path.isdir(root):
+        return []
+    paths = sorted(
+        (os.path.join(root, name) for name in os.listdir(root) if name.endswith(".jsonl")),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    runs = []
+    for path in paths:
+        # Only the last record is needed to tell whether the run finished
+        with open(path, "rb") as f:
+            f.seek(max(os.path.getsize(path) - 256, 0))
+            finished = b'"event": "run_end"' in f.read()
+        runs.append((os.path.basename(path)[: -len(".jsonl")], finished))
+    return runs
@@ -0,0 +1,46 @@
+import hashlib
+import os
+
+from sqlite_cache import SQLiteLRUCache, content_key
+
+
+DEFAULT_CACHE_PATH = os.path.join("cache", "scenarios.sqlite3")
+DEFAULT_MAX_ENTRIES = 1000
+
+
+def prompt_hash(*prompt_parts):
+    return hashlib.sha256("\x1f".join(prompt_parts).encode()).hexdigest()
+
+
+def scenario_key(question, model, prompt_digest):
+    return content_key(question, model, prompt_digest)
+
+
+class ScenarioCache:
+    """
+    On-disk LRU cache of generated scenarios.
+
+    Entries are keyed by (question, model, prompt hash) so changing the
+    scenario prompt or model invalidates them.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.store = SQLiteLRUCache(path, max_entries=max_entries)
+
+    def get(self, question, model, prompt_digest):
+        """
+        :return: The cached scenario JSON string, or None on a miss
+        """
+        return self.store.get(scenario_key(question, model, prompt_digest))
+
+    def put(self, question, model, prompt_digest, scenario_json):
+        self.store.put(scenario_key(question, model, prompt_digest), scenario_json)
+
+    def clear(self):
+        self.store.clear()
+
+    def __len__(self):
+        return len(self.store)
+
+
+scenario_cache = ScenarioCache()
@@ -0,0 +1,262 @@
+import asyncio
+import json
+import random
+import threading
+import time
+
+
+# Per-model limits; models not listed use DEFAULT_RATE_LIMIT.
+DEFAULT_RATE_LIMIT = {"rpm": 500, "tpm": 1_000_000, "max_concurrency": 32}
+MODEL_RATE_LIMITS = {
+    "openai/gpt-4o-2024-08-06": {"rpm": 500, "tpm": 2_000_000, "max_concurrency": 64},
+    "meta-llama/llama-3.1-405b-instruct": {"rpm": 200, "tpm": 400_000, "max_concurrency": 16},
+    "google/gemini-pro-1.5": {"rpm": 360, "tpm": 1_000_000, "max_concurrency": 32},
+    "anthropic/claude-3.5-sonnet": {"rpm": 400, "tpm": 400_000, "max_concurrency": 32},
+}
+
+DEFAULT_MAX_RETRIES = 4
+# Completion tokens assumed when reserving tokens/min capacity before a call.
+DEFAULT_COMPLETION_ESTIMATE = 512
+INITIAL_CONCURRENCY = 4
+POLL_INTERVAL = 0.05
+
+
+def is_retryable(error):
+    """Rate limits, server errors and dropped connections are worth retrying."""
+    from openai import APIConnectionError, APIStatusError
+
+    if isinstance(error, APIConnectionError):
+        return True
+    return isinstance(error, APIStatusError) and (
+        error.status_code == 429 or error.status_code >= 500
+    )
+
+
+def retry_after(error):
+    """Seconds from a Retry-After header, or None when absent."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def retry_delay(error, attempt, base_delay=1.0, max_delay=60.0):
+    # Prefer the provider's Retry-After hint, otherwise jittered exponential backoff
+    hinted = retry_after(error)
+    if hinted is not None:
+        return min(hinted, max_delay)
+    return min(base_delay * 2**attempt, max_delay) * random.uniform(0.5, 1.0)
+
+
+def estimate_tokens(messages):
+    if messages is None:
+        return DEFAULT_COMPLETION_ESTIMATE
+    return len(json.dumps(messages)) // 4 + DEFAULT_COMPLETION_ESTIMATE
+
+
+class TokenBucket:
+    """Refills ``per_minute`` units per minute up to a one-minute burst."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.available = per_minute
+        self.rate = per_minute / 60
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.available = min(
+            self.capacity, self.available + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def delay_for(self, amount, now):
+        """Seconds until ``amount`` units are available, without taking them."""
+        self._refill(now)
+        # Requests larger than the burst wait for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        return max(amount - self.available, 0) / self.rate
+
+    def take(self, amount):
+        # May go negative when actual usage exceeds the reservation
+        self.available -= amount
+
+
+class ModelLane:
+    """
+    Admission control for one model: requests/min and tokens/min buckets, a
+    Retry-After pause, and an AIMD concurrency limit. The limit grows by one
+    for every ``limit`` successes and halves on each 429.
+    """
+
+    def __init__(self, rpm, tpm, max_concurrency):
+        self.rpm = TokenBucket(rpm)
+        self.tpm = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(INITIAL_CONCURRENCY, max_concurrency))
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def admit(self, tokens):
+        """
+        Try to start a request.
+
+        :return: 0 when admitted (capacity taken), otherwise seconds to wait
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.blocked_until > now:
+                return self.blocked_until - now
+            if self.in_flight >= int(self.limit):
+                return POLL_INTERVAL
+            wait = max(self.rpm.delay_for(1, now), self.tpm.delay_for(tokens, now))
+            if wait:
+                return wait
+            self.rpm.take(1)
+            self.tpm.take(tokens)
+            self.in_flight += 1
+            return 0
+
+    def release(self, reserved_tokens, used_tokens=None):
+        with self._lock:
+            self.in_flight -= 1
+            if used_tokens is not None:
+                self.tpm.take(used_tokens - reserved_tokens)
+
+    def on_success(self):
+        with self._lock:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def on_rate_limited(self, pause=None):
+        with self._lock:
+            self.limit = max(1.0, self.limit / 2)
+            if pause:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+
+
+def default_usage(result):
+    return getattr(result, "usage", None)
+
+
+class RequestScheduler:
+    """
+    Central rate-limit-aware scheduler shared by every LLM call in the process.
+
+    ``call`` (threads) and ``acall`` (asyncio) wait for admission to the
+    model's lane, run the request and retry rate limits and server errors with
+    Retry-After or jittered exponential backoff. If a telemetry ``call`` dict is
+    passed, retries and queueing time are written to it.
+    """
+
+    def __init__(self, limits=None, default_limit=DEFAULT_RATE_LIMIT):
+        self.limits = MODEL_RATE_LIMITS if limits is None else limits
+        self.default_limit = default_limit
+        self.lanes = {}
+        self._lock = threading.Lock()
+
+    def lane(self, model):
+        with self._lock:
+            if model not in self.lanes:
+                self.lanes[model] = ModelLane(**self.limits.get(model, self.default_limit))
+            return self.lanes[model]
+
+    def _on_error(self, lane, error, attempt, max_retries):
+        """:return: Seconds to back off before retrying; raises when giving up"""
+        if attempt == max_retries or not is_retryable(error):
+            raise error
+        if getattr(error, "status_code", None) == 429:
+            lane.on_rate_limited(retry_after(error))
+        return retry_delay(error, attempt)
+
+    def call(
+        self,
+        model,
+        func,
+        messages=None,
+        max_retries=DEFAULT_MAX_RETRIES,
+        call=None,
+        usage_of=default_usage,
+    ):
+        lane = self.lane(model)
+        tokens = estimate_tokens(messages)
+        call = call if call is not None else {}
+        call["queue_time"] = 0.0
+
+        for attempt in range(max_retries + 1):
+            call["retries"] = attempt
+            while (wait := lane.admit(tokens)) > 0:
+                call["queue_time"] += wait
+                time.sleep(wait)
+
+            used = None
+            try:
+                result = func()
+                usage = usage_of(result)
+                used = usage.total_tokens if usage is not None else None
+                lane.on_success()
+                return result
+            except Exception as error:
+                delay = self._on_error(lane, error, attempt, max_retries)
+            finally:
+                lane.release(tokens, used)
+            time.sleep(delay)
+
+    async def acall(
+        self,
+        model,
+        func,
+        messages=None,
+        max_retries=DEFAULT_MAX_RETRIES,
+        call=None,
+        usage_of=default_usage,
+        slot=None,
+    ):
+        """
+        :param func: Zero-argument function returning an awaitable
+        :param slot: Optional async context manager factory (such as an engine
+            ConcurrencyLimiter slot) entered only after admission, so no
+            semaphore is held while waiting on rate limits
+        """
+        lane = self.lane(model)
+        tokens = estimate_tokens(messages)
+        call = call if call is not None else {}
+        call["queue_time"] = 0.0
+
+        for attempt in range(max_retries + 1):
+            call["retries"] = attempt
+            while (wait := lane.admit(tokens)) > 0:
+                call["queue_time"] += wait
+                await asyncio.sleep(wait)
+
+            used = None
+            try:
+                if slot is not None:
+                    async with slot():
+                        result = await func()
+                else:
+                    result = await func()
+                usage = usage_of(result)
+                used = usage.total_tokens if usage is not None else None
+                lane.on_success()
+                return result
+            except Exception as error:
+                delay = self._on_error(lane, error, attempt, max_retries)
+            finally:
+                lane.release(tokens, used)
+            await asyncio.sleep(delay)
+
+    def snapshot(self):
+        """Current concurrency limit and in-flight count per model."""
+        with self._lock:
+            lanes = dict(self.lanes)
+        return {
+            model: {"limit": int(lane.limit), "in_flight": lane.in_flight}
+            for model, lane in lanes.items()
+        }
+
+
+scheduler = RequestScheduler()
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def content_key(*parts):
+    """Stable SHA-256 key for any JSON-serializable parts."""
+    return hashlib.sha256(
+        json.dumps(parts, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+class SQLiteLRUCache:
+    """
+    Persistent string cache in SQLite with least-recently-used eviction.
+
+    The cache is bounded by entry count and, optionally, by total value size
+    in bytes. Hit and miss counters cover the lifetime of this instance. The
+    database is opened lazily on first use, and a lock makes the cache safe
+    to share between threads.
+    """
+
+    def __init__(self, path, max_entries=1000, max_bytes=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)"
+            )
+        return self._conn
+
+    def get(self, key):
+        """
+        :return: The cached value, or None on a miss
+        """
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with conn:
+                conn.execute(
+                    "UPDATE entries SET last_used = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+            return row[0]
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value.encode()), now, now),
+                )
+                self._evict(conn)
+
+    def _evict(self, conn):
+        conn.execute(
+            """
+            DELETE FROM entries WHERE key IN (
+                SELECT key FROM entries ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+        if self.max_bytes is not None:
+            conn.execute(
+                """
+                DELETE FROM entries WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (ORDER BY last_used DESC) AS running
+                        FROM entries
+                    ) WHERE running > ?
+                )
+                """,
+                (self.max_bytes,),
+            )
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM entries")
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
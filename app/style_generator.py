@@ -1,24 +1,14 @@
-import os
 from typing import List
-import weave
 
-import instructor
 from pydantic import BaseModel
-from openai import OpenAI
-
-from dotenv import load_dotenv
-load_dotenv()
-
-weave.init("together-weave")
 
 from extract_findings import extract_both_debates
+from providers import instructor_client
+from scheduler import scheduler
+from telemetry import telemetry
 
-config = OpenAI(
-    api_key=os.environ.get("OPENROUTER_API_KEY"),
-    base_url="https://openrouter.ai/api/v1",
-)
 
-client = instructor.from_openai(config)
+STYLE_MODEL = "gpt-4"
 
 
 class StyleList(BaseModel):
@@ -29,37 +19,46 @@ def generate_style_prompt(n_styles, grade_responses=None) -> list[str]:
     # Load in template style prompts
     with open("app/styles.txt", "r") as file:
         styles = file.read()
-    grade_responses = extract_both_debates()
-    # Take in best and worst k responses from previous iterations
-    if grade_responses:
-        best_k = grade_responses[0]
-        worst_k = grade_responses[1]
-    else:
-        # Default best and worst k responses
+    # Sampled best and worst responses, bounded in count and tokens
+    if grade_responses is None:
+        grade_responses = extract_both_debates()
+    best_k, worst_k = grade_responses
+    # Default best and worst k responses
+    if not best_k:
         best_k = ["strong, logical, nuanced and well-thought out argument"]
+    if not worst_k:
         worst_k = ["weak, illogical, shallow and poorly thought out argument"]
 
-    style_responses = client.chat.completions.create(
-        model="gpt-4",
-        response_model=StyleList,
-        messages=[
-            {
-                "role": "system",
-                "content": "You are a debating coach to help generate effective, logical and thoughtful debate styles. Be descriptive and helpful. Your goal is to help create an instructive summary to write a debate speech using formats from your knowledge base to prompt an LLM agent to generate a strong, logical, nuanced and well-thought out argument.",
-            },
-            {
-                "role": "user",
-                "content": f"""
+    messages = [
+        {
+            "role": "system",
+            "content": "You are a debating coach to help generate effective, logical and thoughtful debate styles. Be descriptive and helpful. Your goal is to help create an instructive summary to write a debate speech using formats from your knowledge base to prompt an LLM agent to generate a strong, logical, nuanced and well-thought out argument.",
+        },
+        {
+            "role": "user",
+            "content": f"""
              Here are exemplary great responses to help you analyze, dissect, and replicate their styles: {best_k}. Here are bad, ineffective, worst responses that you should avoid replicating their styles: {worst_k}. 
              You can also generate the style description inspired by these prompts using a combination of a few ideas together: {styles}.
 
              Generate a list of {n_styles} styles description for debate speeches. Make sure to be creative and descriptive as possible. Give at least 200 words for each style description.
              """,
-            },
-        ],
-        temperature=0.8,
-        top_p=1,
-    )
+        },
+    ]
+    with telemetry.track("style", STYLE_MODEL) as call:
+        style_responses, completion = scheduler.call(
+            STYLE_MODEL,
+            lambda: instructor_client().chat.completions.create_with_completion(
+                model=STYLE_MODEL,
+                response_model=StyleList,
+                messages=messages,
+                temperature=0.8,
+                top_p=1,
+            ),
+            messages=messages,
+            call=call,
+            usage_of=lambda result: result[1].usage,
+        )
+        call["usage"] = completion.usage
     print(style_responses)
     return style_responses
 
@@ -0,0 +1,298 @@
+import argparse
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from prompt_cache import cached_tokens
+from providers import env
+
+
+# Calls kept in memory for summaries; older ones are only in the log
+DEFAULT_MAX_RECORDS = 100_000
+
+# Run ID of the job the current thread or task works for; see Telemetry.run
+_current_run_id = contextvars.ContextVar("telemetry_run_id", default=None)
+
+# Estimated USD per 1M tokens: (prompt, cached prompt, completion)
+MODEL_PRICES = {
+    "openai/gpt-4o-2024-08-06": (2.50, 1.25, 10.00),
+    "gpt-4o-2024-08-06": (2.50, 1.25, 10.00),
+    "openai/gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4": (30.00, 30.00, 60.00),
+    "meta-llama/llama-3.1-405b-instruct": (3.00, 3.00, 3.00),
+    "google/gemini-pro-1.5": (1.25, 0.3125, 5.00),
+    "anthropic/claude-3.5-sonnet": (3.00, 0.30, 15.00),
+}
+
+
+def default_log_path():
+    """:return: The TELEMETRY_LOG setting; an empty string disables the log"""
+    return env("TELEMETRY_LOG", os.path.join("telemetry", "llm_calls.jsonl"))
+
+
+def usage_field(usage, name):
+    if usage is None:
+        return 0
+    if isinstance(usage, dict):
+        return usage.get(name) or 0
+    return getattr(usage, name, 0) or 0
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens, cached=0):
+    """
+    :return: Estimated USD cost, or None for models without a known price
+    """
+    if model not in MODEL_PRICES:
+        return None
+    prompt_price, cached_price, completion_price = MODEL_PRICES[model]
+    return (
+        (prompt_tokens - cached) * prompt_price
+        + cached * cached_price
+        + completion_tokens * completion_price
+    ) / 1_000_000
+
+
+class Telemetry:
+    """
+    Per-call LLM instrumentation: tokens, latency, retries and estimated cost.
+
+    Every call is appended to a JSONL log tagged with the current run ID, and
+    the latest ``max_records`` are kept in memory for run summaries. The log
+    file is opened lazily on the first record, and recording is thread-safe.
+
+    The run ID is the process-wide one from start_run, unless the calling
+    thread or task runs inside ``telemetry.run(run_id)``, so concurrent jobs
+    in one process each tag their own calls.
+    """
+
+    def __init__(self, log_path=None, max_records=DEFAULT_MAX_RECORDS):
+        """:param log_path: Defaults to default_log_path, resolved on first record"""
+        self._log_path = log_path
+        self.default_run_id = uuid.uuid4().hex[:12]
+        self.records = deque(maxlen=max_records)
+        # Calls recorded since start_run, including those no longer in memory
+        self.count = 0
+        self._log = None
+        self._lock = threading.Lock()
+
+    @property
+    def log_path(self):
+        if self._log_path is None:
+            self._log_path = default_log_path()
+        return self._log_path
+
+    @property
+    def run_id(self):
+        return _current_run_id.get() or self.default_run_id
+
+    def start_run(self, run_id=None):
+        """Begin a new run; the in-memory summary only covers calls after this."""
+        with self._lock:
+            self.default_run_id = run_id or uuid.uuid4().hex[:12]
+            self.records.clear()
+            self.count = 0
+        return self.default_run_id
+
+    @contextmanager
+    def run(self, run_id):
+        """
+        Tag calls made in this context with ``run_id``. Tasks created inside
+        inherit it; threads only when started with a copy of the context.
+        """
+        token = _current_run_id.set(run_id)
+        try:
+            yield run_id
+        finally:
+            _current_run_id.reset(token)
+
+    def since(self, count):
+        """:return: Records made after the first ``count``, as far as still kept"""
+        with self._lock:
+            newer = self.count - count
+            return list(self.records)[-newer:] if newer > 0 else []
+
+    def run_records(self, run_id):
+        """:return: Records in memory tagged with ``run_id``"""
+        with self._lock:
+            return [record for record in self.records if record["run_id"] == run_id]
+
+    def record(self, phase, model, usage, latency, retries=0, **extra):
+        prompt_tokens = usage_field(usage, "prompt_tokens")
+        completion_tokens = usage_field(usage, "completion_tokens")
+        cached = cached_tokens(usage)
+        record = {
+            "run_id": self.run_id,
+            "timestamp": time.time(),
+            "phase": phase,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached,
+            "latency": latency,
+            "retries": retries,
+            "cost": estimate_cost(model, prompt_tokens, completion_tokens, cached),
+            **extra,
+        }
+
+        with self._lock:
+            self.records.append(record)
+            self.count += 1
+            if self.log_path:
+                if self._log is None:
+                    if os.path.dirname(self.log_path):
+                        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+                    self._log = open(self.log_path, "a")
+                self._log.write(json.dumps(record) + "\n")
+                self._log.flush()
+        return record
+
+    @contextmanager
+    def track(self, phase, model):
+        """
+        Time one LLM call. Set ``call["usage"]`` (and ``call["retries"]`` or
+        extra fields) on the yielded dict; failed calls are recorded with the error.
+        """
+        call = {"usage": None, "retries": 0}
+        start_time = time.perf_counter()
+        error = None
+        try:
+            yield call
+        except Exception as exc:
+            error = repr(exc)
+            raise
+        finally:
+            usage = call.pop("usage")
+            retries = call.pop("retries")
+            if error is not None:
+                call["error"] = error
+            self.record(
+                phase, model, usage, time.perf_counter() - start_time, retries, **call
+            )
+
+    def snapshot(self):
+        """:return: A copy of the records in memory, safe to iterate while recording"""
+        with self._lock:
+            return list(self.records)
+
+    def summary(self, records=None):
+        return summarize(self.snapshot() if records is None else records)
+
+    def prometheus_text(self, records=None):
+        return prometheus_text(self.snapshot() if records is None else records)
+
+
+def summarize(records):
+    """
+    Aggregate call records per phase and per model.
+
+    :return: {"total": {...}, "by_phase": {phase: {...}}, "by_model": {model: {...}}}
+    """
+
+    def empty():
+        return {
+            "calls": 0,
+            "errors": 0,
+            "retries": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_tokens": 0,
+            "latency": 0.0,
+            "cost": 0.0,
+        }
+
+    total = empty()
+    by_phase = defaultdict(empty)
+    by_model = defaultdict(empty)
+    for record in records:
+        for bucket in (total, by_phase[record["phase"]], by_model[record["model"]]):
+            bucket["calls"] += 1
+            bucket["errors"] += "error" in record
+            bucket["retries"] += record["retries"]
+            bucket["prompt_tokens"] += record["prompt_tokens"]
+            bucket["completion_tokens"] += record["completion_tokens"]
+            bucket["cached_tokens"] += record["cached_tokens"]
+            bucket["latency"] += record["latency"]
+            bucket["cost"] += record["cost"] or 0.0
+
+    for bucket in [total, *by_phase.values(), *by_model.values()]:
+        bucket["mean_latency"] = bucket["latency"] / bucket["calls"] if bucket["calls"] else 0.0
+
+    return {"total": total, "by_phase": dict(by_phase), "by_model": dict(by_model)}
+
+
+PROMETHEUS_METRICS = [
+    ("llm_calls_total", "counter", "LLM calls", "calls"),
+    ("llm_errors_total", "counter", "Failed LLM calls", "errors"),
+    ("llm_retries_total", "counter", "LLM call retries", "retries"),
+    ("llm_prompt_tokens_total", "counter", "Prompt tokens", "prompt_tokens"),
+    ("llm_completion_tokens_total", "counter", "Completion tokens", "completion_tokens"),
+    ("llm_cached_tokens_total", "counter", "Prompt tokens served from cache", "cached_tokens"),
+    ("llm_latency_seconds_sum", "counter", "Total LLM call latency", "latency"),
+    ("llm_cost_usd_total", "counter", "Estimated LLM cost", "cost"),
+]
+
+
+def prometheus_text(records):
+    """Render per-(phase, model) totals in the Prometheus text exposition format."""
+    by_series = defaultdict(list)
+    for record in records:
+        by_series[(record["phase"], record["model"])].append(record)
+    series = {key: summarize(group)["total"] for key, group in by_series.items()}
+
+    lines = []
+    for name, metric_type, help_text, field in PROMETHEUS_METRICS:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for (phase, model), totals in sorted(series.items()):
+            lines.append(f'{name}{{phase="{phase}",model="{model}"}} {totals[field]}')
+    return "\n".join(lines) + "\n"
+
+
+def load_records(log_path, run_id=None):
+    records = []
+    with open(log_path, "r") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if run_id is None or record["run_id"] == run_id:
+                    records.append(record)
+    return records
+
+
+def print_summary(summary):
+    total = summary["total"]
+    print(
+        f"{total['calls']} LLM calls, {total['prompt_tokens']} prompt tokens "
+        f"({total['cached_tokens']} cached), {total['completion_tokens']} completion "
+        f"tokens, {total['latency']:.1f}s, ${total['cost']:.4f} estimated"
+    )
+    for group in ("by_phase", "by_model"):
+        for name, bucket in sorted(summary[group].items()):
+            print(
+                f"  {name:<40} {bucket['calls']:>6} calls  "
+                f"{bucket['prompt_tokens'] + bucket['completion_tokens']:>9} tokens  "
+                f"{bucket['mean_latency']:6.2f}s avg  ${bucket['cost']:.4f}"
+            )
+
+
+telemetry = Telemetry()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the LLM call log")
+    parser.add_argument("log", nargs="?", default=default_log_path())
+    parser.add_argument("--run", help="only include calls from this run ID")
+    parser.add_argument("--prometheus", metavar="PATH", help="also write Prometheus text")
+    args = parser.parse_args()
+
+    records = load_records(args.log, args.run)
+    print_summary(summarize(records))
+    if args.prometheus:
+        with open(args.prometheus, "w") as f:
+            f.write(prometheus_text(records))
+        print(f"Prometheus metrics written to {args.prometheus}")
@@ -0,0 +1,241 @@
+import argparse
+import asyncio
+import math
+import random
+import uuid
+from collections import Counter
+
+from engine import (
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_PER_MODEL_CONCURRENCY,
+    ConcurrencyLimiter,
+    generate_scenario,
+)
+from pipeline import evaluate_as_finished, iterate_sync
+from ratings import INITIAL_RATING, RatingEngine, outcome
+from results_store import results_store
+from run_store import RunJournal
+from style_generator import generate_style_prompt
+
+
+STRATEGIES = ("ucb", "uncertainty", "swiss")
+DEFAULT_WAVE_SIZE = 8
+
+
+def expected_score(rating_a, rating_b):
+    return 1 / (1 + 10 ** ((rating_b - rating_a) / 400))
+
+
+class Tournament:
+    """
+    Adaptive tournament over a model pool with a fixed debate budget.
+
+    Debates run in concurrent waves. Before each wave the Bradley-Terry ratings
+    are refitted and the next pairings are chosen by ``strategy``:
+
+    - ``uncertainty``: the matchups whose outcome is least predictable,
+      discounted by how often they have already been played
+    - ``ucb``: the same, restricted to models whose upper confidence bound
+      still reaches the leader's lower bound; the tournament stops early
+      once a single model remains
+    - ``swiss``: models sorted by rating play their nearest neighbour,
+      preferring opponents they have met least
+
+    Every debate is journaled and stored like a normal run.
+    """
+
+    def __init__(
+        self,
+        models,
+        budget,
+        wave_size=DEFAULT_WAVE_SIZE,
+        strategy="ucb",
+        confidence=0.95,
+        seed=0,
+    ):
+        if len(set(models)) < 2:
+            raise ValueError("A tournament needs at least two distinct models.")
+        if strategy not in STRATEGIES:
+            raise ValueError(
+                f"Unknown strategy {strategy!r}; expected one of {STRATEGIES}"
+            )
+        self.models = list(dict.fromkeys(models))
+        self.budget = budget
+        self.wave_size = wave_size
+        self.strategy = strategy
+        self.confidence = confidence
+        self.tournament_id = uuid.uuid4().hex[:12]
+        self.ratings = RatingEngine(path=None)
+        self.played = 0
+        self.games = Counter()
+        self._rng = random.Random(seed)
+
+    def standings(self):
+        """
+        :return: {model: (rating, ci_low, ci_high)}; unplayed models have an
+            unbounded interval
+        """
+        standings = {
+            model: (INITIAL_RATING, -math.inf, math.inf) for model in self.models
+        }
+        for row in self.ratings.bradley_terry(confidence=self.confidence):
+            standings[row["name"]] = (row["rating"], row["ci_low"], row["ci_high"])
+        return standings
+
+    def contenders(self, standings):
+        """Models whose upper bound reaches the best lower bound."""
+        best_low = max(low for _, low, _ in standings.values())
+        return [model for model, (_, _, high) in standings.items() if high >= best_low]
+
+    def next_pairings(self, size):
+        """
+        :return: Up to ``size`` (proponent model, opponent model) pairs; empty
+            once the ``ucb`` strategy has a single contender
+        """
+        standings = self.standings()
+        if self.strategy == "swiss":
+            pairs = self._swiss_pairs(standings)
+        else:
+            candidates = self.models
+            if self.strategy == "ucb":
+                candidates = self.contenders(standings)
+                if len(candidates) < 2:
+                    return []
+            pairs = self._informative_pairs(candidates, standings)
+
+        # Repeat the best pairs when there are fewer distinct pairs than slots
+        pairings = [pairs[i % len(pairs)] for i in range(size)]
+        # Random sides so neither model is always the proponent
+        return [
+            pair if self._rng.random() < 0.5 else pair[::-1] for pair in pairings
+        ]
+
+    def _informative_pairs(self, candidates, standings):
+        def information(pair):
+            p = expected_score(standings[pair[0]][0], standings[pair[1]][0])
+            return p * (1 - p) / (1 + self.games[frozenset(pair)])
+
+        pairs = [
+            (a, b) for i, a in enumerate(candidates) for b in candidates[i + 1 :]
+        ]
+        return sorted(pairs, key=information, reverse=True)
+
+    def _swiss_pairs(self, standings):
+        ranked = sorted(self.models, key=lambda model: standings[model][0], reverse=True)
+        pairs = []
+        while len(ranked) > 1:
+            model = ranked.pop(0)
+            # Nearest-ranked opponent among those met least often
+            opponent = min(
+                ranked, key=lambda other: self.games[frozenset((model, other))]
+            )
+            ranked.remove(opponent)
+            pairs.append((model, opponent))
+        return pairs
+
+    def record(self, proponent, opponent, evaluation):
+        scores = evaluation["evaluation"]
+        self.ratings.record_game(
+            f"model:{proponent}",
+            f"model:{opponent}",
+            outcome(scores["proponent"]["score"], scores["opponent"]["score"]),
+        )
+        self.games[frozenset((proponent, opponent))] += 1
+
+    def leaderboard(self):
+        return self.ratings.bradley_terry(confidence=self.confidence)
+
+    async def run(
+        self,
+        question,
+        num_iterations,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        per_model_concurrency=DEFAULT_PER_MODEL_CONCURRENCY,
+        **pipeline_options,
+    ):
+        """
+        Play waves until the budget is spent (or ``ucb`` has a single contender).
+
+        All debates share one scenario, so ratings compare models rather than
+        scenarios.
+
+        :param pipeline_options: ``eval_workers``, ``eval_retries``,
+            ``queue_size`` and turn options, forwarded to
+            pipeline.evaluate_as_finished
+        :return: Async iterator of (debate, evaluation) pairs
+        """
+        limiter = ConcurrencyLimiter(max_concurrency, per_model_concurrency)
+        scenario = await generate_scenario(question, limiter, reuse_cached=True)
+        wave = 0
+        while self.played < self.budget:
+            pairings = self.next_pairings(
+                min(self.wave_size, self.budget - self.played)
+            )
+            if not pairings:
+                print("One contender left; stopping early")
+                return
+            wave += 1
+            styles = await asyncio.to_thread(generate_style_prompt, len(pairings) * 2)
+            debate_tasks = [
+                (
+                    question,
+                    num_iterations,
+                    list(pair),
+                    styles.style_description[i * 2 : i * 2 + 2],
+                )
+                for i, pair in enumerate(pairings)
+            ]
+
+            params = {
+                "tournament_id": self.tournament_id,
+                "wave": wave,
+                "strategy": self.strategy,
+                "question": question,
+                "num_iterations": num_iterations,
+                "max_concurrency": max_concurrency,
+                "per_model_concurrency": per_model_concurrency,
+            }
+            journal = RunJournal(f"{self.tournament_id}-wave{wave}")
+            journal.start(params, debate_tasks, scenario)
+            results_store.record_run(journal.run_id, params)
+
+            async for debate, evaluation in evaluate_as_finished(
+                journal,
+                debate_tasks,
+                limiter,
+                scenario,
+                range(len(debate_tasks)),
+                **pipeline_options,
+            ):
+                if "error" not in evaluation:
+                    self.record(*debate["models"], evaluation)
+                yield debate, evaluation
+            # Failed debates still count against the budget
+            self.played += len(debate_tasks)
+
+    def run_sync(self, *args, **kwargs):
+        """Blocking iterator over run; see pipeline.stream_debates_and_evaluations_sync."""
+        return iterate_sync(self.run, *args, **kwargs)
+
+
+if __name__ == "__main__":
+    from ratings import print_ratings
+    from start import FAMOUS_MODELS
+
+    parser = argparse.ArgumentParser(description="Adaptive model tournament")
+    parser.add_argument("--models", nargs="+", default=FAMOUS_MODELS)
+    parser.add_argument("--budget", type=int, default=24)
+    parser.add_argument("--wave", type=int, default=DEFAULT_WAVE_SIZE)
+    parser.add_argument("--strategy", choices=STRATEGIES, default="ucb")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument(
+        "--question",
+        default="Should artificial intelligence be given the same rights as humans? Why or why not?",
+    )
+    args = parser.parse_args()
+
+    tournament = Tournament(args.models, args.budget, args.wave, args.strategy)
+    for _ in tournament.run_sync(args.question, args.iterations):
+        pass
+    print(f"{tournament.played} of {args.budget} debates played")
+    print_ratings("Bradley-Terry", tournament.leaderboard())
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT, "app")
+sys.path.insert(0, APP_DIR)
+
+# Tests never trace to Weave or append to the shared call log
+os.environ["WEAVE_PROJECT"] = ""
+os.environ["TELEMETRY_LOG"] = ""
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """
+    Run each test in an empty directory laid out like the repository root,
+    since the app reads and writes paths relative to it.
+    """
+    os.symlink(APP_DIR, tmp_path / "app")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def fake_provider():
+    """Answer every LLM call in-process and instantly; see providers.FakeProvider."""
+    pytest.importorskip("httpx")
+    pytest.importorskip("instructor")
+    from providers import FakeProvider, set_provider
+
+    provider = FakeProvider(latency=0.0, token_latency=0.0)
+    set_provider(provider)
+    return provider
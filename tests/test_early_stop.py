@@ -0,0 +1,94 @@
+import asyncio
+import math
+
+import pytest
+
+from context import DebateHistory
+from early_stop import LeaderTest, RepetitionStop
+
+
+def evaluation(proponent, opponent):
+    return {
+        "evaluation": {
+            "proponent": {"score": proponent},
+            "opponent": {"score": opponent},
+        }
+    }
+
+
+def test_no_leader_before_min_debates():
+    test = LeaderTest(min_debates=4)
+    for _ in range(3):
+        test.record("a", "b", evaluation(30, 10))
+    assert test.leader() is None
+
+
+def test_dominant_model_is_found():
+    test = LeaderTest(alpha=0.05)
+    for _ in range(60):
+        test.record("a", "b", evaluation(30, 10))
+        test.record("c", "a", evaluation(10, 30))
+    assert test.leader() == "a"
+
+
+def test_evenly_matched_models_stay_undecided():
+    test = LeaderTest()
+    for _ in range(100):
+        test.record("a", "b", evaluation(30, 10))
+        test.record("a", "b", evaluation(10, 30))
+    assert test.leader() is None
+
+
+def test_ties_and_self_play():
+    test = LeaderTest()
+    test.record("a", "b", evaluation(20, 20))
+    test.record("a", "a", evaluation(30, 10))
+    assert test.wins == {"a": 0.5, "b": 0.5}
+    assert test.games == {"a": 1, "b": 1}
+    assert test.debates == 2
+
+
+def test_bounds_are_hoeffding_intervals():
+    test = LeaderTest(alpha=0.1)
+    for _ in range(8):
+        test.record("a", "b", evaluation(30, 10))
+    test.record("a", "b", evaluation(10, 30))
+    test.record("a", "b", evaluation(10, 30))
+    low, high = test.bounds("a")
+    # Win rate 0.8 over 10 games; alpha is split across the two models
+    radius = math.sqrt(math.log(4 * 10**2 / 0.05) / 20)
+    assert low == pytest.approx(0.8 - radius)
+    assert high == pytest.approx(0.8 + radius)
+
+
+# Long enough that whole turns would look repetitive because of it alone
+PERSONA = (
+    "A seasoned debate champion who has argued at national tournaments for "
+    "many years and always speaks with careful structured reasoning"
+)
+
+
+def history(*arguments):
+    debate = DebateHistory()
+    for index, argument in enumerate(arguments):
+        agent = index % 2 + 1
+        debate.append(f"Agent {agent} ({PERSONA}): {argument}", argument)
+    return debate
+
+
+def test_repetition_stop_compares_arguments():
+    policy = RepetitionStop(threshold=0.5, min_iterations=2)
+    repeated = history(
+        "tea is calming and healthy for everyone",
+        "coffee is bold and energizing for everyone",
+        "tea is calming and healthy for everyone indeed",
+        "coffee is bold and energizing for everyone indeed",
+    )
+    fresh = history(
+        "tea is calming and healthy for everyone",
+        "coffee is bold and energizing for everyone",
+        "consider the trade history of the british empire",
+        "caffeine research shows measurable focus benefits",
+    )
+    assert asyncio.run(policy.should_stop(repeated, 2, None))
+    assert not asyncio.run(policy.should_stop(fresh, 2, None))
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+import engine
+from early_stop import EarlyStopPolicy
+from telemetry import telemetry
+
+
+class FailingStop(EarlyStopPolicy):
+    async def should_stop(self, history, iteration, judge):
+        raise RuntimeError("judge unavailable")
+
+
+class StopAfterFirst(EarlyStopPolicy):
+    async def should_stop(self, history, iteration, judge):
+        return True
+
+
+def simulate(early_stop, num_iterations=3):
+    return asyncio.run(
+        engine.simulate_debate(
+            "Should homework be banned?",
+            num_iterations,
+            {"a": "fake/model-a", "b": "fake/model-b"},
+            ["calm", "fiery"],
+            early_stop=early_stop,
+        )
+    )
+
+
+def test_debate_runs_every_iteration(fake_provider):
+    debate = simulate(None)
+    assert [iteration["iteration"] for iteration in debate["iterations"]] == [1, 2, 3]
+    for iteration in debate["iterations"]:
+        assert len(iteration["arguments"]) == 2
+    assert "stopped_after" not in debate
+
+
+def test_early_stop_ends_the_debate(fake_provider):
+    debate = simulate(StopAfterFirst())
+    assert debate["stopped_after"] == 1
+    assert len(debate["iterations"]) == 1
+
+
+def test_failing_early_stop_check_does_not_lose_the_debate(fake_provider):
+    debate = simulate(FailingStop())
+    assert len(debate["iterations"]) == 3
+    assert "stopped_after" not in debate
+    errors = [
+        record
+        for record in telemetry.snapshot()
+        if record["phase"] == "early_stop_error"
+    ]
+    assert [record["iteration"] for record in errors[-2:]] == [1, 2]
+    assert "judge unavailable" in errors[-1]["error"]
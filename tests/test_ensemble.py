@@ -0,0 +1,79 @@
+import pytest
+
+pytest.importorskip("pydantic")
+
+from ensemble import agreement, kendall_tau, krippendorff_alpha, trimmed_mean
+from results_store import ResultsStore
+
+
+def test_krippendorff_alpha_perfect_agreement():
+    assert krippendorff_alpha([[1, 1], [2, 2], [3, 3]]) == 1.0
+
+
+def test_krippendorff_alpha_interval_example():
+    # Observed disagreement 4 / 6, expected 2 * 6 * 10 / (6 * 5) = 4
+    assert krippendorff_alpha([[1, 2], [3, 3], [5, 4]]) == pytest.approx(5 / 6)
+
+
+def test_krippendorff_alpha_ignores_single_ratings_and_no_variation():
+    assert krippendorff_alpha([[1, 1], [2, 2], [7]]) == 1.0
+    assert krippendorff_alpha([[4, 4], [4, 4]]) is None
+    assert krippendorff_alpha([[4]]) is None
+
+
+def test_kendall_tau():
+    assert kendall_tau([1, 2, 3, 4], [10, 20, 30, 40]) == 1.0
+    assert kendall_tau([1, 2, 3, 4], [4, 3, 2, 1]) == -1.0
+    # Two concordant, three discordant and one pair tied in x only
+    assert kendall_tau([1, 1, 2, 3], [1, 2, 3, 0]) == pytest.approx(-1 / 30**0.5)
+    assert kendall_tau([1, 1], [2, 2]) is None
+
+
+def test_trimmed_mean_drops_outliers():
+    assert trimmed_mean([1, 10, 10, 10, 100]) == 10
+
+
+def test_agreement_from_stored_judge_scores():
+    store = ResultsStore("results.sqlite3")
+    judges = [
+        {"cheap-a": (30, 20), "cheap-b": (28, 21)},
+        {"cheap-a": (15, 25), "cheap-b": (16, 24)},
+        {"cheap-a": (20, 19), "cheap-b": (18, 22), "expensive": (21, 20)},
+    ]
+    for index, scores in enumerate(judges):
+        store.record_debate(
+            "run1",
+            {
+                "debate_text": f"debate {index}",
+                "evaluation": {
+                    side: {"score": 20, "reasoning": ""}
+                    for side in ("proponent", "opponent")
+                },
+                "judges": {
+                    judge: {"proponent": proponent, "opponent": opponent}
+                    for judge, (proponent, opponent) in scores.items()
+                },
+                "tie_breaker": "expensive" if "expensive" in scores else None,
+            },
+        )
+    store.record_debate(
+        "run2",
+        {
+            "debate_text": "single judge",
+            "evaluation": {
+                side: {"score": 20, "reasoning": ""}
+                for side in ("proponent", "opponent")
+            },
+        },
+    )
+
+    stored = store.judge_scores("run1")
+    assert [debate["judges"] for debate in stored.values()] == judges
+    assert store.judge_scores("run2") == {}
+
+    report = agreement(stored.values())
+    assert report["escalation_rate"] == pytest.approx(1 / 3)
+    # Both cheap judges order the debates' margins the same way
+    assert report["kendall_tau"]["cheap-a | cheap-b"] == 1.0
+    assert report["kendall_tau"]["cheap-a | expensive"] is None
+    assert -1 <= report["krippendorff_alpha"] <= 1
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+import pipeline
+from results_store import results_store
+
+
+# Fake completions depend only on the request, so every debate gets its own
+# pair of models to keep the debates (and their stored rows) distinct
+MODELS = [f"fake/model-{i}" for i in range(8)]
+QUESTION = "Should cities ban cars from their centers?"
+
+
+def run(num_debates, **options):
+    async def consume():
+        return [
+            item
+            async for item in pipeline.stream_debates_and_evaluations(
+                num_debates, QUESTION, MODELS, 1, **options
+            )
+        ]
+
+    return asyncio.run(consume())
+
+
+def test_every_debate_is_evaluated_and_stored(fake_provider):
+    results = run(3, run_id="complete")
+
+    assert len(results) == 3
+    for debate, evaluation in results:
+        assert "error" not in evaluation
+    assert len(results_store.evaluations("complete")) == 3
+
+
+def test_cancel_while_the_queue_is_full(fake_provider, monkeypatch):
+    num_debates = 4
+    release = threading.Event()
+
+    def blocked_evaluation(debate, max_retries):
+        # Holds the only evaluator, so finished debates back up in the queue
+        release.wait(timeout=30)
+        return "", None, RuntimeError("not graded")
+
+    monkeypatch.setattr(pipeline, "evaluate_debate_data", blocked_evaluation)
+
+    async def main():
+        backed_up = asyncio.Event()
+        ended = []
+
+        def on_turn_event(event):
+            if event["type"] == "turn_end":
+                ended.append(event)
+                # Every debate has finished its two turns: one is with the
+                # evaluator, one queued and one being put
+                if len(ended) == 2 * num_debates:
+                    backed_up.set()
+
+        async def consume():
+            async for _ in pipeline.stream_debates_and_evaluations(
+                num_debates,
+                QUESTION,
+                MODELS,
+                1,
+                eval_workers=1,
+                queue_size=1,
+                run_id="cancelled",
+                on_turn_event=on_turn_event,
+            ):
+                pass
+
+        task = asyncio.create_task(consume())
+        await asyncio.wait_for(backed_up.wait(), timeout=30)
+        # Let the producer block on the full queue
+        await asyncio.sleep(0.1)
+        task.cancel()
+        try:
+            await asyncio.wait_for(task, timeout=5)
+        except asyncio.CancelledError:
+            pass
+
+    try:
+        asyncio.run(main())
+    finally:
+        release.set()
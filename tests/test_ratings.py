@@ -0,0 +1,72 @@
+import math
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from ratings import ELO_SCALE, INITIAL_RATING, RatingEngine, outcome
+
+
+def test_outcome():
+    assert outcome(30, 20) == 1.0
+    assert outcome(20, 30) == 0.0
+    assert outcome(25, 25) == 0.5
+
+
+def test_elo_update_is_zero_sum():
+    engine = RatingEngine(path="")
+    engine.record_game("model:a", "model:b", 1.0)
+    a, b = engine.elo["model:a"], engine.elo["model:b"]
+    # Equal ratings expect 0.5, so the winner gains k / 2
+    assert a["rating"] == pytest.approx(INITIAL_RATING + engine.k / 2)
+    assert a["rating"] + b["rating"] == pytest.approx(2 * INITIAL_RATING)
+    assert a["games"] == b["games"] == 1
+
+
+def test_self_play_is_ignored():
+    engine = RatingEngine(path="")
+    engine.record_game("model:a", "model:a", 1.0)
+    assert engine.elo == {} and engine.pairs == {}
+
+
+def test_elo_ranks_the_stronger_model_first():
+    engine = RatingEngine(path="")
+    for _ in range(20):
+        engine.record_game("model:strong", "model:weak", 1.0)
+        engine.record_game("model:weak", "model:middle", 0.0)
+    names = [row["name"] for row in engine.elo_ratings()]
+    assert names[0] == "strong" and names[-1] == "weak"
+    for row in engine.elo_ratings():
+        assert row["ci_low"] < row["rating"] < row["ci_high"]
+
+
+def test_bradley_terry_two_players_closed_form():
+    engine = RatingEngine(path="")
+    for _ in range(7):
+        engine.record_game("model:a", "model:b", 1.0)
+    for _ in range(3):
+        engine.record_game("model:a", "model:b", 0.0)
+    a, b = engine.bradley_terry(prior=1.0)
+    # With half a virtual win each, the strength ratio is 7.5 / 3.5
+    assert (a["name"], b["name"]) == ("a", "b")
+    assert a["rating"] - b["rating"] == pytest.approx(ELO_SCALE * math.log(7.5 / 3.5))
+    assert (a["rating"] + b["rating"]) / 2 == pytest.approx(INITIAL_RATING)
+
+
+def test_bradley_terry_is_transitive():
+    engine = RatingEngine(path="")
+    for _ in range(10):
+        engine.record_game("style:x", "style:y", 1.0)
+        engine.record_game("style:y", "style:z", 1.0)
+    names = [row["name"] for row in engine.bradley_terry("style")]
+    assert names == ["x", "y", "z"]
+    assert engine.bradley_terry("model") == []
+
+
+def test_state_round_trips_through_the_file():
+    engine = RatingEngine(path="ratings.json")
+    engine.record_game("model:a", "model:b", 1.0)
+    engine.save()
+    loaded = RatingEngine(path="ratings.json")
+    assert loaded.elo == engine.elo
+    assert loaded.pairs == engine.pairs
@@ -0,0 +1,139 @@
+import pytest
+
+from results_store import ResultsStore
+
+
+def make_debate(topic="Is tea better than coffee?", models=("model-a", "model-b")):
+    return {
+        "topic": topic,
+        "models": list(models),
+        "opening_statements": [],
+        "iterations": [
+            {
+                "iteration": 1,
+                "arguments": [
+                    {"agent": "Proponent", "argument": "Tea is calming."},
+                    {"agent": "Opponent", "argument": "Coffee is bolder."},
+                ],
+            }
+        ],
+        "closing_statements": [],
+    }
+
+
+def make_evaluation(debate_text, proponent=30, opponent=20):
+    return {
+        "debate_text": debate_text,
+        "evaluation": {
+            "proponent": {"score": proponent, "reasoning": "clear"},
+            "opponent": {"score": opponent, "reasoning": "vague"},
+        },
+    }
+
+
+@pytest.fixture
+def store():
+    return ResultsStore("results.sqlite3")
+
+
+def test_records_debate_with_turns_and_evaluation(store):
+    store.record_run("run1", {"num_debates": 1})
+    debate_id = store.record_debate(
+        "run1", make_evaluation("debate one"), make_debate()
+    )
+
+    (entry,) = store.evaluations("run1").values()
+    assert entry["debate_id"] == debate_id
+    assert entry["debate_text"] == "debate one"
+    assert entry["evaluation"]["proponent"]["score"] == 30
+    assert entry["evaluation"]["opponent"]["reasoning"] == "vague"
+    stats = store.stats()
+    assert (stats["runs"], stats["debates"], stats["turns"]) == (1, 1, 2)
+
+
+def test_same_debate_is_stored_once_per_run(store):
+    first = store.record_debate("run1", make_evaluation("same text"))
+    again = store.record_debate("run1", make_evaluation("same text", 10, 5))
+    other_run = store.record_debate("run2", make_evaluation("same text"))
+
+    assert first == again
+    assert other_run != first
+    assert len(store.evaluations("run1")) == 1
+    assert len(store.evaluations("run2")) == 1
+    # Grading the same debate again replaces its evaluation
+    (entry,) = store.evaluations("run1").values()
+    assert entry["evaluation"]["proponent"]["score"] == 10
+
+
+def test_fractional_scores_are_kept(store):
+    store.record_debate("run1", make_evaluation("ensemble", 27.5, 21.25))
+    (entry,) = store.evaluations().values()
+    assert entry["evaluation"]["proponent"]["score"] == 27.5
+    assert entry["evaluation"]["opponent"]["score"] == 21.25
+
+
+def test_record_evaluations_in_one_call(store):
+    store.record_evaluations(
+        "run1",
+        {f"debate_{i}": make_evaluation(f"debate {i}") for i in range(1, 4)},
+    )
+    assert len(store.evaluations("run1")) == 3
+    assert store.evaluations("other run") == {}
+
+
+def test_labels(store):
+    good = store.record_debate("run1", make_evaluation("good debate"))
+    bad = store.record_debate("run1", make_evaluation("bad debate", 5, 30))
+    store.add_label(good, "good", "proponent")
+    store.add_label(bad, "bad", "opponent")
+
+    (labeled,) = store.labeled("good")
+    assert labeled["debate_text"] == "good debate"
+    assert labeled["winner"] == "proponent"
+    assert [entry["debate_id"] for entry in store.labeled("bad")] == [bad]
+
+
+def test_reopens_existing_database():
+    ResultsStore("results.sqlite3").record_debate("run1", make_evaluation("kept"))
+    assert len(ResultsStore("results.sqlite3").evaluations("run1")) == 1
+
+
+def test_rubric_criteria_and_score_rows(store):
+    from results_store import CRITERIA, SCORE_COLUMNS
+
+    evaluation = make_evaluation("graded debate")
+    for side, base in (("proponent", 4), ("opponent", 2)):
+        evaluation["evaluation"][side]["criteria"] = {
+            criterion: base + index * 0.5 for index, criterion in enumerate(CRITERIA)
+        }
+    debate = {**make_debate(), "styles": ["calm", "fiery"]}
+    store.record_debate("run1", evaluation, debate)
+    store.record_debate("run1", make_evaluation("ungraded criteria"))
+
+    graded, ungraded = store.evaluations("run1").values()
+    assert graded["evaluation"]["opponent"]["criteria"][CRITERIA[1]] == 2.5
+    assert "criteria" not in ungraded["evaluation"]["proponent"]
+
+    row = dict(zip(SCORE_COLUMNS, store.score_rows("run1")[0]))
+    assert (row["proponent_model"], row["opponent_style"]) == ("model-a", "fiery")
+    assert row[f"proponent_{CRITERIA[0]}"] == 4
+    assert [r[0] for r in store.score_rows(after_id=row["debate_id"])] == [
+        row["debate_id"] + 1
+    ]
+
+
+def test_records_keep_roles_and_measurements(store):
+    debate = make_debate()
+    debate["iterations"][0]["arguments"][0].update(
+        role="proponent", tokens=12, latency=0.5
+    )
+    debate["iterations"][0]["arguments"][1].update(role="opponent")
+    debate_id = store.record_debate("run1", make_evaluation("recorded"), debate)
+
+    record = store.records([debate_id])[debate_id]
+    assert record.topic == debate["topic"]
+    assert record.models == ["model-a", "model-b"]
+    assert [turn.role for turn in record.turns] == ["proponent", "opponent"]
+    assert (record.turns[0].tokens, record.turns[0].latency) == (12, 0.5)
+    assert record.side("opponent")[0].text == "Coffee is bolder."
+    assert list(store.iter_records("run1", batch_size=1)) == [record]
@@ -0,0 +1,51 @@
+import itertools
+
+import pytest
+
+import sqlite_cache
+from sqlite_cache import SQLiteLRUCache, content_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Strictly increasing timestamps, so recency never ties."""
+    ticks = itertools.count()
+    monkeypatch.setattr(sqlite_cache.time, "time", lambda: float(next(ticks)))
+
+
+def test_content_key_is_stable_and_order_independent():
+    assert content_key({"a": 1, "b": 2}) == content_key({"b": 2, "a": 1})
+    assert content_key("debate", "model") != content_key("debate", "other model")
+
+
+def test_get_and_put(clock):
+    cache = SQLiteLRUCache("cache.sqlite3")
+    assert cache.get("key") is None
+    cache.put("key", "value")
+    assert cache.get("key") == "value"
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1, "bytes": 5}
+
+
+def test_evicts_least_recently_used(clock):
+    cache = SQLiteLRUCache("cache.sqlite3", max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    assert len(cache) == 2
+
+
+def test_evicts_by_size(clock):
+    cache = SQLiteLRUCache("cache.sqlite3", max_bytes=10)
+    cache.put("a", "x" * 6)
+    cache.put("b", "y" * 6)
+    assert cache.get("a") is None
+    assert cache.get("b") == "y" * 6
+
+
+def test_persists_across_instances(clock):
+    SQLiteLRUCache("cache.sqlite3").put("key", "value")
+    assert SQLiteLRUCache("cache.sqlite3").get("key") == "value"
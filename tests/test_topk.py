@@ -0,0 +1,83 @@
+import random
+
+from helper import select_debates, sort_debates
+
+
+def evaluation(proponent, opponent):
+    return {
+        "evaluation": {
+            "proponent": {"score": proponent},
+            "opponent": {"score": opponent},
+        }
+    }
+
+
+def random_debates(count, seed=0):
+    rng = random.Random(seed)
+    return {
+        f"debate_{i}": evaluation(rng.randint(7, 35), rng.randint(7, 35))
+        for i in range(count)
+    }
+
+
+def reference(debates, k, key, reverse):
+    # Stable sort: ties keep insertion order
+    ranked = sorted(debates.items(), key=lambda item: key(item[1]), reverse=reverse)
+    return [name for name, _ in ranked[:k]]
+
+
+def max_score(debate):
+    scores = debate["evaluation"]
+    return max(scores["proponent"]["score"], scores["opponent"]["score"])
+
+
+def min_score(debate):
+    scores = debate["evaluation"]
+    return min(scores["proponent"]["score"], scores["opponent"]["score"])
+
+
+def test_matches_full_sort():
+    debates = random_debates(500)
+    for k in (1, 5, 50):
+        top, bottom = select_debates(debates, k)
+        assert list(top) == reference(debates, k, max_score, reverse=True)
+        assert list(bottom) == reference(debates, k, min_score, reverse=False)
+
+
+def test_ties_go_to_the_debate_seen_first():
+    debates = {f"debate_{i}": evaluation(20, 20) for i in range(10)}
+    top, bottom = select_debates(debates, 3)
+    assert list(top) == ["debate_0", "debate_1", "debate_2"]
+    assert list(bottom) == ["debate_0", "debate_1", "debate_2"]
+
+
+def test_accepts_a_stream_of_pairs():
+    debates = random_debates(100, seed=1)
+    top, bottom = select_debates(iter(debates.items()), 5)
+    assert (top, bottom) == select_debates(debates, 5)
+
+
+def test_k_larger_than_input_and_zero():
+    debates = random_debates(3)
+    top, bottom = select_debates(debates, 10)
+    assert len(top) == len(bottom) == 3
+    assert select_debates(debates, 0) == ({}, {})
+
+
+def test_score_keys():
+    debates = {
+        "close": evaluation(20, 19),
+        "blowout": evaluation(35, 7),
+        "strong": evaluation(30, 30),
+    }
+    top, _ = select_debates(debates, 1, top_key="margin")
+    assert list(top) == ["blowout"]
+    top, _ = select_debates(debates, 1, top_key="sum")
+    assert list(top) == ["strong"]
+
+
+def test_sort_debates_wrapper():
+    debates = random_debates(50, seed=2)
+    top, bottom = select_debates(debates, 4)
+    assert sort_debates(debates, 4, "top") == top
+    assert sort_debates(debates, 4, "bottom") == bottom